@@ -0,0 +1,134 @@
+"""Compares page decoding before and after byte-level encoding detection.
+
+Runs against generated GBK and UTF-8 chapter pages (see fixtures.py), or with
+--corpus against saved pages. For each page and strategy it reports the median
+time per decode, throughput, and whether the text came out right.
+
+    python benchmarks/decode_benchmark.py
+    python benchmarks/decode_benchmark.py --corpus saved_pages/ --json results.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from helloreader.charset import decode, detect_encoding  # noqa: E402
+
+from fixtures import chapter_html, load_corpus  # noqa: E402
+
+
+def _response(raw, content_type):
+    response = requests.models.Response()
+    response._content = raw
+    response.status_code = 200
+    if content_type:
+        response.headers['Content-Type'] = content_type
+    # As requests' HTTPAdapter does when it builds a real response
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+def old_forced_gbk(raw, content_type):
+    """What the scraper did before: force GBK and read response.text."""
+    response = _response(raw, content_type)
+    response.encoding = 'gbk'
+    return response.text
+
+
+def requests_default(raw, content_type):
+    """response.text left to requests: the header's charset, ISO-8859-1 for bare text/html,
+    or charset_normalizer's statistical guess over the whole body when there is no header."""
+    return _response(raw, content_type).text
+
+
+def sniff_and_decode(raw, content_type):
+    """First page from a host: detect from BOM/header/<meta>, then one codec call."""
+    encoding, _ = detect_encoding(raw, content_type, default='gbk')
+    return decode(raw, encoding)
+
+
+def make_known_host(raw, content_type):
+    """Later pages from the same host: the remembered encoding replaces the <meta> scan."""
+    known, _ = detect_encoding(raw, content_type, default='gbk')
+
+    def known_host(raw, content_type):
+        encoding, _ = detect_encoding(raw, content_type, default='gbk', known=known)
+        return decode(raw, encoding, errors='strict')
+    return known_host
+
+
+STRATEGIES = [
+    ('forced gbk + response.text (old)', lambda raw, content_type: old_forced_gbk),
+    ('requests default response.text', lambda raw, content_type: requests_default),
+    ('sniff + decode (first page)', lambda raw, content_type: sniff_and_decode),
+    ('remembered host encoding', make_known_host),
+]
+
+
+def generated_pages(characters):
+    """GBK and UTF-8 versions of the same chapter, under the headers sites typically send."""
+    html, _ = chapter_html(characters=characters, charset='gbk')
+    utf8_html = html.replace('charset=gbk', 'charset=utf-8')
+    return [
+        ('gbk, bare text/html header', html.encode('gbk'), 'text/html', html),
+        ('gbk, no Content-Type', html.encode('gbk'), None, html),
+        ('utf-8, charset in header', utf8_html.encode('utf-8'), 'text/html; charset=utf-8', utf8_html),
+        ('utf-8, bare text/html header', utf8_html.encode('utf-8'), 'text/html', utf8_html),
+    ]
+
+
+def time_decode(function, raw, content_type, repeat, number):
+    """Median seconds per call over `repeat` batches of `number` calls."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function(raw, content_type)
+        samples.append((time.perf_counter() - started) / number)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', help="Directory of saved .html pages to use instead of generated ones")
+    parser.add_argument('--characters', type=int, default=4000, help="Characters per generated chapter (default: 4000)")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed batches per measurement (default: 5)")
+    parser.add_argument('--number', type=int, default=20, help="Decodes per batch (default: 20)")
+    parser.add_argument('--json', metavar='FILE', help="Also write the results to FILE as JSON")
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        # Saved pages carry no headers and no known-good text; the <meta> has to do
+        pages = [(name, raw, None, None) for name, raw in load_corpus(args.corpus)]
+    else:
+        pages = generated_pages(args.characters)
+
+    results = []
+    for name, raw, content_type, expected in pages:
+        print(f"\n{name} ({len(raw) / 1024:.1f} KiB)")
+        for label, make in STRATEGIES:
+            function = make(raw, content_type)
+            text = function(raw, content_type)
+            seconds = time_decode(function, raw, content_type, args.repeat, args.number)
+            correct = None if expected is None else text == expected
+            results.append({
+                'page': name, 'bytes': len(raw), 'strategy': label,
+                'seconds': seconds, 'mb_per_second': len(raw) / seconds / 1e6, 'correct': correct,
+            })
+            verdict = '' if correct is None else ('ok' if correct else 'WRONG TEXT')
+            print(f"  {label:<34} {seconds * 1e6:9.1f} us  {len(raw) / seconds / 1e6:8.1f} MB/s  {verdict}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
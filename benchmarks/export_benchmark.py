@@ -0,0 +1,71 @@
+"""Measures exporting a library book to EPUB and text: time and peak memory by book length.
+
+Builds library books of several lengths from generated chapters (see fixtures.py),
+then exports each through helloreader.export, the code behind the 'export'
+subcommand. Peak memory is traced separately from the timed run. It should stay
+about the same however many chapters the book has, because chapters stream from
+the book to the output one at a time.
+
+    python benchmarks/export_benchmark.py --chapters 500 3000 --json export.json
+"""
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from helloreader.export import export, store_chapters  # noqa: E402
+from helloreader.library import BookStore  # noqa: E402
+
+from library_benchmark import build_book  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chapters', type=int, nargs='+', default=[500, 3000],
+                        help="Book lengths to export (default: 500 3000)")
+    parser.add_argument('--characters', type=int, default=3000, help="Characters per chapter (default: 3000)")
+    parser.add_argument('--json', metavar='FILE', help="Write the results to FILE as JSON")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING) # Per-page extraction warnings
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for chapters in args.chapters:
+            book_path = Path(directory) / f'book{chapters}.hrbook'
+            _, records = build_book(chapters, args.characters)
+            with BookStore(book_path, writable=True) as store:
+                for record in records:
+                    store.append(record)
+            del records
+            for output_format in ('epub', 'txt'):
+                output = Path(directory) / f'book{chapters}.{output_format}'
+                started = time.perf_counter()
+                export(store_chapters(book_path), output)
+                seconds = time.perf_counter() - started
+                tracemalloc.start()
+                export(store_chapters(book_path), output)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results[f'{output_format} {chapters}'] = {
+                    'chapters': chapters, 'format': output_format, 'seconds': seconds,
+                    'peak_bytes': peak, 'output_bytes': output.stat().st_size,
+                }
+
+    print(f"Export of library books ({args.characters} characters per chapter):")
+    for name, result in results.items():
+        print(f"  {name:<10} {result['seconds']:6.2f}s  peak {result['peak_bytes'] / 1024:8.0f} KiB  "
+              f"output {result['output_bytes'] / 1024 / 1024:6.1f} MiB")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
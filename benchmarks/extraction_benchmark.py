@@ -0,0 +1,84 @@
+"""Measures how chapter extraction scales with worker threads versus worker processes.
+
+Decodes and extracts a corpus of chapter pages (generated, or saved pages with
+--corpus) through web_scraper.extract_page, the function a crawl's extraction
+pool runs, with 1..N threads and 1..N processes. Extraction is pure Python, so
+threads serialise on the GIL while processes should scale with the cores.
+Pages are passed as raw bytes and only the small chapter dict comes back.
+
+    python benchmarks/extraction_benchmark.py --pages 400 --json extraction.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from helloreader.web_scraper import EXTRACTION_FAILED_TEXT, extract_page, extraction_pool  # noqa: E402
+
+from fixtures import chapter_page, load_corpus  # noqa: E402
+
+BASE_URL = 'https://www.piaotia.com/html/0/1/'
+
+
+def corpus_pages(pages, characters, corpus=None):
+    """[(url, raw bytes)] for the pages to extract."""
+    if corpus:
+        return [(BASE_URL + name.replace('\\', '/'), raw) for name, raw in load_corpus(corpus)[:pages]]
+    return [(f"{BASE_URL}{number}.html", chapter_page(1, number, pages, characters)) for number in range(1, pages + 1)]
+
+
+def run(executor, pages):
+    """Pages per second through executor; fails loudly if any extraction failed."""
+    started = time.perf_counter()
+    futures = [executor.submit(extract_page, raw, url, 'text/html') for url, raw in pages]
+    results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for chapter, _ in results if chapter['content_html'] == EXTRACTION_FAILED_TEXT)
+    if failed:
+        raise SystemExit(f"{failed} page(s) failed to extract")
+    return len(pages) / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=400, help="Pages to extract per run (default: 400)")
+    parser.add_argument('--characters', type=int, default=4000, help="Characters per generated chapter (default: 4000)")
+    parser.add_argument('--workers', type=int, nargs='+',
+                        help="Worker counts to try (default: 1, 2, 4... up to the number of cores)")
+    parser.add_argument('--corpus', help="Directory of saved chapter pages to extract instead of generated ones")
+    parser.add_argument('--json', metavar='FILE', help="Write the results to FILE as JSON")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING) # Per-page extraction warnings
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({min(2 ** power, cores) for power in range(cores.bit_length() + 1)})
+    pages = corpus_pages(args.pages, args.characters, args.corpus)
+    results = {'cores': cores, 'pages': len(pages), 'threads': {}, 'processes': {}}
+    for count in workers:
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            run(executor, pages[:count]) # Warm up
+            results['threads'][count] = run(executor, pages)
+        with extraction_pool(count) as executor:
+            run(executor, pages[:count]) # Start every worker before timing
+            results['processes'][count] = run(executor, pages)
+
+    base = results['processes'][workers[0]] / workers[0]
+    print(f"Extraction throughput over {len(pages)} pages on {cores} core(s), pages/s:")
+    for count in workers:
+        threads, processes = results['threads'][count], results['processes'][count]
+        print(f"  {count:>3} worker(s): threads {threads:8.1f}   processes {processes:8.1f}  "
+              f"({processes / (base * count):5.0%} of linear)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), **results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
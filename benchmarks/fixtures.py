@@ -0,0 +1,89 @@
+"""Deterministic stand-ins for saved novel pages, shaped like piaotia.com's.
+
+Benchmarks generate their corpus here so they run offline and give comparable
+numbers between runs; pass --corpus to a benchmark to use real saved pages instead.
+"""
+import random
+from pathlib import Path
+
+# Every CJK Unified Ideograph in this range is encodable in GBK
+CJK_FIRST, CJK_LAST = 0x4E00, 0x9FA5
+PUNCTUATION = '，，，。。！？“”：'
+
+CHAPTER_TEMPLATE = """<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01 Transitional//EN">
+<html><head><meta http-equiv="Content-Type" content="text/html; charset={charset}">
+<title>{book_title} {chapter_title}</title>
+<link rel="stylesheet" type="text/css" href="/css/style.css" />
+<script language="javascript" type="text/javascript" src="/scripts/read.js"></script>
+</head><body>
+<div id="main"><H1><a href="/bookinfo/0/{book}.html">{book_title}</a> {chapter_title}</H1>
+<table align="center" width="100%"><tr><td><script src="/scripts/ad.js"></script></td></tr></table>
+<div class="toplink"><a href="index.html">目录</a> <a href="/bookinfo/0/{book}.html">书页</a></div>
+<br>{content}
+</div>
+<div class="bottomlink"><a href="{prev}">上一章</a> <a href="index.html">目录</a> <a href="{next}">下一章</a></div>
+<script language="javascript" type="text/javascript" src="/scripts/bottom.js"></script>
+</body></html>
+"""
+
+TOC_TEMPLATE = """<html><head><meta http-equiv="Content-Type" content="text/html; charset={charset}">
+<title>{book_title}最新章节</title></head><body>
+<div class="title"><h1>{book_title}最新章节</h1></div>
+<div class="centent"><ul>
+{items}
+</ul></div></body></html>
+"""
+
+
+def chinese_text(rng, characters):
+    """Returns roughly `characters` characters of pseudo-Chinese prose."""
+    pieces = []
+    while characters > 0:
+        length = rng.randint(4, 18)
+        pieces.append(''.join(chr(rng.randint(CJK_FIRST, CJK_LAST)) for _ in range(length)))
+        pieces.append(rng.choice(PUNCTUATION))
+        characters -= length + 1
+    return ''.join(pieces)
+
+
+def chapter_html(book=1, chapter=1, chapters=100, characters=3000, charset='gbk', seed=0):
+    """Returns (html, title) for one chapter page; the same arguments always give the same page."""
+    rng = random.Random(f"{seed}:{book}:{chapter}")
+    title = f"第{chapter}章 {chinese_text(rng, 6).rstrip(PUNCTUATION)}"
+    paragraphs = []
+    remaining = characters
+    while remaining > 0:
+        length = min(remaining, rng.randint(60, 300))
+        paragraphs.append('&nbsp;&nbsp;&nbsp;&nbsp;' + chinese_text(rng, length))
+        remaining -= length
+    html = CHAPTER_TEMPLATE.format(
+        charset=charset,
+        book=book,
+        book_title=f"书{book}",
+        chapter_title=title,
+        content='<br /><br />'.join(paragraphs),
+        prev=f"{chapter - 1}.html" if chapter > 1 else "index.html",
+        next=f"{chapter + 1}.html" if chapter < chapters else "index.html",
+    )
+    return html, title
+
+
+def chapter_page(book=1, chapter=1, chapters=100, characters=3000, charset='gbk', seed=0):
+    """The chapter page as the bytes a server would send."""
+    html, _ = chapter_html(book, chapter, chapters, characters, charset, seed)
+    return html.encode(charset)
+
+
+def toc_page(book=1, chapters=100, charset='gbk', seed=0):
+    """The book's index page, listing chapters 1..chapters."""
+    items = '\n'.join(
+        f'<li><a href="{chapter}.html">{chapter_html(book, chapter, chapters, 0, charset, seed)[1]}</a></li>'
+        for chapter in range(1, chapters + 1)
+    )
+    return TOC_TEMPLATE.format(charset=charset, book_title=f"书{book}", items=items).encode(charset)
+
+
+def load_corpus(directory):
+    """Returns [(name, raw bytes)] for every *.html/*.htm file under directory, sorted by name."""
+    paths = sorted(path for path in Path(directory).rglob('*') if path.suffix.lower() in ('.html', '.htm'))
+    return [(str(path.relative_to(directory)), path.read_bytes()) for path in paths]
@@ -0,0 +1,232 @@
+"""Benchmarks the scrape-and-render hot path against a local stand-in site.
+
+Times each stage of loading a chapter separately (fetch, decode, parse, extract,
+render), records peak memory for one page's pass through the pipeline, and
+measures pages per second through WebScraper.fetch_chapter at several
+concurrency levels. Results are printed and can be written as JSON; --compare
+prints the change against an earlier JSON file, e.g. one from the previous commit.
+
+    python benchmarks/hotpath_benchmark.py --json after.json --compare before.json
+"""
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from helloreader.content_extractor import ChapterExtractor  # noqa: E402
+from helloreader.politeness import HostScheduler  # noqa: E402
+from helloreader.renderer import ChapterRenderer  # noqa: E402
+from helloreader.web_scraper import EXTRACTION_FAILED_TEXT, WebScraper  # noqa: E402
+
+from fixtures import load_corpus  # noqa: E402
+from standin_server import start_subprocess  # noqa: E402
+
+STAGES = ('fetch', 'decode', 'parse', 'extract', 'render', 'swap_script')
+
+
+def unpaced_scraper(concurrency=4):
+    """A WebScraper whose host scheduler never holds a request back: this measures the
+    pipeline, and the stand-in never pushes back anyway (see politeness_benchmark.py)."""
+    scheduler = HostScheduler(max_rate=0, initial_rate=1e6, initial_concurrency=concurrency,
+                              max_concurrency=concurrency, latency_tolerance=0)
+    return WebScraper(max_connections_per_host=concurrency, scheduler=scheduler)
+
+
+def chapter_urls(base_url, pages, book=1, corpus=None):
+    """URLs of the first `pages` chapters: a generated book, or the saved pages of a corpus."""
+    if corpus:
+        names = [name.replace('\\', '/') for name, _ in load_corpus(corpus)]
+        return [f"{base_url}/{name}" for name in names[:pages]]
+    return [f"{base_url}/html/0/{book}/{chapter}.html" for chapter in range(1, pages + 1)]
+
+
+def summarize(samples):
+    """Milliseconds: median, p95 and mean of a list of second timings."""
+    ordered = sorted(samples)
+    return {
+        'median_ms': statistics.median(ordered) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'mean_ms': statistics.fmean(ordered) * 1000,
+    }
+
+
+def run_pipeline(scraper, renderer, url, timings):
+    """One page through every stage, appending each stage's seconds to timings."""
+    profile = scraper.profiles.for_url(url)
+
+    started = time.perf_counter()
+    response = scraper._fetch_response(url)
+    raw = response.content
+    timings['fetch'].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    html = scraper._decode(raw, url, response.headers.get('Content-Type'))
+    timings['decode'].append(time.perf_counter() - started)
+
+    # The tokenizer pass on its own, over the whole page; extract stops early and slices too
+    started = time.perf_counter()
+    parser = ChapterExtractor(profile.title_tag, profile.next_link_text, profile.prev_link_text)
+    parser.feed(html)
+    parser.close()
+    timings['parse'].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    data = profile.extract_chapter(html, url, failed_text=EXTRACTION_FAILED_TEXT)
+    timings['extract'].append(time.perf_counter() - started)
+    if data['content_html'] == EXTRACTION_FAILED_TEXT:
+        print(f"Extraction failed for {url}", file=sys.stderr)
+
+    # No '_base_url', so the renderer's memo is bypassed and every call does the work
+    started = time.perf_counter()
+    renderer.document(data, 'dark')
+    timings['render'].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    renderer.swap_script(data)
+    timings['swap_script'].append(time.perf_counter() - started)
+
+
+def measure_stages(base_url, pages, rounds, corpus=None):
+    scraper = unpaced_scraper()
+    renderer = ChapterRenderer()
+    urls = chapter_urls(base_url, pages, corpus=corpus)
+    run_pipeline(scraper, renderer, urls[0], {stage: [] for stage in STAGES}) # Warm up the connection
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(rounds):
+        for url in urls:
+            run_pipeline(scraper, renderer, url, timings)
+    return {stage: summarize(samples) for stage, samples in timings.items()}
+
+
+def measure_memory(base_url, corpus=None):
+    """Peak Python heap allocated while one page goes through the whole pipeline."""
+    scraper = unpaced_scraper()
+    renderer = ChapterRenderer()
+    url = chapter_urls(base_url, 1, corpus=corpus)[0]
+    scraper._fetch_response(url) # Connection set-up is not per-page cost
+    tracemalloc.start()
+    try:
+        run_pipeline(scraper, renderer, url, {stage: [] for stage in STAGES})
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'pipeline_peak_bytes': peak}
+
+
+def measure_throughput(base_url, pages, concurrency, corpus=None):
+    """Pages per second through fetch_chapter (no cache) with `concurrency` worker threads."""
+    scraper = unpaced_scraper(concurrency)
+    urls = chapter_urls(base_url, pages, book=2, corpus=corpus)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        results = list(executor.map(scraper.fetch_chapter, urls))
+        elapsed = time.perf_counter() - started
+    failed = sum(1 for chapter in results if chapter['content_html'] == EXTRACTION_FAILED_TEXT)
+    stats = scraper.stats()
+    return {
+        'concurrency': concurrency,
+        'pages': len(urls),
+        'seconds': elapsed,
+        'pages_per_second': len(urls) / elapsed,
+        'failed': failed,
+        'connections_opened': stats['connections_opened'],
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def flatten(results):
+    """{metric name: value} for every number worth comparing between runs."""
+    metrics = {}
+    for stage, summary in results['stages'].items():
+        metrics[f"{stage}.median_ms"] = summary['median_ms']
+    metrics.update(results['memory'])
+    for run in results['throughput']:
+        metrics[f"pages_per_second@{run['concurrency']}"] = run['pages_per_second']
+    return metrics
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    old, new = flatten(baseline), flatten(results)
+    print(f"\nChange against {baseline_path} (commit {baseline['environment'].get('commit')}):")
+    for name, value in new.items():
+        if old.get(name):
+            print(f"  {name:<28} {old[name]:12.3f} -> {value:12.3f}  {(value - old[name]) / old[name]:+7.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=50, help="Chapters per measurement (default: 50)")
+    parser.add_argument('--rounds', type=int, default=3, help="Passes over the chapters for stage timings (default: 3)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Worker counts for the throughput runs (default: 1 2 4 8)")
+    parser.add_argument('--latency', type=float, default=20,
+                        help="Simulated per-response network latency in ms for throughput runs (default: 20)")
+    parser.add_argument('--characters', type=int, default=4000, help="Characters per generated chapter (default: 4000)")
+    parser.add_argument('--corpus', help="Directory of saved chapter pages to serve instead of generated ones")
+    parser.add_argument('--json', metavar='FILE', help="Write the results to FILE as JSON")
+    parser.add_argument('--compare', metavar='FILE', help="Print the change against an earlier JSON result")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING) # Per-page logging would be measured too
+
+    server_args = ['--chapters', max(args.pages, 1), '--characters', args.characters]
+    if args.corpus:
+        server_args += ['--corpus', args.corpus]
+    # Stage timings without added latency, so 'fetch' is the local HTTP round trip only
+    fast_server, fast_url = start_subprocess(*server_args)
+    slow_server, slow_url = start_subprocess(*server_args, '--latency', args.latency)
+    try:
+        results = {
+            'environment': environment(),
+            'settings': vars(args),
+            'stages': measure_stages(fast_url, args.pages, args.rounds, args.corpus),
+            'memory': measure_memory(fast_url, args.corpus),
+            'throughput': [measure_throughput(slow_url, args.pages, level, args.corpus) for level in args.concurrency],
+        }
+    finally:
+        fast_server.terminate()
+        slow_server.terminate()
+
+    print(f"Stage timings over {args.pages} pages x {args.rounds} rounds (ms):")
+    for stage, summary in results['stages'].items():
+        print(f"  {stage:<12} median {summary['median_ms']:8.3f}  p95 {summary['p95_ms']:8.3f}  mean {summary['mean_ms']:8.3f}")
+    print(f"Peak memory for one page: {results['memory']['pipeline_peak_bytes'] / 1024:.1f} KiB")
+    print(f"Throughput with {args.latency:g} ms simulated latency:")
+    for run in results['throughput']:
+        print(f"  concurrency {run['concurrency']:>2}: {run['pages_per_second']:7.1f} pages/s "
+              f"({run['pages']} pages in {run['seconds']:.2f}s, {run['connections_opened']} connection(s))")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Measures the compact library format against raw pages and JSON lines.
+
+Generates a book of chapter pages (see fixtures.py), extracts every chapter as the
+scraper would, and writes it both as crawl's JSON-lines output and as a library
+book. Reports the size of each against the raw HTML, the time to open each and
+read one chapter from the middle, and the time to read random chapters.
+
+Generated chapters are uniformly random characters, which is close to the worst
+case for compression; real prose compresses much further. Pass --corpus to
+measure a directory of saved chapter pages instead.
+
+    python benchmarks/library_benchmark.py --chapters 5000 --json library.json
+"""
+import argparse
+import json
+import logging
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from helloreader.library import CODECS, BookStore, default_codec  # noqa: E402
+from helloreader.site_profiles import default_registry  # noqa: E402
+
+from fixtures import chapter_html, load_corpus  # noqa: E402
+
+BASE_URL = 'https://www.piaotia.com/html/0/1/'
+
+
+def build_book(chapters, characters, corpus=None):
+    """Returns (raw page bytes in total, [chapter dicts as fetch_chapter returns them])."""
+    profile = default_registry().for_url(BASE_URL)
+    if corpus:
+        pages = [(name.replace('\\', '/'), raw) for name, raw in load_corpus(corpus)[:chapters]]
+    else:
+        pages = [(f"{number}.html", chapter_html(1, number, chapters, characters)[0].encode('gbk'))
+                 for number in range(1, chapters + 1)]
+    records = []
+    for name, raw in pages:
+        url = BASE_URL + name
+        html = raw.decode(profile.encoding or 'gb18030', 'replace')
+        records.append(dict(profile.extract_chapter(html, url), url=url))
+    return sum(len(raw) for _, raw in pages), records
+
+
+def jsonl_chapter(path, ordinal):
+    """Chapter `ordinal` from a JSON-lines book: every line before it has to be read."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for index, line in enumerate(f):
+            if index == ordinal:
+                return json.loads(line)
+    raise IndexError(ordinal)
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chapters', type=int, default=5000, help="Chapters in the generated book (default: 5000)")
+    parser.add_argument('--characters', type=int, default=3000, help="Characters per chapter (default: 3000)")
+    parser.add_argument('--codec', choices=sorted(CODECS), default=default_codec(),
+                        help="Library compression (default: zstd if installed, else zlib)")
+    parser.add_argument('--corpus', help="Directory of saved chapter pages to store instead of generated ones")
+    parser.add_argument('--reads', type=int, default=200, help="Random chapter reads to time (default: 200)")
+    parser.add_argument('--json', metavar='FILE', help="Write the results to FILE as JSON")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING) # Per-page extraction warnings
+
+    raw_bytes, records = build_book(args.chapters, args.characters, args.corpus)
+    middle = len(records) // 2
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl_path = Path(directory) / 'book.jsonl'
+        book_path = Path(directory) / 'book.hrbook'
+        with open(jsonl_path, 'w', encoding='utf-8') as f:
+            for index, record in enumerate(records):
+                f.write(json.dumps(dict(record, index=index), ensure_ascii=False) + '\n')
+        started = time.perf_counter()
+        with BookStore(book_path, writable=True, codec=args.codec) as store:
+            for record in records:
+                store.append(record)
+            stats = store.stats()
+        write_seconds = time.perf_counter() - started
+
+        def open_library_and_read():
+            with BookStore(book_path) as store:
+                store.chapter(middle)
+
+        with BookStore(book_path) as store:
+            assert store.chapter(middle)['content_html'] == records[middle]['content_html']
+            ordinals = [rng.randrange(len(store)) for _ in range(args.reads)]
+            started = time.perf_counter()
+            for ordinal in ordinals:
+                store.chapter(ordinal)
+            random_read_ms = (time.perf_counter() - started) * 1000 / args.reads
+            open_ms = timed(lambda: BookStore(book_path).close(), 20)
+
+        results = {
+            'settings': vars(args),
+            'raw_html_bytes': raw_bytes,
+            'jsonl_bytes': jsonl_path.stat().st_size,
+            'library_bytes': stats['data_bytes'] + stats['index_bytes'],
+            'library_index_bytes': stats['index_bytes'],
+            'library_write_seconds': write_seconds,
+            'library_open_ms': open_ms,
+            'library_open_and_read_middle_ms': timed(open_library_and_read, 20),
+            'jsonl_read_middle_ms': timed(lambda: jsonl_chapter(jsonl_path, middle), 5),
+            'library_random_read_ms': random_read_ms,
+        }
+
+    print(f"{len(records)} chapters of ~{args.characters} characters, library codec {args.codec}:")
+    for name in ('raw_html_bytes', 'jsonl_bytes', 'library_bytes'):
+        print(f"  {name:<16} {results[name]:>14,}  ({results[name] / raw_bytes:6.1%} of raw HTML)")
+    print(f"  library written in {write_seconds:.2f}s; opened in {open_ms:.3f} ms")
+    print(f"  chapter {middle + 1} from a cold open: library {results['library_open_and_read_middle_ms']:.3f} ms, "
+          f"JSON lines {results['jsonl_read_middle_ms']:.1f} ms")
+    print(f"  random chapter read: {random_read_ms:.3f} ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
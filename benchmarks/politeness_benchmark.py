@@ -0,0 +1,108 @@
+"""Measures crawling a site that throttles: fixed pacing against the adaptive host scheduler.
+
+Serves a generated book from a local stand-in site (see standin_server.py) that
+answers more than --throttle requests per second with 429 and a Retry-After, and
+serves only --capacity requests at once. The book is crawled with the 'crawl
+--toc' code several ways: at the old fixed 2 requests per second, with no rate
+pacing at all, and with the adaptive scheduler (with its default cap, and uncapped).
+Reports pages per second, the 429s received, failed crawls, and where the
+scheduler's rate and concurrency ended up.
+
+    python benchmarks/politeness_benchmark.py --chapters 200 --throttle 25 --json politeness.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from helloreader.crawler import BookCrawler  # noqa: E402
+from helloreader.politeness import HostScheduler  # noqa: E402
+from helloreader.web_scraper import ScraperException, WebScraper  # noqa: E402
+
+from standin_server import start_subprocess  # noqa: E402
+
+# Scheduler settings per run; 'fixed' ones never adapt because their caps are their starting point
+RUNS = {
+    'fixed 2/s': {'max_rate': 2.0, 'initial_rate': 2.0},
+    'unpaced': {'max_rate': 0, 'initial_rate': 1e6, 'min_rate': 1e6},
+    'adaptive': {},
+    'adaptive, no cap': {'max_rate': 0},
+}
+
+
+def crawl(base_url, chapters, concurrency, settings, directory):
+    """Crawls the book with a fresh scraper and scheduler; returns the run's figures."""
+    scheduler = HostScheduler(max_concurrency=concurrency, **settings)
+    scraper = WebScraper(max_connections_per_host=concurrency, scheduler=scheduler)
+    urls = [f"{base_url}/html/0/1/{chapter}.html" for chapter in range(1, chapters + 1)]
+    crawler = BookCrawler(scraper, str(Path(directory) / 'book.jsonl'), concurrency=concurrency)
+    Path(crawler.checkpoint_path).unlink(missing_ok=True)
+    error = None
+    started = time.perf_counter()
+    try:
+        asyncio.run(crawler.crawl_urls(base_url, urls))
+    except ScraperException as e:
+        error = str(e)
+    finally:
+        crawler.close()
+    seconds = time.perf_counter() - started
+    host = next(iter(scheduler.snapshot().values()))
+    stats = scraper.stats()
+    return {
+        'seconds': seconds,
+        'written': crawler.written,
+        'pages_per_second': crawler.written / seconds,
+        'requests': stats['requests'],
+        'throttled': stats['throttled'],
+        'error': error,
+        'final_rate': host['rate'],
+        'final_concurrency': host['concurrency'],
+        'backoffs': host['backoffs'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chapters', type=int, default=200, help="Chapters to crawl (default: 200)")
+    parser.add_argument('--characters', type=int, default=3000, help="Characters per chapter (default: 3000)")
+    parser.add_argument('--throttle', type=float, default=25, help="Requests per second the stand-in allows (default: 25)")
+    parser.add_argument('--capacity', type=int, default=6, help="Requests the stand-in serves at once (default: 6)")
+    parser.add_argument('--latency', type=float, default=20, help="Milliseconds per response (default: 20)")
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="Crawler workers (default: 8)")
+    parser.add_argument('--json', metavar='FILE', help="Write the results to FILE as JSON")
+    args = parser.parse_args(argv)
+    logging.disable(logging.ERROR) # Retries and refused requests are expected here
+
+    server, base_url = start_subprocess('--chapters', args.chapters, '--characters', args.characters,
+                                        '--latency', args.latency, '--throttle', args.throttle,
+                                        '--capacity', args.capacity)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for name, settings in RUNS.items():
+                results[name] = crawl(base_url, args.chapters, args.concurrency, settings, directory)
+                time.sleep(1.5) # Let the stand-in's bucket refill between runs
+    finally:
+        server.terminate()
+
+    print(f"Crawling {args.chapters} chapters from a stand-in allowing {args.throttle:g} request(s)/s, "
+          f"{args.capacity} at once, {args.latency:g} ms per response:")
+    for name, result in results.items():
+        outcome = f"stopped after {result['written']}: {result['error']}" if result['error'] else "complete"
+        print(f"  {name:<17} {result['pages_per_second']:6.1f} pages/s  {result['throttled']:4d} x 429 "
+              f"in {result['requests']} request(s); ended at {result['final_rate']:.1f}/s, "
+              f"{result['final_concurrency']} at once ({outcome})")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
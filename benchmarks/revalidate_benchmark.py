@@ -0,0 +1,125 @@
+"""Measures revalidating a cached book against a site that has edited a few chapters.
+
+Caches a generated book from a local stand-in site (see standin_server.py), then
+restarts the stand-in on the same port with every Nth chapter edited and runs the
+'revalidate' subcommand's code over the cached chapters. This is done twice: once
+against pages with stable ETags, where unchanged chapters cost a 304, and once
+with --dynamic pages whose ETag changes on every response, where unchanged
+chapters are recognised from the hash of their chapter region instead. Reports the
+bytes received next to the size of the stored pages, and whether exactly the
+edited chapters were found.
+
+    python benchmarks/revalidate_benchmark.py --chapters 2000 --edit-every 50 --json revalidate.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from helloreader.chapter_cache import ChapterCache  # noqa: E402
+from helloreader.politeness import HostScheduler  # noqa: E402
+from helloreader.revalidator import revalidate_chapters  # noqa: E402
+from helloreader.web_scraper import WebScraper  # noqa: E402
+
+from standin_server import start_subprocess  # noqa: E402
+
+
+def fill_cache(cache_path, base_url, chapters, concurrency):
+    """Fetches the book's index and every chapter into a new cache file."""
+    cache = ChapterCache(cache_path, max_bytes=1 << 40)
+    scheduler = HostScheduler(max_rate=0, initial_rate=1e6, initial_concurrency=concurrency,
+                              max_concurrency=concurrency, latency_tolerance=0)
+    scraper = WebScraper(cache=cache, max_connections_per_host=concurrency, scheduler=scheduler)
+    urls = [chapter['url'] for chapter in scraper.fetch_toc(f"{base_url}/html/0/1/")]
+    assert len(urls) == chapters, f"expected {chapters} chapters, found {len(urls)}"
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(scraper.fetch_chapter, urls))
+    stored_bytes = sum(cache.get_revalidation_info(url)['size'] for url in urls)
+    cache.close()
+    return urls, stored_bytes
+
+
+def measure(cache_path, urls, stored_bytes, edited, concurrency):
+    """Revalidates every cached chapter; returns counts, bytes received and time taken."""
+    cache = ChapterCache(cache_path, max_bytes=1 << 40)
+    # Unpaced: the stand-in never pushes back, and pacing would only blur the comparison
+    scheduler = HostScheduler(max_rate=0, initial_rate=1e6, initial_concurrency=concurrency,
+                              max_concurrency=concurrency, latency_tolerance=0)
+    scraper = WebScraper(cache=cache, max_connections_per_host=concurrency, scheduler=scheduler)
+    started = time.perf_counter()
+    results = asyncio.run(revalidate_chapters(scraper, urls, concurrency=concurrency))
+    seconds = time.perf_counter() - started
+    cache.close()
+    changed = {result.url for result in results if result.status == 'changed'}
+    transferred = sum(result.transferred for result in results)
+    return {
+        'seconds': seconds,
+        'changed': len(changed),
+        'unchanged': sum(1 for result in results if result.status == 'unchanged'),
+        'failed': sum(1 for result in results if result.status == 'failed'),
+        'found_exactly_the_edits': changed == edited,
+        'not_modified': scraper.stats()['not_modified'],
+        'transferred_bytes': transferred,
+        'stored_bytes': stored_bytes,
+        'transferred_share': transferred / stored_bytes if stored_bytes else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chapters', type=int, default=2000, help="Chapters in the book (default: 2000)")
+    parser.add_argument('--characters', type=int, default=3000, help="Characters per chapter (default: 3000)")
+    parser.add_argument('--edit-every', type=int, default=50, help="Every Nth chapter is edited (default: 50)")
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="Requests at once (default: 8)")
+    parser.add_argument('--json', metavar='FILE', help="Write the results to FILE as JSON")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING) # Per-page logging would be measured too
+
+    server_args = ['--chapters', args.chapters, '--characters', args.characters]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        original = Path(directory) / 'book.sqlite'
+        server, base_url = start_subprocess(*server_args)
+        try:
+            started = time.perf_counter()
+            urls, stored_bytes = fill_cache(original, base_url, args.chapters, args.concurrency)
+            fill_seconds = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+        edited = {url for url in urls if int(url.rsplit('/', 1)[1].split('.')[0]) % args.edit_every == 0}
+
+        port = urlparse(base_url).port # Restarted on the same port, so the cached URLs still match
+        for name, extra in (('etags', []), ('dynamic', ['--dynamic'])):
+            cache_path = Path(directory) / f'{name}.sqlite'
+            shutil.copyfile(original, cache_path)
+            server, _ = start_subprocess(*server_args, '--port', port, '--edit-every', args.edit_every, *extra)
+            try:
+                results[name] = measure(cache_path, urls, stored_bytes, edited, args.concurrency)
+            finally:
+                server.terminate()
+                server.wait()
+
+    print(f"Revalidating {args.chapters} cached chapters, {len(edited)} edited "
+          f"(first download: {stored_bytes / 1024 / 1024:.1f} MiB in {fill_seconds:.1f}s):")
+    for name, result in results.items():
+        print(f"  {name:<8} {result['seconds']:6.2f}s  {result['changed']} changed, {result['unchanged']} unchanged "
+              f"({result['not_modified']} not modified), exactly the edits: {result['found_exactly_the_edits']}; "
+              f"received {result['transferred_bytes'] / 1024:.0f} KiB = {result['transferred_share']:.1%} of the stored pages")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
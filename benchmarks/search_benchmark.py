@@ -0,0 +1,111 @@
+"""Measures the full-text search index: indexing throughput and query latency.
+
+Indexes a generated library (10,000 chapters by default) through SearchIndex, the
+way the app does as chapters are fetched, then times queries of several shapes:
+one character, a two-character word, a longer phrase, two terms, and a term that
+occurs nowhere. The text is drawn from a few thousand characters with a Zipf-like
+frequency, so common queries match thousands of chapters as they would in a real
+library (uniformly random text, as the page fixtures use, makes every query rare).
+
+    python benchmarks/search_benchmark.py --chapters 10000 --json search.json
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from helloreader.search_index import SearchIndex  # noqa: E402
+
+from fixtures import CJK_FIRST, CJK_LAST, PUNCTUATION  # noqa: E402
+
+VOCABULARY_SIZE = 3500 # Roughly the characters that cover 99% of modern Chinese text
+
+
+def make_chapters(count, characters, seed=0):
+    """Yields (url, chapter dict) for `count` chapters spread over books of 500 chapters."""
+    rng = random.Random(seed)
+    vocabulary = rng.sample([chr(code) for code in range(CJK_FIRST, CJK_LAST + 1)], VOCABULARY_SIZE)
+    weights = [1 / rank for rank in range(1, VOCABULARY_SIZE + 1)]
+    for number in range(count):
+        book = number // 500
+        paragraphs = []
+        for _ in range(max(1, characters // 150)):
+            text = ''.join(rng.choices(vocabulary, weights, k=150))
+            paragraphs.append('&nbsp;&nbsp;&nbsp;&nbsp;' + text + rng.choice(PUNCTUATION))
+        url = f"https://www.piaotia.com/html/0/{book}/{number}.html"
+        yield url, {
+            'title': f"第{number % 500 + 1}章 {''.join(rng.choices(vocabulary, weights, k=6))}",
+            'content_html': '<br /><br />'.join(paragraphs),
+            'book_url': f"https://www.piaotia.com/bookinfo/0/{book}.html",
+            'book_title': f"书{book}",
+        }, vocabulary
+
+
+def queries(sample_text, vocabulary):
+    """Query name -> query string, drawn from text that is in the index."""
+    return {
+        'one character': vocabulary[0],
+        'common word': vocabulary[0] + vocabulary[1],
+        'phrase (4)': sample_text[200:204],
+        'phrase (8)': sample_text[400:408],
+        'two terms': f"{sample_text[600:602]} {sample_text[900:902]}",
+        'absent': '𠀀𠀁', # Outside the generated vocabulary
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chapters', type=int, default=10000, help="Chapters to index (default: 10000)")
+    parser.add_argument('--characters', type=int, default=3000, help="Characters per chapter (default: 3000)")
+    parser.add_argument('--repeat', type=int, default=20, help="Runs of each query (default: 20)")
+    parser.add_argument('--json', metavar='FILE', help="Write the results to FILE as JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = SearchIndex(Path(directory) / 'search_index.sqlite3')
+        sample_text = None
+        started = time.perf_counter()
+        for url, chapter, vocabulary in make_chapters(args.chapters, args.characters):
+            if sample_text is None:
+                sample_text = chapter['content_html'].replace('&nbsp;', '')
+            index.add(url, chapter)
+        index.flush()
+        index_seconds = time.perf_counter() - started
+        index_bytes = sum(path.stat().st_size for path in Path(directory).iterdir())
+
+        results = {}
+        for name, query in queries(sample_text, vocabulary).items():
+            samples = []
+            for _ in range(args.repeat):
+                query_started = time.perf_counter()
+                matches = index.search(query)
+                samples.append(time.perf_counter() - query_started)
+            results[name] = {
+                'query': query,
+                'results': len(matches),
+                'median_ms': statistics.median(samples) * 1000,
+                'max_ms': max(samples) * 1000,
+            }
+        index.close()
+
+    print(f"Indexed {args.chapters} chapters in {index_seconds:.1f}s "
+          f"({args.chapters / index_seconds:.0f} chapters/s, {index_bytes / 1024 / 1024:.1f} MiB on disk)")
+    print(f"Query latency ({args.repeat} runs each, top 20 results with snippets):")
+    for name, result in results.items():
+        print(f"  {name:<14} {result['query']:<10} median {result['median_ms']:7.2f} ms  "
+              f"max {result['max_ms']:7.2f} ms  ({result['results']} result(s))")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'index_seconds': index_seconds, 'index_bytes': index_bytes,
+                       'queries': results}, f, indent=2, ensure_ascii=False)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
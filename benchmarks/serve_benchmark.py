@@ -0,0 +1,125 @@
+"""Measures how upstream load grows with the number of readers of the 'serve' mode.
+
+Serves a generated book from a local stand-in site (see standin_server.py) with
+--latency per response, runs the reader server in this process, and has 1, 10
+and 50 clients (each on its own keep-alive connection) read the same run of
+chapters through /book/<id>/<n> at the same time. Reports the requests that
+reached the stand-in next to the pages served, and the clients' response times.
+With coalescing the upstream count stays at about one per chapter (plus the
+index and the prefetcher's look-ahead) however many clients read.
+
+    python benchmarks/serve_benchmark.py --chapters 20 --clients 1 10 50 --json serve.json
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from helloreader.politeness import HostScheduler  # noqa: E402
+from helloreader.reader_server import ReaderServer  # noqa: E402
+from helloreader.web_scraper import WebScraper  # noqa: E402
+
+from standin_server import start_subprocess  # noqa: E402
+
+
+def start_server(scraper):
+    """Runs a ReaderServer on a free port in a background event loop; returns (server, port)."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    address = {}
+
+    def ready(base_url):
+        address['port'] = int(base_url.rsplit(':', 1)[1])
+        started.set()
+
+    server = ReaderServer(scraper, allow_any_site=True)
+    threading.Thread(target=loop.run_until_complete, args=(server.serve('127.0.0.1', 0, ready),), daemon=True).start()
+    started.wait()
+    return server, address['port']
+
+
+def read_book(port, path, chapters):
+    """One client: reads chapters 1..chapters in order on one connection; returns each response time."""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    timings = []
+    for n in range(1, chapters + 1):
+        started = time.perf_counter()
+        connection.request('GET', f"{path}/{n}", headers={'Accept': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        timings.append(time.perf_counter() - started)
+        assert response.status == 200, f"chapter {n}: HTTP {response.status}"
+    connection.close()
+    return timings
+
+
+def measure(base_url, clients, chapters, latency):
+    """Serves the book afresh to clients concurrent readers; returns the run's figures."""
+    # Unpaced: the stand-in never pushes back, and pacing would only blur the comparison
+    scraper = WebScraper(scheduler=HostScheduler(max_rate=0, initial_rate=1e6, initial_concurrency=8,
+                                                 max_concurrency=8, latency_tolerance=0))
+    server, port = start_server(scraper)
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('GET', f"/toc?url={base_url}/html/0/1/")
+    book = json.loads(connection.getresponse().read())['book']
+    connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        timings = [t for result in executor.map(lambda _: read_book(port, f"/book/{book}", chapters), range(clients))
+                   for t in result]
+    seconds = time.perf_counter() - started
+    time.sleep(4 * latency / 1000) # Let the look-ahead started by the last chapters land before counting
+    timings.sort()
+    return {
+        'seconds': seconds,
+        'pages_served': len(timings),
+        'upstream_requests': scraper.stats()['requests'],
+        'coalesced': server.counts['coalesced'],
+        'median_ms': statistics.median(timings) * 1000,
+        'p95_ms': timings[int(len(timings) * 0.95) - 1] * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chapters', type=int, default=20, help="Chapters each client reads (default: 20)")
+    parser.add_argument('--characters', type=int, default=3000, help="Characters per chapter (default: 3000)")
+    parser.add_argument('--latency', type=float, default=150, help="Milliseconds per upstream response (default: 150)")
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 10, 50], help="Reader counts to try (default: 1 10 50)")
+    parser.add_argument('--json', metavar='FILE', help="Write the results to FILE as JSON")
+    args = parser.parse_args(argv)
+    logging.disable(logging.ERROR) # Per-page logging would be measured too; the walk behind chapter 1 hits the index page
+
+    # A few spare chapters so the look-ahead past the last one read finds pages too
+    server, base_url = start_subprocess('--chapters', args.chapters + 5, '--characters', args.characters,
+                                        '--latency', args.latency)
+    results = {}
+    try:
+        for clients in args.clients:
+            results[clients] = measure(base_url, clients, args.chapters, args.latency)
+    finally:
+        server.terminate()
+
+    print(f"{args.chapters} chapters read by each client from a stand-in taking {args.latency:g} ms per response:")
+    for clients, result in results.items():
+        print(f"  {clients:3d} client(s)  {result['pages_served']:5d} pages served with {result['upstream_requests']:3d} "
+              f"upstream request(s) ({result['coalesced']} coalesced) in {result['seconds']:.1f}s; "
+              f"median {result['median_ms']:.0f} ms, p95 {result['p95_ms']:.0f} ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""A local HTTP stand-in for a novel site, so benchmarks never touch the real one.
+
+Serves generated pages (see fixtures.py) laid out like piaotia.com:
+
+    /html/0/<book>/             the book's index (also index.html)
+    /html/0/<book>/<n>.html     chapter n, linking to n-1 and n+1
+    /bookinfo/0/<book>.html     the book page
+
+or, with --corpus, the files of a directory of saved pages at their relative
+paths. Responses are GBK with a bare 'text/html' Content-Type like the real
+site, over keep-alive HTTP/1.1, with ETags and 304s. --latency adds a fixed
+delay per response to stand in for a real network round trip. --edit-every N
+fixes a "typo" in every Nth chapter, so a restarted stand-in serves an edited
+book, and --dynamic rotates an ad on every response, like sites whose pages
+(and so ETags) are never the same twice. To stand in for a site that protects
+itself, --throttle answers requests beyond a rate with 429 and a Retry-After, and
+--capacity serves only so many requests at once, so more just queue and wait
+longer for their headers.
+
+    python benchmarks/standin_server.py --port 8765 --latency 20
+"""
+import argparse
+import hashlib
+import itertools
+import re
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from fixtures import chapter_html, load_corpus, toc_page
+
+CHAPTER_PATH = re.compile(r'^/html/0/(\d+)/(\d+)\.html$')
+TOC_PATH = re.compile(r'^/html/0/(\d+)/(?:index\.html)?$')
+BOOK_PATH = re.compile(r'^/bookinfo/0/(\d+)\.html$')
+
+
+class StandInSite:
+    """Builds (or loads) page bodies on first request and keeps them in memory."""
+
+    def __init__(self, chapters=100, characters=4000, charset='gbk', corpus=None, edit_every=0):
+        self.chapters = chapters
+        self.characters = characters
+        self.charset = charset
+        self.edit_every = edit_every
+        self._pages = {}
+        self._lock = threading.Lock()
+        if corpus:
+            for name, raw in load_corpus(corpus):
+                self._pages['/' + name.replace('\\', '/')] = raw
+
+    def page(self, path):
+        """Returns the body for path, or None for a 404."""
+        with self._lock:
+            raw = self._pages.get(path)
+        if raw is not None:
+            return raw
+        match = CHAPTER_PATH.match(path)
+        if match and 1 <= int(match.group(2)) <= self.chapters:
+            chapter = int(match.group(2))
+            html, _ = chapter_html(int(match.group(1)), chapter, self.chapters, self.characters, self.charset)
+            if self.edit_every and chapter % self.edit_every == 0:
+                html = html.replace('。', '！', 1) # One character of the text, as a typo fix would
+            raw = html.encode(self.charset)
+        elif TOC_PATH.match(path):
+            raw = toc_page(int(TOC_PATH.match(path).group(1)), self.chapters, self.charset)
+        elif BOOK_PATH.match(path):
+            raw = f'<html><body><a href="/html/0/{BOOK_PATH.match(path).group(1)}/">目录</a></body></html>'.encode(self.charset)
+        else:
+            return None
+        with self._lock:
+            self._pages[path] = raw
+        return raw
+
+
+class Throttle:
+    """A token bucket over all clients: requests beyond `rate` per second are refused."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate / 4)
+        self.tokens = self.burst
+        self.refilled_at = time.monotonic()
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+            self.refilled_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.refused += 1
+            return False
+
+
+def make_handler(site, latency, dynamic=False, throttle=None, capacity=None):
+    ad_serial = itertools.count()
+    workers = threading.BoundedSemaphore(capacity) if capacity else None
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1' # Keep-alive, as real sites do
+        # Headers and body go out as one segment; otherwise Nagle plus delayed ACKs
+        # add ~40 ms to every local round trip
+        disable_nagle_algorithm = True
+        wbufsize = -1
+
+        def do_GET(self):
+            if throttle is not None and not throttle.allow():
+                self._reply(429, b'Too many requests', headers={'Retry-After': '1'})
+                return
+            if workers is not None:
+                with workers: # Beyond capacity, requests queue here like at an overloaded server
+                    self._serve()
+            else:
+                self._serve()
+
+        def _serve(self):
+            if latency:
+                time.sleep(latency)
+            raw = site.page(self.path.split('?', 1)[0])
+            if raw is None:
+                self._reply(404, b'Not found')
+                return
+            if dynamic:
+                raw = raw.replace(b'/scripts/ad.js', f'/scripts/ad.js?serial={next(ad_serial)}'.encode(), 1)
+            etag = '"' + hashlib.sha1(raw).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self._reply(304, b'', etag)
+            else:
+                self._reply(200, raw, etag)
+
+        def _reply(self, status, body, etag=None, headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            if etag:
+                self.send_header('ETag', etag)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_subprocess(*args):
+    """Starts the stand-in in its own process (so it does not compete for the
+    benchmark's GIL) and returns (process, base URL)."""
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), '--port', '0', *map(str, args)],
+        stdout=subprocess.PIPE, text=True
+    )
+    line = process.stdout.readline()
+    if not line.startswith('Serving on '):
+        process.kill()
+        raise RuntimeError(f"Stand-in server did not start: {line!r}")
+    return process, line[len('Serving on '):].strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve fixture novel pages over local HTTP")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on; 0 picks a free one (default: 8765)")
+    parser.add_argument('--latency', type=float, default=0, help="Milliseconds to wait before each response")
+    parser.add_argument('--chapters', type=int, default=100, help="Chapters per generated book (default: 100)")
+    parser.add_argument('--characters', type=int, default=4000, help="Characters per generated chapter (default: 4000)")
+    parser.add_argument('--corpus', help="Serve the saved pages in this directory instead")
+    parser.add_argument('--edit-every', type=int, default=0, help="Change one character in every Nth chapter")
+    parser.add_argument('--dynamic', action='store_true', help="Vary an ad link (and so the ETag) on every response")
+    parser.add_argument('--throttle', type=float, help="Answer requests beyond this many per second with 429")
+    parser.add_argument('--capacity', type=int, help="Serve at most this many requests at once; others queue")
+    args = parser.parse_args(argv)
+
+    site = StandInSite(args.chapters, args.characters, corpus=args.corpus, edit_every=args.edit_every)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(
+        site, args.latency / 1000, args.dynamic, Throttle(args.throttle) if args.throttle else None, args.capacity))
+    server.daemon_threads = True
+    print(f"Serving on http://127.0.0.1:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Measures time to first readable text on a cold start.
+
+Each scenario runs in a fresh interpreter, timed from process launch until the
+first chapter's HTML document is ready to hand to the WebView (the GUI toolkit
+itself is left out, so this runs headless):
+
+    eager-network   the old start-up: import requests up front, fetch the bookmarked
+                    chapter from the (stand-in) site, extract, render
+    lazy-network    the new start-up with nothing cached: requests is only imported
+                    once the fetch needs it
+    cached          the new start-up with the bookmark in the chapter cache: one
+                    cache read and a render, no HTTP stack imported at all
+
+    python benchmarks/startup_benchmark.py --runs 10 --json startup.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+
+from standin_server import start_subprocess  # noqa: E402
+
+# Runs in the child; prints one JSON line once the document is ready
+CHILD = r"""
+import json, sys, time
+scenario, url, cache_path = sys.argv[1:4]
+if scenario == 'eager-network':
+    import requests  # The old web_scraper imported requests (and bs4) at module level
+    try:
+        import bs4
+    except ImportError:
+        pass
+import logging
+from pathlib import Path
+from helloreader.web_scraper import WebScraper
+from helloreader.chapter_cache import ChapterCache
+from helloreader.renderer import ChapterRenderer
+logging.disable(logging.WARNING)
+scraper = WebScraper(cache=ChapterCache(Path(cache_path)) if cache_path != '-' else None)
+if scenario == 'cached':
+    data = scraper.cache.get_chapter(url, allow_stale=True)
+else:
+    data = scraper.fetch_chapter(url)
+data['_base_url'] = url
+document = ChapterRenderer().document(data)
+print(json.dumps({'ready': True, 'requests_imported': 'requests' in sys.modules, 'bytes': len(document)}), flush=True)
+"""
+
+SCENARIOS = ('eager-network', 'lazy-network', 'cached')
+
+
+def run_child(scenario, url, cache_path):
+    """Returns (seconds from launch to document ready, child's report)."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT / 'src'))
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', CHILD, scenario, url, cache_path],
+                               stdout=subprocess.PIPE, text=True, env=env)
+    line = process.stdout.readline()
+    elapsed = time.perf_counter() - started
+    process.wait()
+    report = json.loads(line)
+    return elapsed, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="Cold starts per scenario (default: 5)")
+    parser.add_argument('--latency', type=float, default=100,
+                        help="Simulated network latency in ms for the network scenarios (default: 100)")
+    parser.add_argument('--json', metavar='FILE', help="Write the results to FILE as JSON")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+
+    from helloreader.chapter_cache import ChapterCache
+    from helloreader.web_scraper import WebScraper
+
+    server, base_url = start_subprocess('--chapters', 10, '--latency', args.latency)
+    url = f"{base_url}/html/0/1/3.html"
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = Path(directory) / 'chapter_cache.sqlite3'
+            # The cached scenario reads what an earlier session stored
+            cache = ChapterCache(cache_path)
+            WebScraper(cache=cache).fetch_chapter(url)
+            cache.close()
+
+            for scenario in SCENARIOS:
+                samples = []
+                for _ in range(args.runs):
+                    elapsed, report = run_child(scenario, url, str(cache_path) if scenario == 'cached' else '-')
+                    samples.append(elapsed)
+                results[scenario] = {
+                    'median_ms': statistics.median(samples) * 1000,
+                    'min_ms': min(samples) * 1000,
+                    'max_ms': max(samples) * 1000,
+                    'requests_imported': report['requests_imported'],
+                }
+    finally:
+        server.terminate()
+
+    print(f"Time from launch to first readable text ({args.runs} cold starts each, "
+          f"{args.latency:g} ms simulated latency):")
+    for scenario, result in results.items():
+        print(f"  {scenario:<14} median {result['median_ms']:7.1f} ms  (min {result['min_ms']:.1f}, "
+              f"max {result['max_ms']:.1f})  requests imported: {result['requests_imported']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'scenarios': results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,18 @@
-from helloreader.app import main
+import sys
+
+# The names in cli.COMMANDS, listed here so that starting the GUI does not import
+# cli and with it argparse and the modules only the subcommands use (crawler,
+# export, revalidator, the reader server)
+COMMAND_NAMES = ('crawl', 'check', 'library', 'search', 'export', 'revalidate', 'serve')
 
 if __name__ == '__main__':
+    if any(arg in COMMAND_NAMES for arg in sys.argv[1:]):
+        # Headless subcommands (e.g. 'crawl', possibly after global options like --trace)
+        # never import the GUI toolkit
+        from helloreader.cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+
+    from helloreader.app import main
     # This will start the Toga app defined in your app.py file
     # (assuming your main app instance function is called 'main')
-    main().main_loop()
\ No newline at end of file
+    main().main_loop()
@@ -1,45 +1,48 @@
 import toga
 from toga.style import Pack
 from toga.style.pack import COLUMN, ROW, HIDDEN, VISIBLE
-import html # For escaping content
 import logging
 import json # For config persistence
 import os # For config path
 import asyncio # Needed for async dialog handling
+import time # For load timings
+import functools
 from pathlib import Path # Add this import
 
 # Import the scraper and its exception class
 from .web_scraper import WebScraper, ScraperException
-
-# Define the HTML template structure - Base
-HTML_TEMPLATE = """
-<html>
-<head>
-    <meta charset="UTF-8">
-    <style>
-        body {{ /* Double braces for literal CSS brace */
-            font-family: 'Songti SC', 'PingFang SC', sans-serif;
-            background-color: {background_color}; /* Single braces for placeholder */
-            color: {text_color}; /* Single braces for placeholder */
-            font-size: 2.0em; 
-            line-height: 1.6;
-            margin: 20px;
-        }} /* Double braces for literal CSS brace */
-        #content {{ /* Double braces for literal CSS brace */
-            white-space: pre-wrap; 
-        }} /* Double braces for literal CSS brace */
-    </style>
-</head>
-<body>
-    <!-- H1 removed as title is in window bar -->
-    <div id="content">{content}</div> /* Single braces for placeholder */
-</body>
-</html>
-"""
+from .prefetcher import ChapterPrefetcher, DEFAULT_PREFETCH_SETTINGS
+from .history import ChapterHistory, DEFAULT_HISTORY_SETTINGS
+from .chapter_cache import ChapterCache, DEFAULT_CACHE_SETTINGS
+from .politeness import DEFAULT_POLITENESS_SETTINGS
+from .book_checker import check_followed_books
+from .renderer import ChapterRenderer, THEMES
+from .instrumentation import tracer, format_snapshot
+from .search_index import SearchIndex
+from .config_store import ConfigStore
+from .read_aloud import AudioCache, Pyttsx3Synthesizer, ReadAloud, ReadAloudError, DEFAULT_READ_ALOUD_SETTINGS
 
 # Config file name (will be joined with app data path)
 CONFIG_FILENAME = 'helloreader_config.json'
 
+# On-disk chapter cache (also joined with app data path)
+CACHE_FILENAME = 'chapter_cache.sqlite3'
+
+# Full-text index of fetched chapters (also joined with app data path)
+SEARCH_INDEX_FILENAME = 'search_index.sqlite3'
+
+# Synthesised read-aloud audio (joined with the app cache path)
+AUDIO_CACHE_DIRNAME = 'read_aloud'
+
+# Directory (under the app config path) for user-supplied site profiles
+SITE_PROFILES_DIRNAME = 'site_profiles'
+
+# Seconds between continuous-scroll checks of which chapter is in view
+CONTINUOUS_POLL_SECONDS = 0.5
+
+# Seconds between checks of how far down the chapter the reader has scrolled
+SCROLL_POLL_SECONDS = 2.0
+
 # Default URL for testing
 DEFAULT_TEST_URL = "https://www.piaotia.com/html/0/757/11485522.html"
 
@@ -92,17 +95,117 @@ class UrlInputDialog(toga.Window):
         return self.future.__await__()
 
 
+# --- Load statistics panel ---
+class StatsWindow(toga.Window):
+    """Shows per-stage load timings and counters from the tracer; refreshed on demand."""
+
+    def __init__(self):
+        super().__init__(title="Load Statistics", size=(560, 420))
+        self.text = toga.MultilineTextInput(readonly=True, style=Pack(flex=1, font_family='monospace'))
+        refresh_button = toga.Button("Refresh", on_press=self.refresh)
+        reset_button = toga.Button("Reset", on_press=self.reset)
+        button_box = toga.Box(
+            children=[reset_button, toga.Box(style=Pack(flex=1)), refresh_button],
+            style=Pack(direction=ROW, padding_top=5)
+        )
+        self.content = toga.Box(children=[self.text, button_box], style=Pack(direction=COLUMN, padding=10))
+        self.refresh()
+
+    def refresh(self, widget=None, **kwargs):
+        self.text.value = format_snapshot(tracer.snapshot()) or "Nothing recorded yet."
+
+    def reset(self, widget=None, **kwargs):
+        tracer.reset()
+        self.refresh()
+
+
+# --- Chapter search ---
+class SearchWindow(toga.Window):
+    """Searches the text of every fetched chapter; activating a result opens it in the reader."""
+
+    def __init__(self, reader):
+        super().__init__(title="Search Chapters", size=(640, 480))
+        self.reader = reader
+        self.query_input = toga.TextInput(placeholder="Words from the chapter...", on_confirm=self.search,
+                                          style=Pack(flex=1, padding_right=5))
+        search_button = toga.Button("Search", on_press=self.search, style=Pack(width=80))
+        self.book_only = toga.Switch("This book only")
+        self.results_table = toga.Table(
+            headings=["Chapter", "Book", "Match"],
+            accessors=['title', 'book', 'snippet'],
+            on_activate=self.open_result,
+            style=Pack(flex=1, padding_top=5)
+        )
+        self.status = toga.Label("", style=Pack(padding_top=5))
+        query_box = toga.Box(children=[self.query_input, search_button], style=Pack(direction=ROW))
+        self.content = toga.Box(
+            children=[query_box, self.book_only, self.results_table, self.status],
+            style=Pack(direction=COLUMN, padding=10)
+        )
+
+    async def search(self, widget=None, **kwargs):
+        query = self.query_input.value.strip()
+        if not query:
+            return
+        book_url = None
+        if self.book_only.value and self.reader.last_scraped_data:
+            book_url = self.reader.last_scraped_data.get('book_url')
+        # The query runs on a worker thread; the index is never locked by the indexing thread
+        results = await self.reader.loop.run_in_executor(
+            None, functools.partial(self.reader.search_index.search, query, book_url=book_url)
+        )
+        self.results_table.data = [
+            {'title': result['title'], 'book': result['book_title'] or '', 'snippet': result['snippet'], 'url': result['url']}
+            for result in results
+        ]
+        self.status.text = f"{len(results)} result(s)" if results else "No chapters match."
+
+    def open_result(self, widget, row=None, **kwargs):
+        if row is not None:
+            self.reader.load_url_and_update_ui(row.url)
+            self.reader.main_window.show()
+
+
 class HelloReader(toga.App):
     def __init__(self, formal_name, app_id):
         
         super().__init__(formal_name=formal_name, app_id=app_id)
         self.scraper = WebScraper() # Instantiate the scraper
+        self.prefetcher = ChapterPrefetcher(self.scraper) # Buffers chapters around the current one
+        self.prefetch_settings = dict(DEFAULT_PREFETCH_SETTINGS)
+        self.history = ChapterHistory() # Chapters already shown, with their rendered documents
+        self.history_settings = dict(DEFAULT_HISTORY_SETTINGS)
+        self.read_aloud = None # Created the first time the reader asks for it
+        self.read_aloud_settings = dict(DEFAULT_READ_ALOUD_SETTINGS)
+        self.cache_settings = dict(DEFAULT_CACHE_SETTINGS)
+        self.politeness_settings = dict(DEFAULT_POLITENESS_SETTINGS)
+        self.offline = False # Serve chapters only from the on-disk cache
         self.current_url = None
         self.next_page_url = None
         self.previous_page_url = None
         self.last_scraped_data = None # Store last successful scrape
+        self.renderer = ChapterRenderer() # Builds the shell page and in-place update scripts
+        self._shell_loaded = False # True once the WebView holds a shell page that scripts can update
         self.current_theme = 'dark' # Default theme
         self.bookmarked_url = None # Store loaded bookmark
+        self.config_store = None # Saved state, written in the background (see load_config)
+        self._scroll_task = None # Task recording the scroll offset for the saved position
+        self._load_task = None # asyncio task for the chapter load currently in flight
+        self._loading_url = None # URL that _load_task is fetching
+        self._load_generation = 0 # Bumped per load; only the newest generation may touch the UI
+        self._load_started = None # perf_counter() when the current load was requested
+        self._set_content_at = None # perf_counter() of the last set_content, until the page reports loaded
+        self.trace_file = None # Optional JSON-lines file every timing span is appended to
+        self._launched_at = time.perf_counter() # For time-to-first-readable-text
+        self._first_text_recorded = False
+        self._shown_from_cache = False # The startup chapter came from the cache and still needs a live check
+        self.stats_window = None
+        self.search_index = None # Full-text index that fetched chapters are added to
+        self.search_window = None
+        self.continuous = False # Continuous-scroll mode: chapters are appended instead of replaced
+        self._continuous_task = None # Task polling the WebView while continuous mode is on
+        self._appending = False # A chapter is being fetched for the bottom of the page
+        self._restoring = set() # URLs of placeholders being refilled
         # self.load_config() # Load theme and bookmark
 
     @property
@@ -112,50 +215,98 @@ class HelloReader(toga.App):
         return self.paths.data / CONFIG_FILENAME
 
     def load_config(self):
-        """Loads theme and last URL preference from config file."""
+        """Loads theme, bookmark and settings from the config file."""
+        self.config_store = ConfigStore(self.config_path)
+        config = self.config_store.load()
         try:
-            config_path = self.config_path
-            if config_path.exists():
-                with config_path.open('r') as f:
-                    config = json.load(f)
-                    self.current_theme = config.get('theme', 'dark')
-                    self.bookmarked_url = config.get('last_url', None)
-                    logging.info(f"Loaded config from {config_path}: theme={self.current_theme}, last_url={self.bookmarked_url}")
-            else:
-                logging.info(f"Config file not found at {config_path}. Using defaults.")
+            self.current_theme = config.get('theme', 'dark')
+            self.bookmarked_url = config.get('last_url', None)
+            self.prefetch_settings.update(config.get('prefetch', {}))
+            self.history_settings.update(config.get('history', {}))
+            self.read_aloud_settings.update(config.get('read_aloud', {}))
+            self.cache_settings.update(config.get('cache', {}))
+            self.politeness_settings.update(config.get('politeness', {}))
+            self.offline = bool(config.get('offline', False))
+            self.trace_file = config.get('trace_file')
+            self.continuous = bool(config.get('continuous', False))
+            logging.info("Config: theme=%s, last_url=%s", self.current_theme, self.bookmarked_url)
         except Exception as e:
-            logging.warning(f"Could not load config file {self.config_path}: {e}")
+            logging.warning("Could not apply config file %s: %s", self.config_path, e)
             # Ensure defaults are set even if loading fails
             self.current_theme = self.current_theme or 'dark'
             self.bookmarked_url = self.bookmarked_url or None
+        self.prefetcher.configure(**self.prefetch_settings)
+        self.history.configure(**self.history_settings)
+        self.scraper.scheduler.configure(**self.politeness_settings)
 
     def save_config(self):
-        """Saves current theme and last URL preference to config file."""
-        config_path = self.config_path
+        """Records theme, bookmark and settings; the file is written shortly after, in the background."""
+        self.config_store.update(
+            theme=self.current_theme,
+            # The chapter on screen, or the bookmark if nothing has loaded yet
+            last_url=self.current_url or self.bookmarked_url,
+            prefetch=dict(self.prefetch_settings),
+            history=dict(self.history_settings),
+            read_aloud=dict(self.read_aloud_settings),
+            cache=dict(self.cache_settings),
+            politeness=dict(self.politeness_settings),
+            offline=self.offline,
+            trace_file=self.trace_file,
+            continuous=self.continuous,
+        )
+
+    def _remember_position(self, url, data):
+        """Saves the chapter as the reader's place in its book and adds it to the reading history."""
+        self.config_store.set_position(data.get('book_url') or url, url)
+        self.config_store.add_recent(url, data.get('title'), data.get('book_title'))
+
+    def on_exit(self):
+        """Writes any state change still waiting for the debounce before the app quits."""
+        if self.read_aloud is not None:
+            self.read_aloud.stop()
+        self.config_store.flush()
+        return True
+
+    def open_chapter_cache(self):
+        """Attaches the on-disk chapter cache to the scraper; reading still works without it."""
         try:
-            # Only save last_url if current_url is set (meaning a page was successfully loaded)
-            url_to_save = self.current_url if self.current_url else self.bookmarked_url
-            config = {
-                'theme': self.current_theme,
-                'last_url': url_to_save
-            }
-            # Ensure config is only saved if url_to_save is not None
-            if url_to_save:
-                # Ensure the data directory exists
-                config_path.parent.mkdir(parents=True, exist_ok=True)
-                with config_path.open('w') as f:
-                    json.dump(config, f)
-                logging.info(f"Saved config to {config_path}: {config}")
-            else:
-                logging.info("Skipping save, no valid URL to save.")
+            self.scraper.cache = ChapterCache(self.paths.data / CACHE_FILENAME, **self.cache_settings)
+            logging.info("Opened chapter cache at %s", self.scraper.cache.path)
+        except Exception as e:
+            logging.warning("Could not open chapter cache: %s", e)
+            self.scraper.cache = None
+        self.scraper.offline = self.offline
+
+    def open_search_index(self):
+        """Opens the full-text index and has the scraper add every chapter it fetches."""
+        try:
+            self.search_index = SearchIndex(self.paths.data / SEARCH_INDEX_FILENAME)
+        except Exception as e:
+            logging.warning("Could not open search index: %s", e)
+            self.search_index = None
+        self.scraper.search_index = self.search_index
+
+    async def _index_cached_chapters(self):
+        """Adds cached chapters that are not in the search index yet (e.g. fetched before it existed)."""
+        try:
+            await self.loop.run_in_executor(None, self.search_index.add_many, self.scraper.cache.iter_chapters())
         except Exception as e:
-            logging.warning(f"Could not save config file {config_path}: {e}")
+            logging.warning("Could not index cached chapters: %s", e)
 
     def startup(self):
         # Load config first to get the bookmarked URL
         self.load_config()
+        self.open_chapter_cache()
+        self.open_search_index()
+        # Sites added by the user: one JSON profile per site, on top of the built-in ones
+        self.scraper.profiles.load_directory(self.paths.config / SITE_PROFILES_DIRNAME)
+        if self.trace_file:
+            try:
+                tracer.open_trace(self.trace_file)
+            except OSError as e:
+                logging.warning("Could not open trace file %s: %s", self.trace_file, e)
 
-        print("--- HelloReader startup initiated ---")
+        logging.debug("--- HelloReader startup initiated ---")
         # --- UI Elements --- 
         main_box = toga.Box(style=Pack(direction=COLUMN))
 
@@ -163,7 +314,7 @@ class HelloReader(toga.App):
         self.main_box = main_box
 
         # WebView for content display
-        self.webview = toga.WebView(style=Pack(flex=1))
+        self.webview = toga.WebView(style=Pack(flex=1), on_webview_load=self.on_webview_load)
 
 # --- Navigation Buttons ---
         # Remove style=Pack(margin=5) from individual buttons
@@ -198,7 +349,7 @@ class HelloReader(toga.App):
         nav_button_box.add(self.next_button)
 
         # --- New URL Input Elements ---
-        self.url_input = toga.TextInput(placeholder="Enter URL here...", style=Pack(flex=1, padding_right=5))
+        self.url_input = toga.TextInput(placeholder="Enter URL (or #N for chapter N) here...", style=Pack(flex=1, padding_right=5))
         self.confirm_load_button = toga.Button("Load", on_press=self.confirm_load_url, style=Pack(width=60))
         # Use display='none' to hide and reclaim space
         self.url_input_box = toga.Box(style=Pack(direction=ROW, padding=5))
@@ -215,6 +366,34 @@ class HelloReader(toga.App):
         self.main_window = toga.MainWindow(title=self.formal_name)
         self.main_window.content = self.main_box
 
+        # Offline mode lives in the View menu; it survives restarts via the config file
+        self.offline_command = toga.Command(
+            self.toggle_offline,
+            text="Go Online" if self.offline else "Offline Mode (cached chapters only)",
+            group=toga.Group.VIEW
+        )
+        self.commands.add(self.offline_command)
+        self.continuous_command = toga.Command(
+            self.toggle_continuous,
+            text="Page by Page" if self.continuous else "Continuous Scroll",
+            group=toga.Group.VIEW
+        )
+        self.commands.add(self.continuous_command)
+        self.commands.add(toga.Command(self.show_stats, text="Load Statistics", group=toga.Group.VIEW))
+        self.read_aloud_command = toga.Command(self.toggle_read_aloud, text="Read Aloud", group=toga.Group.VIEW)
+        self.commands.add(
+            self.read_aloud_command,
+            toga.Command(self.stop_read_aloud, text="Stop Reading Aloud", group=toga.Group.VIEW)
+        )
+
+        # Followed books live in the chapter cache alongside their tables of contents
+        books_group = toga.Group("Books")
+        self.commands.add(
+            toga.Command(self.follow_current_book, text="Follow This Book", group=books_group),
+            toga.Command(self.check_followed_books, text="Check Followed Books for New Chapters", group=books_group),
+            toga.Command(self.show_search, text="Search Chapters...", shortcut=toga.Key.MOD_1 + 'f', group=books_group)
+        )
+
         # Apply initial theme to containers *and* window
         self._apply_theme_to_containers()
 
@@ -222,71 +401,179 @@ class HelloReader(toga.App):
         initial_url = None
         if self.bookmarked_url:
             initial_url = self.bookmarked_url
-            print(f"--- Found bookmarked URL: {initial_url} ---")
+            logging.debug("--- Found bookmarked URL: %s ---", initial_url)
         elif DEFAULT_TEST_URL:
             initial_url = DEFAULT_TEST_URL
-            print(f"--- No bookmark, using default test URL: {initial_url} ---")
+            logging.debug("--- No bookmark, using default test URL: %s ---", initial_url)
         else:
-            print("--- No bookmark or default URL found, not auto-loading --- ")
+            logging.debug("--- No bookmark or default URL found, not auto-loading --- ")
 
         if initial_url:
-            print(f"--- Scheduling background load for: {initial_url} ---")
+            logging.debug("--- Scheduling background load for: %s ---", initial_url)
             # Store the URL to be loaded by the on_running handler
             self.initial_url_to_load = initial_url
+            # Readable straight away: the last chapter's cached copy goes on screen before
+            # the window appears, and on_running checks it against the site afterwards
+            self._shown_from_cache = self.show_cached_chapter(initial_url)
         else:
             self.initial_url_to_load = None # Ensure it's defined
 
-        print("--- Content set, attempting to show window ---")
+        logging.debug("--- Content set, attempting to show window ---")
         self.main_window.show()
-        print("--- main_window.show() called ---")
+        logging.debug("--- main_window.show() called ---")
 
     async def on_running(self):
         """Called by Toga after startup, once the event loop is running."""
-        print("--- on_running triggered ---")
-        if self.initial_url_to_load:
-            print(f"--- Loading initial URL via on_running: {self.initial_url_to_load} ---")
+        logging.debug("--- on_running triggered ---")
+        if self.continuous:
+            self._start_continuous_polling()
+        self._start_scroll_tracking()
+        if self.search_index is not None and self.scraper.cache is not None:
+            self.loop.create_task(self._index_cached_chapters())
+        if self._shown_from_cache:
+            logging.debug("--- Refreshing cached initial chapter in the background: %s ---", self.initial_url_to_load)
+            self.prefetcher.start(self.current_url, self.last_scraped_data)
+            self._load_generation += 1
+            self._load_task = self.loop.create_task(self._refresh_chapter(self.current_url, self._load_generation))
+        elif self.initial_url_to_load:
+            logging.debug("--- Loading initial URL via on_running: %s ---", self.initial_url_to_load)
             self.load_url_and_update_ui(self.initial_url_to_load)
         else:
-            print("--- No initial URL to load in on_running ---")
+            logging.debug("--- No initial URL to load in on_running ---")
+
+    def show_cached_chapter(self, url):
+        """Displays the cached copy of url, however old, without touching the network.
+
+        Returns True if there was one. Saving the config, prefetching and the live
+        check are left to on_running, so nothing here waits on I/O beyond one cache read.
+        """
+        if self.scraper.cache is None:
+            return False
+        try:
+            data = self.scraper.cache.get_chapter(url, allow_stale=True)
+        except Exception as e:
+            logging.warning("Could not read %s from the chapter cache: %s", url, e)
+            return False
+        if data is None:
+            return False
+        data['_base_url'] = url
+        self.update_ui_with_content(data, from_cache_at_startup=True)
+        return True
+
+    async def _refresh_chapter(self, url, generation):
+        """Revalidates the chapter shown from the cache and applies any change the site made."""
+        try:
+            fresh = await self.scraper.fetch_chapter_async(url, revalidate=True)
+        except ScraperException as e:
+            # The cached copy is already on screen; it just stays there
+            logging.warning("Could not refresh %s: %s", url, e)
+            return
+        except Exception as e:
+            # Extraction or cache errors too: nothing awaits this task, so log and keep the cached page
+            logging.warning("Error refreshing %s: %s", url, e, exc_info=True)
+            return
+        if generation != self._load_generation or fresh is None:
+            return # The reader has moved on
+        shown = self.last_scraped_data or {}
+        fresh['_base_url'] = url
+        if fresh.get('title') != shown.get('title') or fresh.get('content_html') != shown.get('content_html'):
+            logging.info("Chapter %s changed since it was cached; updating", url)
+            self.update_ui_with_content(fresh)
+        elif (fresh.get('next_page_url'), fresh.get('previous_page_url')) != (self.next_page_url, self.previous_page_url):
+            # Typically the last chapter of a book that has since grown: only the links changed,
+            # so keep the reader's scroll position and just enable the buttons
+            self.last_scraped_data = fresh
+            self.history.put(url, fresh)
+            self.next_page_url = fresh.get('next_page_url')
+            self.previous_page_url = fresh.get('previous_page_url')
+            self.next_button.enabled = bool(self.next_page_url)
+            self.previous_button.enabled = bool(self.previous_page_url)
+            self.prefetcher.start(url, fresh)
 
     def format_html_content(self, data, theme='dark'):
-        """Formats the fetched data into an HTML string with theme."""
-        # Basic theming
-        bg_color = "#121212" if theme == 'dark' else "#FFFFFF"
-        text_color = "#FFFFFF" if theme == 'dark' else "#000000"
-
-        # Prioritize HTML content if available
-        final_content = data.get('content_html')
-        is_html = True
-
-        if final_content is None:
-            # Fallback to text content if HTML wasn't extracted
-            is_html = False
-            plain_text = data.get('content_text', '')
-            # --- New Fallback Logic: Add breaks based on observed pattern ---
-            # Replace the sequence of non-breaking spaces with HTML breaks
-            processed_text = plain_text.replace('\xa0\xa0\xa0\xa0', '<br><br>')
-            # Maybe also replace single non-breaking spaces with regular spaces?
-            processed_text = processed_text.replace('\xa0', ' ')
-            final_content = processed_text
-
-            logging.debug("Using processed text content with added <br> tags.")
-        else:
-             logging.debug("Using pre-formatted HTML content.")
+        """Formats the fetched data into a complete HTML document with theme."""
+        url = data.get('_base_url')
+        document = self.history.document(url, theme, self.continuous)
+        if document is None:
+            document = self.renderer.document(data, theme, continuous=self.continuous)
+            self.history.store_document(url, theme, self.continuous, document)
+        return document
 
-        # Escape title separately
-        title_text = html.escape(data.get('title', 'No Title'))
-        
-        # Use the HTML template
-        return HTML_TEMPLATE.format(
-            title=title_text,
-            content=final_content, # Insert raw HTML or formatted text
-            background_color=bg_color,
-            text_color=text_color
-        )
+    def show_chapter(self, data):
+        """Puts a chapter in the WebView, swapping it into the loaded shell when possible."""
+        url = data.get('_base_url') or self.current_url
+        if self._shell_loaded:
+            # Only #content changes: no document reload, relayout of the shell or style re-parse
+            if self.continuous:
+                # Scrolls to the chapter if it is already in the page, otherwise starts over with it
+                script = self.renderer.show_continuous_script(data)
+            else:
+                script = self.renderer.swap_script(data)
+            with tracer.span('set_content', url=url, mode='swap'):
+                self.webview.evaluate_javascript(script)
+            self._restore_scroll(url, data)
+            return
+        # First chapter (or the shell is still loading): load a complete shell page
+        document = self.format_html_content(data, theme=self.current_theme)
+        with tracer.span('set_content', url=url, mode='document'):
+            self.webview.set_content(url, document)
+        self._set_content_at = time.perf_counter()
+
+    def on_webview_load(self, widget, **kwargs):
+        """The shell page finished loading, so later chapters and themes can be applied by script."""
+        self._shell_loaded = True
+        if not self._first_text_recorded and self.last_scraped_data is not None:
+            self._first_text_recorded = True
+            elapsed = time.perf_counter() - self._launched_at
+            tracer.record('first_text', elapsed, url=self.current_url, from_cache=self._shown_from_cache)
+            logging.info("First chapter readable %.0f ms after launch", elapsed * 1000)
+        if self._set_content_at is not None:
+            # set_content only hands the document over; this is when the WebView finished with it
+            tracer.record('page_load', time.perf_counter() - self._set_content_at, url=self.current_url)
+            self._set_content_at = None
+        if self.last_scraped_data is not None and self.current_url:
+            self._restore_scroll(self.current_url, self.last_scraped_data)
+        logging.debug("Shell page loaded; switching to in-place updates.")
+
+    # --- Scroll position ---
+
+    def _restore_scroll(self, url, data):
+        """Scrolls back to where the reader was if this chapter is their saved place in its book."""
+        position = self.config_store.position(data.get('book_url') or url)
+        if position and position.get('url') == url and position.get('scroll'):
+            self.webview.evaluate_javascript(self.renderer.scroll_script(data, position['scroll'], self.continuous))
 
-    def update_ui_with_content(self, data):
-        """Updates the WebView and navigation buttons."""
+    def _record_scroll(self, url, offset):
+        data = self.last_scraped_data or {}
+        if url and offset is not None:
+            self.config_store.set_position(data.get('book_url') or url, url, int(float(offset)))
+
+    def _start_scroll_tracking(self):
+        if self._scroll_task is None or self._scroll_task.done():
+            self._scroll_task = self.loop.create_task(self._track_scroll())
+
+    async def _track_scroll(self):
+        """Keeps the saved position's scroll offset current in page-by-page mode (continuous
+        mode reports it through hrState); the config store coalesces the resulting writes."""
+        while True:
+            await asyncio.sleep(SCROLL_POLL_SECONDS)
+            if self.continuous or not self._shell_loaded or self.last_scraped_data is None:
+                continue
+            url = self.current_url
+            try:
+                offset = await self.webview.evaluate_javascript(self.renderer.scroll_offset_script())
+            except Exception as e:
+                logging.debug("Scroll position poll failed: %s", e)
+                continue
+            if url == self.current_url:
+                self._record_scroll(url, offset)
+
+    def update_ui_with_content(self, data, from_cache_at_startup=False):
+        """Updates the WebView and navigation buttons.
+
+        from_cache_at_startup skips the bookkeeping (config save, prefetch, read
+        marker) that startup defers until the event loop is running.
+        """
         self.last_scraped_data = data # Store data for theme toggle
         self.next_page_url = data.get("next_page_url")
         self.previous_page_url = data.get("previous_page_url")
@@ -298,12 +585,15 @@ class HelloReader(toga.App):
         # If self.current_url wasn't set yet (first load), set it.
         elif not self.current_url:
             self.current_url = requested_url
+        self.history.put(self.current_url, data)
 
         self.main_window.title = data.get("title", self.formal_name) # Update window title
         
-        # Format and set content using the current theme
-        html_content = self.format_html_content(data, theme=self.current_theme)
-        self.webview.set_content(self.current_url, html_content) 
+        # Swap the chapter into the page using the current theme
+        self.show_chapter(data)
+        if self._load_started is not None:
+            tracer.record('chapter_load', time.perf_counter() - self._load_started, url=self.current_url)
+            self._load_started = None
 
         # Update button states
         self.next_button.enabled = bool(self.next_page_url)
@@ -315,74 +605,121 @@ class HelloReader(toga.App):
 
         # Auto-save the successfully loaded URL as the bookmark
         self.bookmarked_url = self.current_url # Update bookmark reference
-        self.save_config() 
+        if from_cache_at_startup:
+            return # The bookmark is already this chapter; on_running starts the prefetch
+        self.save_config()
+        self._remember_position(self.current_url, data)
+
+        # Start filling the buffer around the chapter now on screen
+        self.prefetcher.start(self.current_url, data)
+
+        # Keep the unread count of a followed book in step with reading
+        if self.scraper.cache is not None and data.get('book_url'):
+            self.scraper.cache.mark_read(self.scraper.toc_url_for(data['book_url']), self.current_url)
 
     def load_url_and_update_ui(self, url):
-        """Handles the process of fetching and displaying content for a URL."""
+        """Starts loading a URL in the background, superseding any load still in flight."""
         if not url:
             # Don't show dialog if called during startup auto-load
             if hasattr(self, 'main_window') and self.main_window.visible:
                  self.main_window.dialog(toga.InfoDialog("Input Required", "URL cannot be empty."))
             else:
                 logging.warning("load_url_and_update_ui called with empty URL.")
+            return None
+
+        # Pressing the same button again while its page is loading is a no-op
+        if self._load_task and not self._load_task.done():
+            if url == self._loading_url:
+                return self._load_task
+            # The user moved on - drop the old request so it can never overwrite the new one
+            logging.info("Cancelling in-flight load of %s in favour of %s", self._loading_url, url)
+            self._load_task.cancel()
+
+        # Chapters shown before or prefetched render straight from memory
+        self._load_started = time.perf_counter()
+        buffered = self.history.get(url)
+        if buffered is None:
+            buffered = self.prefetcher.get(url)
+            if buffered is not None:
+                tracer.count('prefetch_hits')
+        if buffered is not None:
+            self._load_generation += 1
+            self._loading_url = None
+            buffered['_base_url'] = url
+            self.update_ui_with_content(buffered)
+            return None
+
+        # Update internal state immediately. The navigation buttons stay usable so the
+        # user can keep paging; a newer press simply supersedes this load.
+        self.main_window.title = f"Loading: {url}..."
+        self._load_generation += 1
+        self._loading_url = url
+        self._load_task = self.loop.create_task(self._load_url(url, self._load_generation))
+        return self._load_task
+
+    async def _load_url(self, url, generation):
+        """Fetches a chapter off the UI thread and applies it if it is still the newest request."""
+        try:
+            scraped_data = await self.scraper.fetch_chapter_async(url)
+        except asyncio.CancelledError:
+            logging.debug("Load of %s cancelled", url)
+            raise
+        except ScraperException as e:
+            if generation == self._load_generation:
+                await self._show_load_error("Scraping Error", str(e))
+            return
+        except Exception as e:
+            if generation == self._load_generation:
+                logging.exception("Unexpected error during page load:") # Log traceback
+                await self._show_load_error("Unexpected Error", f"An unexpected error occurred: {str(e)}")
             return
 
-        # Update internal state immediately
-        temp_url = url # Store url requested, self.current_url updated on success
-        self.main_window.title = f"Loading: {temp_url}..."
-        self.next_button.enabled = False
-        self.previous_button.enabled = False
+        if generation != self._load_generation:
+            # A newer load started while this one was in the worker thread
+            logging.info("Discarding stale result for %s", url)
+            return
 
         try:
-            # Consider making this async if UI hangs
-            scraped_data = self.scraper.fetch_chapter(temp_url)
             if scraped_data:
-                scraped_data['_base_url'] = temp_url # Ensure the URL used is stored
+                scraped_data['_base_url'] = url # Ensure the URL used is stored
                 self.update_ui_with_content(scraped_data) # This sets self.current_url on success
             else:
                 # Check if window exists before showing dialog
                 if hasattr(self, 'main_window') and self.main_window.visible:
-                    self.main_window.dialog(toga.ErrorDialog("Error", f"Failed to retrieve content (no data) from:\n{temp_url}"))
+                    await self.main_window.dialog(toga.ErrorDialog("Error", f"Failed to retrieve content (no data) from:\n{url}"))
                 self.main_window.title = self.formal_name
                 # Don't clear self.current_url here, keep the last successful one
-
-        except ScraperException as e:
-            # Ensure URL input is visible on error
-            if not self.url_input_box.parent: # If it's not currently shown
-                self.main_box.insert(1, self.url_input_box)
-                # Always set dark background when showing
-                self.url_input_box.style.background_color = "#121212"
-
-            if hasattr(self, 'main_window') and self.main_window.visible:
-                self.main_window.dialog(toga.ErrorDialog("Scraping Error", str(e)))
-            self.main_window.title = self.formal_name
         except Exception as e:
-            # Ensure URL input is visible on error
-            if not self.url_input_box.parent: # If it's not currently shown
-                self.main_box.insert(1, self.url_input_box)
-                # Always set dark background when showing
-                self.url_input_box.style.background_color = "#121212"
+            logging.exception("Unexpected error while displaying page:") # Log traceback
+            await self._show_load_error("Unexpected Error", f"An unexpected error occurred: {str(e)}")
 
-            logging.exception("Unexpected error during page load:") # Log traceback
-            if hasattr(self, 'main_window') and self.main_window.visible:
-                self.main_window.dialog(toga.ErrorDialog("Unexpected Error", f"An unexpected error occurred: {str(e)}"))
-            self.main_window.title = self.formal_name
+    async def _show_load_error(self, title, message):
+        """Reveals the URL input and reports a failed load."""
+        # Ensure URL input is visible on error
+        if not self.url_input_box.parent: # If it's not currently shown
+            self.main_box.insert(1, self.url_input_box)
+            # Always set dark background when showing
+            self.url_input_box.style.background_color = "#121212"
+
+        self.main_window.title = self.formal_name
+        if hasattr(self, 'main_window') and self.main_window.visible:
+            await self.main_window.dialog(toga.ErrorDialog(title, message))
 
     def toggle_theme(self, widget=None):
         """Toggles the theme and updates the display."""
         self.current_theme = 'light' if self.current_theme == 'dark' else 'dark'
-        logging.info(f"Toggling theme to: {self.current_theme}")
+        logging.info("Toggling theme to: %s", self.current_theme)
         
         # Update button icon
         new_theme_icon = '🌙' if self.current_theme == 'dark' else '☀️'
         self.theme_button.text = new_theme_icon
 
-        # Re-render content with the new theme if content exists
+        # Re-colour the loaded page in place; content and scroll position are untouched
         if self.last_scraped_data and self.current_url:
-            html_content = self.format_html_content(self.last_scraped_data, theme=self.current_theme)
-            # Use the stored URL as the base for set_content
-            base_url_for_webview = self.last_scraped_data.get('_base_url', self.current_url)
-            self.webview.set_content(base_url_for_webview, html_content)
+            if self._shell_loaded:
+                self.webview.evaluate_javascript(self.renderer.theme_script(self.current_theme))
+            else:
+                self.show_chapter(self.last_scraped_data)
             logging.debug("WebView content updated with new theme.")
         else:
             logging.debug("No content loaded, theme toggle only changes preference.")
@@ -393,10 +730,171 @@ class HelloReader(toga.App):
         # Save the new preference
         self.save_config()
 
+    def toggle_offline(self, command=None, **kwargs):
+        """Switches between normal fetching and serving only chapters already in the cache."""
+        self.offline = not self.offline
+        self.scraper.offline = self.offline
+        logging.info("Offline mode %s", 'enabled' if self.offline else 'disabled')
+        self.offline_command.text = "Go Online" if self.offline else "Offline Mode (cached chapters only)"
+        self.save_config()
+
+    # --- Continuous scroll ---
+
+    def toggle_continuous(self, command=None, **kwargs):
+        """Switches between one chapter per page and chapters appended as the reader scrolls."""
+        self.continuous = not self.continuous
+        logging.info("Continuous scroll %s", 'enabled' if self.continuous else 'disabled')
+        self.continuous_command.text = "Page by Page" if self.continuous else "Continuous Scroll"
+        if self.current_url:
+            # Re-show the chapter in view in the new layout (from the buffer or cache when possible)
+            self.load_url_and_update_ui(self.current_url)
+        if self.continuous:
+            self._start_continuous_polling()
+        elif self._continuous_task is not None:
+            self._continuous_task.cancel()
+            self._continuous_task = None
+        self.save_config()
+
+    def _start_continuous_polling(self):
+        if self._continuous_task is None or self._continuous_task.done():
+            self._continuous_task = self.loop.create_task(self._poll_continuous())
+
+    async def _poll_continuous(self):
+        """Asks the page which chapter is in view, appending, refilling and bookmarking to match."""
+        while self.continuous:
+            await asyncio.sleep(CONTINUOUS_POLL_SECONDS)
+            if not self._shell_loaded or self.last_scraped_data is None:
+                continue
+            try:
+                result = await self.webview.evaluate_javascript(self.renderer.state_script())
+                state = json.loads(result) if result else None
+            except Exception as e:
+                logging.debug("Continuous-scroll poll failed: %s", e)
+                continue
+            if not state:
+                continue # The page is not in continuous layout (yet)
+
+            self._follow_visible_chapter(state)
+            self._record_scroll(state['url'], state['offset'])
+            for url in state['restore']:
+                if url not in self._restoring:
+                    self._restoring.add(url)
+                    self.loop.create_task(self._restore_section(url))
+            if state['near_bottom'] and state['last_next'] and not self._appending:
+                self._appending = True
+                self.loop.create_task(self._append_chapter(state['last_next']))
+
+    async def _chapter_for_page(self, url):
+        """A chapter dict for url from the history or prefetch buffer, or the cache and network."""
+        data = self.history.get(url) or self.prefetcher.get(url)
+        if data is None:
+            data = await self.scraper.fetch_chapter_async(url)
+        data = dict(data, _base_url=url)
+        self.history.put(url, data)
+        return data
+
+    async def _append_chapter(self, url):
+        """Adds the chapter after the last one in the page."""
+        try:
+            data = await self._chapter_for_page(url)
+            self.webview.evaluate_javascript(self.renderer.append_script(data))
+            # Keep prefetching ahead of the newest chapter in the page
+            self.prefetcher.start(url, data)
+        except ScraperException as e:
+            logging.warning("Could not append %s: %s", url, e)
+            await asyncio.sleep(5) # Don't retry on every poll
+        finally:
+            self._appending = False
+
+    async def _restore_section(self, url):
+        """Refills a placeholder the reader is scrolling back towards."""
+        try:
+            data = await self._chapter_for_page(url)
+            self.webview.evaluate_javascript(self.renderer.restore_script(data))
+        except ScraperException as e:
+            logging.warning("Could not restore %s: %s", url, e)
+        finally:
+            self._restoring.discard(url)
+
+    # --- Read aloud ---
+
+    async def toggle_read_aloud(self, command=None, **kwargs):
+        """Starts reading the chapter on screen aloud, or pauses, or resumes where it paused."""
+        if self.read_aloud is not None and self.read_aloud.playing:
+            self.read_aloud.pause()
+            self.read_aloud_command.text = "Resume Reading Aloud"
+            return
+        if not self.current_url:
+            return
+        try:
+            if self.read_aloud is None:
+                self.read_aloud = self._make_read_aloud()
+            position = self.read_aloud.position
+            if position is not None and position[0] == self.current_url:
+                self.read_aloud.resume()
+            else:
+                # The full chapter, even if continuous mode only keeps its metadata
+                self.read_aloud.start(self.current_url, await self._chapter_for_page(self.current_url))
+        except (ReadAloudError, ScraperException) as e:
+            await self.main_window.dialog(toga.InfoDialog("Read Aloud", str(e)))
+            return
+        self.read_aloud_command.text = "Pause Reading Aloud"
+
+    def stop_read_aloud(self, command=None, **kwargs):
+        if self.read_aloud is not None:
+            self.read_aloud.stop()
+            self.read_aloud.position = None
+        self.read_aloud_command.text = "Read Aloud"
+
+    def _make_read_aloud(self):
+        settings = self.read_aloud_settings
+        return ReadAloud(
+            self._chapter_for_reading,
+            AudioCache(self.paths.cache / AUDIO_CACHE_DIRNAME, settings['cache_max_bytes']),
+            synthesizer=Pyttsx3Synthesizer(settings['rate'], settings['voice']),
+            lookahead=settings['lookahead'],
+            # Called on the playback thread; the UI is only touched from the event loop
+            on_chapter=lambda url, data: self.loop.call_soon_threadsafe(self._follow_read_aloud, url, data),
+            on_finished=lambda: self.loop.call_soon_threadsafe(self.stop_read_aloud),
+        )
+
+    def _chapter_for_reading(self, url):
+        """The next chapter to read aloud: prefetched if possible, else from the cache or the site.
+        Runs on the synthesis thread, so blocking here never stalls the UI."""
+        data = self.prefetcher.get(url)
+        return data if data is not None else self.scraper.fetch_chapter(url)
+
+    def _follow_read_aloud(self, url, data):
+        """Turns the page when reading aloud moves on to the next chapter."""
+        if url != self.current_url:
+            self.history.put(url, dict(data, _base_url=url))
+            self.load_url_and_update_ui(url)
+
+    def _follow_visible_chapter(self, state):
+        """Makes the chapter in view the current one: title, buttons, bookmark and read marker."""
+        url = state['url']
+        if not url or url == self.current_url:
+            return
+        self.current_url = url
+        self.next_page_url = state['next']
+        self.previous_page_url = state['prev']
+        # Only the metadata lives on the Python side; the text is in the page
+        self.last_scraped_data = {
+            'title': state['title'], 'next_page_url': state['next'], 'previous_page_url': state['prev'],
+            'book_url': state['book_url'], 'book_title': state['book_title'], '_base_url': url,
+        }
+        self.main_window.title = state['title'] or self.formal_name
+        self.next_button.enabled = bool(self.next_page_url)
+        self.previous_button.enabled = bool(self.previous_page_url)
+        self.bookmarked_url = url
+        self.save_config()
+        self._remember_position(url, self.last_scraped_data)
+        if self.scraper.cache is not None and state['book_url']:
+            self.scraper.cache.mark_read(self.scraper.toc_url_for(state['book_url']), url)
+
     def _apply_theme_to_containers(self):
         """Applies the current theme's background color to relevant container boxes."""
-        bg_color = "#121212" if self.current_theme == 'dark' else "#FFFFFF"
-        text_color = "#FFFFFF" if self.current_theme == 'dark' else "#000000"
+        bg_color = THEMES[self.current_theme]['background_color']
         try:
             # Check if boxes exist before styling (might be called early)
             if hasattr(self, 'main_box'):
@@ -404,33 +902,103 @@ class HelloReader(toga.App):
             # url_input_box should always stay dark, styled when added
             if hasattr(self, 'nav_button_box'):
                 self.nav_button_box.style.background_color = bg_color
-            logging.debug(f"Applied background color {bg_color} to containers.")
+            logging.debug("Applied background color %s to containers.", bg_color)
         except Exception as e:
-            logging.warning(f"Could not apply theme background: {e}")
+            logging.warning("Could not apply theme background: %s", e)
 
     def confirm_load_url(self, widget):
         """Handler for the 'Load' button next to the URL input."""
         # This is called by the text button *inside* the url_input_box
         url = self.url_input.value.strip()
-        print(f"--- Loading URL from input: {url} ---")
-        if url:
+        logging.debug("--- Loading URL from input: %s ---", url)
+        if url.startswith('#') and url[1:].isdigit():
+            # '#N' jumps to chapter N of the current book via its table of contents
+            self.load_chapter_number(int(url[1:]))
+        elif url:
             self.load_url_and_update_ui(url)
             # Hiding is now done within update_ui_with_content on success
         else:
             # Maybe show an info dialog if the input is empty?
-            print("--- URL input is empty, doing nothing ---")
+            logging.debug("--- URL input is empty, doing nothing ---")
             # Example: await self.main_window.dialog(toga.InfoDialog("Input Needed", "Please enter a URL."))
             # Requires making this method async and handling potential errors
 
+    def load_chapter_number(self, number):
+        """Jumps to chapter `number` (1-based) of the book the current chapter belongs to."""
+        if not self.current_url:
+            self.main_window.dialog(toga.InfoDialog("Info", "Load a chapter of the book first."))
+            return None
+        return self.loop.create_task(self._load_chapter_number(self.current_url, number))
+
+    async def _load_chapter_number(self, book_url, number):
+        self.main_window.title = "Loading chapter list..."
+        try:
+            # The index is persisted, so this is usually a conditional GET or a cache read
+            chapters = await self.loop.run_in_executor(None, self.scraper.fetch_toc, book_url)
+        except ScraperException as e:
+            await self._show_load_error("Table of Contents Error", str(e))
+            return
+        if not 1 <= number <= len(chapters):
+            self.main_window.title = self.last_scraped_data.get('title', self.formal_name) if self.last_scraped_data else self.formal_name
+            await self.main_window.dialog(toga.InfoDialog("Info", f"This book has {len(chapters)} chapters."))
+            return
+        self.load_url_and_update_ui(chapters[number - 1]['url'])
+
+    async def follow_current_book(self, command=None, **kwargs):
+        """Adds the book of the chapter on screen to the followed books."""
+        data = self.last_scraped_data or {}
+        if self.scraper.cache is None or not data.get('book_url'):
+            await self.main_window.dialog(toga.InfoDialog("Info", "This page does not link to a book to follow."))
+            return
+        toc_url = self.scraper.toc_url_for(data['book_url'])
+        self.scraper.cache.follow_book(toc_url, data.get('book_title'), last_read_url=self.current_url)
+        await self.main_window.dialog(toga.InfoDialog("Following", f"Now following {data.get('book_title') or toc_url}."))
+
+    async def check_followed_books(self, command=None, **kwargs):
+        """Checks every followed book for new chapters in the background and reports the result."""
+        if self.scraper.cache is None or self.offline:
+            await self.main_window.dialog(toga.InfoDialog("Info", "Checking books needs the chapter cache and a network connection."))
+            return
+        results = await check_followed_books(self.scraper)
+        if not results:
+            await self.main_window.dialog(toga.InfoDialog("Followed Books", "You are not following any books yet."))
+            return
+        lines = []
+        for result in results:
+            if 'error' in result:
+                lines.append(f"{result['title']}: could not check ({result['error']})")
+            else:
+                lines.append(f"{result['title']}: {len(result['new_chapters'])} new, {result['unread_chapters']} unread")
+        await self.main_window.dialog(toga.InfoDialog("Followed Books", "\n".join(lines)))
+
+    def show_stats(self, command=None, **kwargs):
+        """Opens (or refreshes) the panel showing where chapter loads spend their time."""
+        if self.stats_window is None or self.stats_window not in self.windows:
+            self.stats_window = StatsWindow()
+            self.windows.add(self.stats_window)
+        else:
+            self.stats_window.refresh()
+        self.stats_window.show()
+
+    async def show_search(self, command=None, **kwargs):
+        """Opens the window for searching the text of fetched chapters."""
+        if self.search_index is None:
+            await self.main_window.dialog(toga.InfoDialog("Info", "The search index could not be opened."))
+            return
+        if self.search_window is None or self.search_window not in self.windows:
+            self.search_window = SearchWindow(self)
+            self.windows.add(self.search_window)
+        self.search_window.show()
+
     def toggle_url_input_visibility(self, widget):
         """Toggles the visibility of the URL input box."""
-        print("--- Toggling URL input visibility ---")
+        logging.debug("--- Toggling URL input visibility ---")
         # Toggle by adding/removing the box from the main layout
         if self.url_input_box.parent: # If it has a parent, it's visible
-            print("--- Hiding URL input box ---")
+            logging.debug("--- Hiding URL input box ---")
             self.main_box.remove(self.url_input_box)
         else:
-            print("--- Showing URL input box ---")
+            logging.debug("--- Showing URL input box ---")
             # Insert between webview (index 0) and nav_button_box (index 1 after insert)
             self.main_box.insert(1, self.url_input_box)
             # Apply theme background when showing
@@ -453,21 +1021,21 @@ class HelloReader(toga.App):
             self.main_window.dialog(toga.InfoDialog("Info", "No previous page URL found."))
 
 def main():
-    print("--- main() called ---")
+    logging.debug("--- main() called ---")
     # Provide formal_name and app_id explicitly
     app = HelloReader(
         formal_name="Hello Reader",
         app_id="me.dliangthinks.helloreader" # Use correct reverse domain notation
     )
-    print("--- HelloReader instance created, returning app ---")
+    logging.debug("--- HelloReader instance created, returning app ---")
     return app
 
 # Add the standard main execution block
 if __name__ == '__main__':
     # Set logging level to DEBUG to see detailed scraper logs
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - [%(module)s] %(message)s')
-    print("--- Script executed directly (__name__ == '__main__') --- Logging level: DEBUG ---")
+    logging.debug("--- Script executed directly (__name__ == '__main__') --- Logging level: DEBUG ---")
     hello_reader_app = main()
-    print("--- Starting Toga main loop ---")
+    logging.debug("--- Starting Toga main loop ---")
     hello_reader_app.main_loop() # Start the application event loop
-    print("--- Toga main loop exited ---") # This will print when the app closes
\ No newline at end of file
+    logging.debug("--- Toga main loop exited ---") # This will print when the app closes
\ No newline at end of file
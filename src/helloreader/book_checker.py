@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from .web_scraper import ScraperException, EXTRACTION_FAILED_TEXT
+
+
+async def check_book(scraper, book, executor=None):
+    """Refreshes one followed book's index and returns its newly listed chapters.
+
+    The stored index makes this cheap: an unchanged index answers the conditional
+    GET with a 304, and a changed one only has its new tail written.
+    """
+    toc_url = book['toc_url']
+    known = scraper.cache.get_toc(toc_url)
+    loop = asyncio.get_running_loop()
+    chapters = await loop.run_in_executor(executor, scraper.fetch_toc, toc_url)
+    # Without an earlier listing there is no baseline, so nothing counts as new yet
+    new_chapters = chapters[len(known):] if known else []
+
+    # Unread counts from the chapter after the last one opened, or everything if none was
+    read_urls = [chapter['url'] for chapter in chapters]
+    last_read = book.get('last_read_url')
+    unread = len(chapters) - (read_urls.index(last_read) + 1) if last_read in read_urls else len(chapters)
+    scraper.cache.record_check(toc_url, len(chapters), unread)
+    return {'toc_url': toc_url, 'title': book['title'], 'new_chapters': new_chapters, 'unread_chapters': unread}
+
+
+async def check_followed_books(scraper, books=None, concurrency=8, per_host=2):
+    """Checks every followed book concurrently, never running more than per_host checks per site.
+
+    Returns one result dict per book (see check_book); a book that failed has an 'error'.
+    """
+    books = scraper.cache.followed_books() if books is None else books
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='check')
+    overall = asyncio.Semaphore(max(1, concurrency))
+    host_limits = {} # host -> Semaphore(per_host)
+
+    async def check(book):
+        host = urlparse(book['toc_url']).netloc
+        host_limit = host_limits.setdefault(host, asyncio.Semaphore(max(1, per_host)))
+        async with overall, host_limit:
+            try:
+                return await check_book(scraper, book, executor)
+            except ScraperException as e:
+                logging.warning("Could not check %s: %s", book['title'], e)
+                return {'toc_url': book['toc_url'], 'title': book['title'], 'new_chapters': [],
+                        'unread_chapters': book.get('unread_chapters', 0), 'error': str(e)}
+
+    try:
+        return await asyncio.gather(*(check(book) for book in books))
+    finally:
+        executor.shutdown(wait=False)
+
+
+def add_arguments(parser):
+    """Registers the 'check' subcommand's options on an argparse parser."""
+    parser.add_argument('--cache', required=True, help="Chapter cache file holding the followed books")
+    parser.add_argument('--follow', metavar='URL', action='append', default=[],
+                        help="Follow the book this chapter, book or index URL belongs to (repeatable)")
+    parser.add_argument('--unfollow', metavar='URL', action='append', default=[], help="Stop following a book")
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="Books checked at once (default: 8)")
+    parser.add_argument('--per-host', type=int, default=2, help="Books checked at once per site (default: 2)")
+
+
+def run(args, scraper):
+    """Runs the 'check' subcommand; returns a process exit code."""
+    for url in args.follow:
+        toc_url = scraper.toc_url_for(url)
+        title, last_read_url = None, None
+        if url != toc_url:
+            # A chapter URL also tells us the book's name and where the reader is
+            chapter = scraper.fetch_chapter(url)
+            if chapter['content_html'] != EXTRACTION_FAILED_TEXT:
+                title, last_read_url = chapter.get('book_title'), url
+        scraper.cache.follow_book(toc_url, title, last_read_url=last_read_url)
+        print(f"Following {title or toc_url}")
+    for url in args.unfollow:
+        scraper.cache.unfollow_book(scraper.toc_url_for(url))
+
+    started = time.monotonic()
+    before = scraper.stats()
+    results = asyncio.run(check_followed_books(scraper, concurrency=args.concurrency, per_host=args.per_host))
+    after = scraper.stats()
+    for result in results:
+        status = result.get('error') or f"{len(result['new_chapters'])} new, {result['unread_chapters']} unread"
+        print(f"{result['title']}: {status}")
+        for chapter in result['new_chapters']:
+            print(f"    {chapter['title']}  {chapter['url']}")
+    print(f"Checked {len(results)} book(s) in {time.monotonic() - started:.1f}s "
+          f"({after['requests'] - before['requests']} request(s), "
+          f"{after['not_modified'] - before['not_modified']} not modified)")
+    return 1 if any('error' in result for result in results) else 0
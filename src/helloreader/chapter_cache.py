@@ -0,0 +1,345 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+# Defaults used when the config file has no 'cache' section
+DEFAULT_CACHE_SETTINGS = {
+    'max_bytes': 256 * 1024 * 1024, # Evict least recently read chapters beyond this size
+    'ttl': None, # Seconds before a cached chapter is refetched; None keeps chapters forever
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,  -- sha256 of the raw page bytes
+    raw BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL REFERENCES blobs(digest),
+    chapter TEXT NOT NULL,    -- JSON of the fetch_chapter dict
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    etag TEXT,                -- Validators for conditional GETs once the entry expires
+    last_modified TEXT,
+    content_hash TEXT         -- sha1 of the page's chapter region (SiteProfile.content_digest)
+);
+CREATE INDEX IF NOT EXISTS pages_accessed ON pages(accessed_at);
+CREATE INDEX IF NOT EXISTS pages_digest ON pages(digest);
+CREATE TABLE IF NOT EXISTS books (
+    toc_url TEXT PRIMARY KEY, -- Index page listing the book's chapters
+    etag TEXT,
+    last_modified TEXT,
+    checked_at REAL
+);
+CREATE TABLE IF NOT EXISTS toc (
+    toc_url TEXT NOT NULL REFERENCES books(toc_url),
+    ordinal INTEGER NOT NULL, -- 0-based position in the index
+    url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    PRIMARY KEY (toc_url, ordinal)
+);
+CREATE TABLE IF NOT EXISTS followed (
+    toc_url TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    last_read_url TEXT,       -- Newest chapter the reader has opened
+    known_chapters INTEGER NOT NULL DEFAULT 0,
+    unread_chapters INTEGER NOT NULL DEFAULT 0,
+    checked_at REAL
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    encoding TEXT NOT NULL,   -- Detected page encoding, so later pages skip detection
+    detected_at REAL NOT NULL
+);
+"""
+
+
+class ChapterCache:
+    """SQLite store of fetched pages: raw bytes (content-addressed) plus the extracted chapter dict."""
+
+    def __init__(self, path, max_bytes=DEFAULT_CACHE_SETTINGS['max_bytes'], ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        if hasattr(path, 'parent'):
+            path.parent.mkdir(parents=True, exist_ok=True)
+        # Chapters are fetched on executor threads, so the connection is shared behind a lock
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+        # Running size of pages plus blobs, kept up to date by put() and _evict() so that
+        # neither has to sum the tables (and walk the blob pages) on every write
+        self._bytes = self._count_bytes()
+
+    def _migrate(self):
+        """Adds columns introduced after a cache file was first created."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pages)")}
+        for column in ('etag', 'last_modified', 'content_hash'):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE pages ADD COLUMN {column} TEXT")
+        # Files written before put() dropped replaced blobs can hold blobs no page points at
+        self._conn.execute("DELETE FROM blobs WHERE digest NOT IN (SELECT digest FROM pages)")
+
+    def get_chapter(self, url, allow_stale=False):
+        """Returns the cached chapter dict for url, or None on a miss or an expired entry."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chapter, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None or (not allow_stale and self._expired(row[1])):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self.hits += 1
+        logging.info("Chapter cache hit: %s", url)
+        return json.loads(row[0])
+
+    def iter_chapters(self, batch_size=200):
+        """Yields (url, chapter dict) for every cached page, a batch at a time so other
+        threads get the connection in between."""
+        last_url = ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT url, chapter FROM pages WHERE url > ? ORDER BY url LIMIT ?", (last_url, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for url, chapter_json in rows:
+                yield url, json.loads(chapter_json)
+            last_url = rows[-1][0]
+
+    def get_validators(self, url):
+        """Returns (etag, last_modified) stored for url, either of which may be None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def get_revalidation_info(self, url):
+        """Returns what revalidating url needs - {'etag', 'last_modified', 'content_hash', 'size'},
+        size being that of the stored raw page - or None if url is not cached."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, blobs.size FROM pages JOIN blobs USING (digest) "
+                "WHERE pages.url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('etag', 'last_modified', 'content_hash', 'size'), row))
+
+    def set_content_hash(self, url, content_hash):
+        """Stores a content hash computed after the fact (for pages cached before hashes were kept)."""
+        with self._lock:
+            self._conn.execute("UPDATE pages SET content_hash = ? WHERE url = ?", (content_hash, url))
+
+    def refresh(self, url, etag=None, last_modified=None):
+        """Marks url as freshly validated (after a 304, or a refetch found the chapter unchanged)
+        and returns its stored chapter, or None. New validators, if given, replace the old ones."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT chapter FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified) WHERE url = ?", (now, now, etag, last_modified, url)
+            )
+        return json.loads(row[0])
+
+    def get_raw(self, url):
+        """Returns the raw page bytes stored for url, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT blobs.raw FROM pages JOIN blobs USING (digest) WHERE pages.url = ?", (url,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, url, raw, chapter, etag=None, last_modified=None, content_hash=None):
+        """Stores the raw bytes and extracted chapter for url, then evicts down to max_bytes."""
+        digest = hashlib.sha256(raw).hexdigest()
+        # Private keys such as '_base_url' are UI bookkeeping, not page content
+        chapter_json = json.dumps({k: v for k, v in chapter.items() if not k.startswith('_')}, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                previous = self._conn.execute("SELECT digest, size FROM pages WHERE url = ?", (url,)).fetchone()
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs (digest, raw, size) VALUES (?, ?, ?)",
+                    (digest, sqlite3.Binary(raw), len(raw))
+                ).rowcount
+                page_size = len(chapter_json.encode('utf-8'))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pages "
+                    "(url, digest, chapter, size, fetched_at, accessed_at, etag, last_modified, content_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, digest, chapter_json, page_size, now, now, etag, last_modified, content_hash)
+                )
+                self._bytes += page_size + (len(raw) if inserted else 0)
+                if previous is not None:
+                    self._bytes -= previous[1]
+                    if previous[0] != digest:
+                        self._drop_blob_if_unused(previous[0])
+                if self._bytes > self.max_bytes:
+                    self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._bytes = self._count_bytes()
+                raise
+
+    # --- Tables of contents (never evicted; a book's index is tiny next to its pages) ---
+
+    def get_toc(self, toc_url):
+        """Returns the stored chapter list of a book as [{'title', 'url'}], in order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title, url FROM toc WHERE toc_url = ? ORDER BY ordinal", (toc_url,)
+            ).fetchall()
+        return [{'title': title, 'url': url} for title, url in rows]
+
+    def get_toc_validators(self, toc_url):
+        """Returns (etag, last_modified) from the last time the index page was fetched."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM books WHERE toc_url = ?", (toc_url,)
+            ).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def save_toc(self, toc_url, chapters, start=0, etag=None, last_modified=None):
+        """Stores chapters[start:] at their ordinals; rows before start are left untouched."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO books (toc_url, etag, last_modified, checked_at) VALUES (?, ?, ?, ?)",
+                    (toc_url, etag, last_modified, time.time())
+                )
+                # Anything past the new end belonged to an older, longer listing
+                self._conn.execute("DELETE FROM toc WHERE toc_url = ? AND ordinal >= ?", (toc_url, start))
+                self._conn.executemany(
+                    "INSERT INTO toc (toc_url, ordinal, url, title) VALUES (?, ?, ?, ?)",
+                    [(toc_url, ordinal, chapter['url'], chapter['title'])
+                     for ordinal, chapter in enumerate(chapters[start:], start)]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def book_urls(self):
+        """Returns the index URL of every book whose chapter list is stored."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT toc_url FROM books ORDER BY toc_url")]
+
+    def touch_toc(self, toc_url):
+        """Records that the index was checked and found unchanged."""
+        with self._lock:
+            self._conn.execute("UPDATE books SET checked_at = ? WHERE toc_url = ?", (time.time(), toc_url))
+
+    # --- Followed books ---
+
+    def follow_book(self, toc_url, title=None, last_read_url=None):
+        """Adds (or updates) a followed book; None leaves an existing title or position as it was."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO followed (toc_url, title, last_read_url) VALUES (?, COALESCE(?, ?), ?) "
+                "ON CONFLICT(toc_url) DO UPDATE SET "
+                "title = COALESCE(?, followed.title), "
+                "last_read_url = COALESCE(excluded.last_read_url, followed.last_read_url)",
+                (toc_url, title, toc_url, last_read_url, title)
+            )
+
+    def unfollow_book(self, toc_url):
+        with self._lock:
+            self._conn.execute("DELETE FROM followed WHERE toc_url = ?", (toc_url,))
+
+    def followed_books(self):
+        """Returns every followed book as a dict of its followed-table columns."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT toc_url, title, last_read_url, known_chapters, unread_chapters, checked_at "
+                "FROM followed ORDER BY title"
+            )
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def mark_read(self, toc_url, url):
+        """Records url as the newest chapter read, if toc_url is followed."""
+        with self._lock:
+            self._conn.execute("UPDATE followed SET last_read_url = ? WHERE toc_url = ?", (url, toc_url))
+
+    def record_check(self, toc_url, known_chapters, unread_chapters):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE followed SET known_chapters = ?, unread_chapters = ?, checked_at = ? WHERE toc_url = ?",
+                (known_chapters, unread_chapters, time.time(), toc_url)
+            )
+
+    # --- Per-host encodings ---
+
+    def get_host_encodings(self):
+        """Returns {host: encoding} for every host whose encoding has been detected."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT host, encoding FROM hosts").fetchall())
+
+    def set_host_encoding(self, host, encoding):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hosts (host, encoding, detected_at) VALUES (?, ?, ?)",
+                (host, encoding, time.time())
+            )
+
+    def total_bytes(self):
+        with self._lock:
+            return self._bytes
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _expired(self, fetched_at):
+        return self.ttl is not None and time.time() - fetched_at > self.ttl
+
+    def _count_bytes(self):
+        blob_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        page_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        return blob_bytes + page_bytes
+
+    def _drop_blob_if_unused(self, digest):
+        """Deletes the blob with digest unless another page still points at it."""
+        row = self._conn.execute(
+            "SELECT size FROM blobs WHERE digest = ? AND NOT EXISTS (SELECT 1 FROM pages WHERE digest = ?)", (digest, digest)
+        ).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self._bytes -= row[0]
+
+    def _evict(self, batch_size=64):
+        """Drops least recently read pages (and blobs nothing else points at) until under max_bytes."""
+        evicted = 0
+        while self._bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT url, digest, size FROM pages ORDER BY accessed_at LIMIT ?", (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            for url, digest, size in rows:
+                if self._bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self._bytes -= size
+                self._drop_blob_if_unused(digest)
+                evicted += 1
+        logging.info("Chapter cache evicted %s page(s) to stay under %s bytes", evicted, self.max_bytes)
@@ -0,0 +1,106 @@
+import codecs
+import re
+
+# How far into a page to look for <meta charset>; the HTML spec's prescan stops at 1024 bytes
+META_SNIFF_BYTES = 1024
+
+# Chinese encodings are decoded with GB18030, a strict superset: pages labelled gb2312
+# routinely contain GBK-only characters, and GBK pages the occasional GB18030 one
+SUPERSET_ENCODINGS = {
+    'gb2312': 'gb18030',
+    'gbk': 'gb18030',
+    'gb18030': 'gb18030',
+}
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+CONTENT_TYPE_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+# Matches both <meta charset="gbk"> and <meta http-equiv="Content-Type" content="text/html; charset=gbk">
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+def normalize_encoding(name):
+    """Returns the codec name to decode a declared charset with, or None if Python has no such codec."""
+    if not name:
+        return None
+    try:
+        canonical = codecs.lookup(name.strip().strip('"\'')).name
+    except LookupError:
+        return None
+    return SUPERSET_ENCODINGS.get(canonical, canonical)
+
+
+def charset_from_content_type(content_type):
+    """Returns the normalised charset parameter of a Content-Type header value, or None."""
+    match = CONTENT_TYPE_CHARSET.search(content_type or '')
+    return normalize_encoding(match.group(1)) if match else None
+
+
+def sniff_bom(raw):
+    """Returns (encoding, BOM length) for a byte-order mark at the start of raw, or (None, 0)."""
+    for bom, encoding in BOMS:
+        if raw.startswith(bom):
+            return encoding, len(bom)
+    return None, 0
+
+
+def sniff_meta(raw):
+    """Returns the normalised charset a <meta> tag near the start of the page declares, or None."""
+    match = META_CHARSET.search(raw, 0, META_SNIFF_BYTES)
+    if not match:
+        return None
+    encoding = normalize_encoding(match.group(1).decode('ascii', 'replace'))
+    # A page that claims UTF-16 in its markup is readable as ASCII, so it cannot be UTF-16
+    if encoding and encoding.startswith('utf-16'):
+        return 'utf-8'
+    return encoding
+
+
+def detect_encoding(raw, content_type=None, default='utf-8', known=None):
+    """Picks a page's encoding from its bytes and headers without decoding it.
+
+    Precedence follows browsers: BOM, then the HTTP charset, then <meta> in the
+    first 1024 bytes, then default. An encoding already known for the site
+    stands in for the <meta> scan. Returns (encoding, source) where source is
+    'bom', 'header', 'known', 'meta' or 'default'.
+    """
+    encoding, _ = sniff_bom(raw)
+    if encoding:
+        return encoding, 'bom'
+    encoding = charset_from_content_type(content_type)
+    if encoding:
+        return encoding, 'header'
+    if known:
+        return known, 'known'
+    encoding = sniff_meta(raw)
+    if encoding:
+        return encoding, 'meta'
+    return normalize_encoding(default) or 'utf-8', 'default'
+
+
+def decode(raw, encoding, errors='replace'):
+    """Decodes page bytes with one C-level codec call, dropping a leading BOM."""
+    bom_encoding, bom_length = sniff_bom(raw)
+    if bom_length and bom_encoding == encoding:
+        # memoryview avoids copying the whole body just to skip two or three bytes
+        return str(memoryview(raw)[bom_length:], encoding, errors)
+    return str(raw, encoding, errors)
+
+
+def decode_page(raw, content_type=None, default='utf-8', known=None):
+    """Detects a page's encoding and decodes it; returns (text, encoding, source).
+
+    A known encoding is only trusted if the page decodes strictly with it; if it
+    does not, the page is detected again as if nothing were known.
+    """
+    encoding, source = detect_encoding(raw, content_type, default=default, known=known)
+    if source == 'known':
+        try:
+            return decode(raw, encoding, errors='strict'), encoding, source
+        except UnicodeDecodeError:
+            encoding, source = detect_encoding(raw, content_type, default=default)
+    return decode(raw, encoding), encoding, source
@@ -0,0 +1,61 @@
+import argparse
+import logging
+from pathlib import Path
+
+from . import book_checker, crawler, export, library, reader_server, revalidator, search_index
+from .chapter_cache import ChapterCache
+from .instrumentation import format_snapshot, tracer
+from .search_index import SearchIndex
+from .web_scraper import WebScraper
+
+# Subcommand name -> (module providing add_arguments(parser) and run(args, scraper), help text)
+COMMANDS = {
+    'crawl': (crawler, "Download a whole book into a JSON-lines file"),
+    'check': (book_checker, "Check followed books for new chapters"),
+    'library': (library, "List, read or import chapters of a compact library book"),
+    'search': (search_index, "Search the text of fetched chapters"),
+    'export': (export, "Write a book out as an EPUB or a text file"),
+    'revalidate': (revalidator, "Re-check a cached book's chapters and re-extract only those that changed"),
+    'serve': (reader_server, "Serve chapters and indexes over HTTP, as JSON or HTML, to any number of readers"),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m helloreader', description="Headless HelloReader tools.")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Log every request")
+    parser.add_argument('--profiles', metavar='DIR', help="Extra directory of site profile JSON files")
+    parser.add_argument('--trace', metavar='FILE', help="Append a JSON line per timed stage (fetch, decode, parse...) to FILE")
+    parser.add_argument('--stats', action='store_true', help="Print per-stage timings and counters when done")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (module, help_text) in COMMANDS.items():
+        module.add_arguments(subparsers.add_parser(name, help=help_text))
+    return parser
+
+
+def make_scraper(args):
+    """Builds a WebScraper sized for the command's concurrency, with the optional cache and search index attached."""
+    cache = ChapterCache(Path(args.cache)) if getattr(args, 'cache', None) else None
+    scraper = WebScraper(cache=cache, max_connections_per_host=max(1, getattr(args, 'concurrency', 1)))
+    if getattr(args, 'index', None):
+        scraper.search_index = SearchIndex(Path(args.index))
+    if args.profiles:
+        scraper.profiles.load_directory(args.profiles)
+    return scraper
+
+
+def main(argv):
+    """Entry point for 'python -m helloreader <command> ...'; returns a process exit code."""
+    args = build_parser().parse_args(argv)
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    module, _ = COMMANDS[args.command]
+    if args.trace:
+        tracer.open_trace(args.trace)
+    scraper = make_scraper(args)
+    try:
+        return module.run(args, scraper)
+    finally:
+        if scraper.search_index is not None:
+            scraper.search_index.close() # Waits for chapters still queued for indexing
+        tracer.close_trace()
+        if args.stats:
+            print(format_snapshot(tracer.snapshot()))
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+# Seconds a change waits before it is written, so a burst of page turns, theme
+# toggles and scroll updates becomes one write
+DEBOUNCE_SECONDS = 2.0
+# ...but state that never goes quiet (continuous-mode scroll updates) is still
+# written at least this often
+MAX_DELAY_SECONDS = 10.0
+MAX_RECENT = 50 # Chapters kept in the reading history
+
+
+class ConfigStore:
+    """The reader's saved state: preferences, bookmark, per-book positions and recent chapters.
+
+    Changes only touch the in-memory state and schedule a write; a background task
+    writes once the state has been quiet for `debounce` seconds, or after `max_delay`
+    seconds of unbroken changes, and flush() writes whatever is pending (call it on
+    exit). Each write carries the version of the snapshot it holds, and one older
+    than what is already on disk is dropped, so a slow background write cannot
+    overwrite a newer flush. Every write goes to a temporary file that
+    then replaces the config file, so a crash leaves the old or the new file, never
+    half of one.
+    """
+
+    def __init__(self, path, debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS):
+        self.path = Path(path)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.state = {}
+        self.writes = 0
+        self._pending = 0 # Changes since the last write
+        self._task = None
+        self._version = 0 # Snapshots taken so far; each write carries the version it holds
+        self._written_version = 0 # Version of the snapshot on disk
+        self._write_lock = threading.Lock() # A flush on exit may race the background write
+
+    def load(self):
+        """Reads the config file into state and returns it; a missing or unreadable file gives {}."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            logging.info("Loaded config from %s", self.path)
+        except FileNotFoundError:
+            logging.info("Config file not found at %s. Using defaults.", self.path)
+            self.state = {}
+        except (OSError, ValueError) as e:
+            logging.warning("Could not load config file %s: %s", self.path, e)
+            self.state = {}
+        return self.state
+
+    # --- Changes ---
+
+    def update(self, **changes):
+        """Sets top-level keys; a write is scheduled only if something actually changed."""
+        changed = {key: value for key, value in changes.items() if self.state.get(key) != value}
+        if changed:
+            self.state.update(changed)
+            self._schedule()
+
+    def position(self, book_key):
+        """The saved {'url', 'scroll', 'saved_at'} for a book (its book URL, or the chapter URL), or None."""
+        return self.state.get('positions', {}).get(book_key)
+
+    def set_position(self, book_key, url, scroll=None):
+        """Records where the reader is in a book: the chapter and how far down it they have scrolled.
+
+        Without a scroll offset, one already saved for the same chapter is kept.
+        """
+        positions = self.state.setdefault('positions', {})
+        old = positions.get(book_key)
+        if scroll is None:
+            scroll = old.get('scroll', 0) if old is not None and old.get('url') == url else 0
+        if old is not None and old.get('url') == url and old.get('scroll') == scroll:
+            return
+        positions[book_key] = {'url': url, 'scroll': scroll, 'saved_at': time.time()}
+        self._schedule()
+
+    def add_recent(self, url, title=None, book_title=None):
+        """Puts a chapter at the front of the reading history (most recent first, without repeats)."""
+        recent = self.state.get('recent', [])
+        if recent and recent[0].get('url') == url:
+            return
+        entry = {'url': url, 'title': title, 'book_title': book_title, 'read_at': time.time()}
+        self.state['recent'] = [entry] + [item for item in recent if item.get('url') != url][:MAX_RECENT - 1]
+        self._schedule()
+
+    # --- Writing ---
+
+    def _schedule(self):
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush() # No event loop to write from later (e.g. before the app is running)
+            return
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._write_later())
+
+    async def _write_later(self):
+        """Waits for changes to settle, then writes them off the event loop."""
+        loop = asyncio.get_running_loop()
+        waiting_since = loop.time()
+        while self._pending:
+            pending = self._pending
+            await asyncio.sleep(self.debounce)
+            if self._pending != pending and loop.time() - waiting_since < self.max_delay:
+                continue # Still changing; wait for it to go quiet
+            # Serialise here, on the loop that changes the state, and write from a worker thread
+            text, version, pending = self._snapshot()
+            waiting_since = loop.time()
+            try:
+                await loop.run_in_executor(None, self._write, text, pending, version)
+            except OSError as e:
+                logging.warning("Could not save config file %s: %s", self.path, e)
+
+    def flush(self):
+        """Writes pending changes now (blocking); called on exit."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        if not self._pending:
+            return
+        text, version, pending = self._snapshot()
+        try:
+            self._write(text, pending, version)
+        except OSError as e:
+            logging.warning("Could not save config file %s: %s", self.path, e)
+
+    def _snapshot(self):
+        """Serialises the state and takes its pending changes; returns (text, version, changes)."""
+        self._version += 1
+        text, changes, self._pending = json.dumps(self.state), self._pending, 0
+        return text, self._version, changes
+
+    def _write(self, text, changes, version):
+        with self._write_lock:
+            if version <= self._written_version:
+                logging.debug("Skipped config snapshot %s; %s is already saved", version, self._written_version)
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._written_version = version
+            self.writes += 1
+        logging.info("Saved config to %s (%s change(s) in one write)", self.path, changes)
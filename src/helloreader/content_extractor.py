@@ -0,0 +1,388 @@
+import hashlib
+import logging
+import re
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from .instrumentation import tracer
+
+# Elements BeautifulSoup treats as empty; they never get an end tag and serialise as <br/>
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+    'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr',
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+])
+
+# Attributes BeautifulSoup splits on whitespace and re-joins with single spaces
+MULTI_VALUED_ATTRIBUTES = frozenset([
+    'class', 'rel', 'rev', 'accept-charset', 'headers', 'accesskey', 'dropzone',
+])
+
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+NON_WHITESPACE = re.compile(r'\S+')
+
+# Characters fed to the parser per step; small enough to stop soon after the last link
+CHUNK_SIZE = 4096
+
+
+def _escape_text(text):
+    """BeautifulSoup's 'minimal' formatter for text nodes."""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _quote_attribute(value):
+    """BeautifulSoup's 'minimal' formatter for attribute values, including its choice of quotes."""
+    value = _escape_text(value)
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', '&quot;') + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
+
+class _Frame:
+    """An open element: enough state to answer BeautifulSoup's Tag.string when it closes."""
+    __slots__ = ('name', 'children', 'string')
+
+    def __init__(self, name):
+        self.name = name
+        self.children = 0
+        self.string = None # Tag.string candidate: the sole child's string, if there is exactly one
+
+
+class ChapterExtractor(HTMLParser):
+    """Finds the title, next/previous links and content boundaries in one pass without a tree.
+
+    The results match what WebScraper used to get from a full BeautifulSoup parse:
+    the title is the first title_tag's get_text(strip=True), links are the first <a>
+    whose .string equals the link text, and the title markup is re-serialised the way
+    str(tag) would so the content search starts at the same offset as before.
+    """
+
+    def __init__(self, title_tag='h1', next_link_text='下一章', prev_link_text='上一章'):
+        super().__init__(convert_charrefs=True)
+        self.title_tag = title_tag
+        self.link_texts = {next_link_text: 'next', prev_link_text: 'prev'}
+        self.title_found = False # A title element was opened
+        self.title_closed = False
+        self.title_parts = [] # Strings inside the title element
+        self.title_markup = [] # Serialised pieces of the title element, BeautifulSoup style
+        self.title_link = None # href of the first <a> inside the title (piaotia links the book page there)
+        self.title_link_parts = [] # ...and its text, which is the book's name
+        self._title_link_frame = None
+        self.links = {} # 'next'/'prev' -> href (None if the first matching <a> had none)
+        self._stack = [] # Open _Frames
+        self._title_frame = None
+        self._pending_text = [] # Consecutive data events form one text node, as in BeautifulSoup
+        self._hrefs = {} # id(frame) -> href for open <a> elements
+
+    @property
+    def done(self):
+        """True once nothing later in the document can change the result."""
+        return self.title_closed and len(self.links) == len(self.link_texts)
+
+    # --- Tree bookkeeping ---
+
+    def _flush_text(self):
+        if not self._pending_text:
+            return
+        text = ''.join(self._pending_text)
+        self._pending_text = []
+        # BeautifulSoup collapses whitespace-only strings to a single newline or space
+        if not text.strip(ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+        if self._stack:
+            parent = self._stack[-1]
+            parent.children += 1
+            parent.string = text
+        if self._title_frame is not None:
+            self.title_parts.append(text)
+            self.title_markup.append(_escape_text(text))
+            if self._title_link_frame is not None:
+                self.title_link_parts.append(text)
+
+    def _start_markup(self, tag, attrs, self_closing):
+        attributes = {}
+        for key, value in attrs:
+            if value is None:
+                value = ''
+            elif key in MULTI_VALUED_ATTRIBUTES:
+                value = ' '.join(NON_WHITESPACE.findall(value))
+            attributes[key] = value
+        rendered = ''.join(f' {key}={_quote_attribute(value)}' for key, value in attributes.items())
+        return f"<{tag}{rendered}{'/' if self_closing else ''}>"
+
+    def _close_frame(self, frame):
+        """Pops bookkeeping for an element whose end tag arrived (or was implied)."""
+        if self._title_frame is not None:
+            self.title_markup.append(f"</{frame.name}>")
+        if frame is self._title_frame:
+            self._title_frame = None
+            self.title_closed = True
+        if frame is self._title_link_frame:
+            self._title_link_frame = None
+        if frame.name == 'a':
+            href = self._hrefs.pop(id(frame), None)
+            kind = self.link_texts.get(frame.string) if frame.children == 1 else None
+            if kind and kind not in self.links:
+                self.links[kind] = href
+        if self._stack:
+            parent = self._stack[-1]
+            parent.children += 1
+            parent.string = frame.string if frame.children == 1 else None
+
+    def _empty_element(self, tag, attrs, markup):
+        if self._title_frame is not None:
+            self.title_markup.append(markup)
+        if self._stack:
+            parent = self._stack[-1]
+            parent.children += 1
+            parent.string = None
+
+    # --- HTMLParser callbacks ---
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if tag in VOID_ELEMENTS:
+            self._empty_element(tag, attrs, self._start_markup(tag, attrs, True))
+            return
+        frame = _Frame(tag)
+        if tag == self.title_tag and not self.title_found:
+            self.title_found = True
+            self._title_frame = frame
+        if self._title_frame is not None:
+            self.title_markup.append(self._start_markup(tag, attrs, False))
+        if tag == 'a':
+            self._hrefs[id(frame)] = dict(attrs).get('href')
+            if self._title_frame is not None and self.title_link is None:
+                self.title_link = self._hrefs[id(frame)]
+                self._title_link_frame = frame
+        self._stack.append(frame)
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush_text()
+        if tag in VOID_ELEMENTS:
+            self._empty_element(tag, attrs, self._start_markup(tag, attrs, True))
+        else:
+            # <span/> becomes an empty <span></span>
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        # Like BeautifulSoup, an end tag closes everything opened since its start tag,
+        # and an end tag with no open start tag is ignored
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index].name == tag:
+                while len(self._stack) > index:
+                    self._close_frame(self._stack.pop())
+                return
+
+    def handle_data(self, data):
+        self._pending_text.append(data)
+
+    def handle_comment(self, data):
+        self._flush_text()
+        if self._title_frame is not None:
+            self.title_markup.append(f"<!--{data}-->")
+        if self._stack:
+            parent = self._stack[-1]
+            parent.children += 1
+            parent.string = None
+
+    def close(self):
+        super().close()
+        self._flush_text()
+        while self._stack:
+            self._close_frame(self._stack.pop())
+
+    # --- Results ---
+
+    @property
+    def title(self):
+        """The title element's text, joined the way get_text(strip=True) joins it."""
+        return ''.join(part.strip() for part in self.title_parts if part.strip())
+
+    @property
+    def title_html(self):
+        """The title element as str(tag) would render it, or None if there was no title element."""
+        return ''.join(self.title_markup) if self.title_found else None
+
+
+def extract_chapter(html_content_raw, url, title_tag='h1', start_marker='<br>', end_marker='</div>',
+                    next_link_text='下一章', prev_link_text='上一章', failed_text=None):
+    """Extracts title, content slice and next/previous links from a decoded page in one pass.
+
+    Returns the same dict as WebScraper.fetch_chapter. If the content slice cannot be
+    located, content_html is failed_text.
+    """
+    # Title and links are both found during this one pass; 'links' below only resolves them
+    started = time.perf_counter()
+    parser = ChapterExtractor(title_tag, next_link_text, prev_link_text)
+    for position in range(0, len(html_content_raw), CHUNK_SIZE):
+        parser.feed(html_content_raw[position:position + CHUNK_SIZE])
+        if parser.done:
+            logging.debug("Extractor stopped early at offset %s of %s", position + CHUNK_SIZE, len(html_content_raw))
+            break
+    else:
+        parser.close()
+    tracer.record('parse', time.perf_counter() - started, url=url)
+
+    title = parser.title if parser.title_found else "Title Not Found"
+    logging.info("Extracted Title: %s", title)
+
+    # --- Content Extraction using EXACT Text Slicing ---
+    started = time.perf_counter()
+    content_html = None
+    search_start_pos = 0 # Position in raw HTML to start searching for markers
+    title_html_str = parser.title_html
+    if title_html_str is not None:
+        h1_start_index_in_raw = html_content_raw.find(title_html_str)
+        if h1_start_index_in_raw != -1:
+            search_start_pos = h1_start_index_in_raw + len(title_html_str)
+            logging.debug("Found title tag. Starting search for exact '%s' after index %s", start_marker, search_start_pos)
+        else:
+            logging.warning("Could not find title tag string in raw HTML. Searching for markers from start.")
+    else:
+        logging.warning("Could not find title element. Searching for markers from start.")
+
+    # Find the first exact start marker *after* search_start_pos, then the end marker after it
+    start_marker_found_at = html_content_raw.find(start_marker, search_start_pos)
+    if start_marker_found_at != -1:
+        slice_start_index = start_marker_found_at + len(start_marker) # Position *after* the found marker
+        slice_end_index = html_content_raw.find(end_marker, slice_start_index)
+        if slice_end_index != -1:
+            # Extract the slice, with basic cleanup
+            content_html = html_content_raw[slice_start_index:slice_end_index].strip().replace("&nbsp;", " ")
+            logging.info("Successfully extracted content (%s chars) between index %s and %s.", len(content_html), slice_start_index, slice_end_index)
+        else:
+            logging.warning("Could not find exact end marker '%s' after index %s.", end_marker, slice_start_index)
+    else:
+        logging.warning("Could not find exact start marker '%s' after index %s.", start_marker, search_start_pos)
+
+    if not content_html:
+        logging.error("Failed to extract content using exact text slicing for %s. Setting empty content.", url)
+        content_html = failed_text
+    tracer.record('slice', time.perf_counter() - started, url=url)
+
+    started = time.perf_counter()
+    next_href = parser.links.get('next')
+    prev_href = parser.links.get('prev')
+    next_page_url = urljoin(url, next_href) if next_href else None
+    prev_page_url = urljoin(url, prev_href) if prev_href else None
+    book_url = urljoin(url, parser.title_link) if parser.title_link else None
+    book_title = ''.join(parser.title_link_parts).strip() or None
+    tracer.record('links', time.perf_counter() - started, url=url)
+    logging.info("Prev URL: %s, Next URL: %s", prev_page_url, next_page_url)
+
+    return {
+        "title": title,
+        "content_html": content_html, # HTML content slice or failed_text
+        "next_page_url": next_page_url,
+        "previous_page_url": prev_page_url,
+        "book_url": book_url, # Book page linked from the title, if any
+        "book_title": book_title
+    }
+
+
+class SliceHasher:
+    """Digests the parts of a page a chapter is extracted from, as the page's bytes arrive.
+
+    spans is a list of marker sequences. Each span is digested from the start of its
+    first marker to the end of its last one, e.g. the title element, then the content
+    slice through to the "Next" link text, so ads, counters and scripts elsewhere on
+    the page never make an unchanged chapter look edited. Markers are raw bytes found
+    case-insensitively, in order, also across chunk boundaries; only a marker's length
+    of bytes is kept between chunks. A page that ends inside a span is digested up to
+    its end.
+    """
+
+    def __init__(self, spans):
+        self._markers = [marker.lower() for span in spans for marker in span]
+        self._opens, self._closes, position = set(), set(), 0
+        for span in spans:
+            self._opens.add(position)
+            position += len(span)
+            self._closes.add(position - 1)
+        self._keep = max(map(len, self._markers)) - 1 # Enough to find a marker split across chunks
+        self._stage = 0 # Index of the marker being looked for
+        self._hash = hashlib.sha1()
+        self._started = False
+        self._tail = b''
+        self._offset = 0 # Stream offset of self._tail[0]
+        self._scan_from = 0 # Stream offset the next marker search starts at
+        self._hashed_to = None # Stream offset digested up to while inside a span
+        self.done = False
+
+    def feed(self, chunk):
+        """Consumes the next bytes of the page; returns True once every span has been seen."""
+        if self.done:
+            return True
+        buffer = self._tail + chunk
+        lowered = buffer.lower() # Bytes only: a multi-byte character never contains '<'
+        base = self._offset
+        while self._stage < len(self._markers):
+            found = lowered.find(self._markers[self._stage], max(0, self._scan_from - base))
+            if found == -1:
+                break
+            self._scan_from = base + found + len(self._markers[self._stage])
+            if self._stage in self._opens:
+                self._hashed_to, self._started = base + found, True
+            if self._stage in self._closes:
+                self._hash.update(buffer[self._hashed_to - base:self._scan_from - base])
+                self._hashed_to = None
+            self._stage += 1
+        if self._hashed_to is not None:
+            self._hash.update(buffer[self._hashed_to - base:])
+            self._hashed_to = base + len(buffer)
+        self.done = self._stage == len(self._markers)
+        self._tail = buffer[max(0, len(buffer) - self._keep):] if self._keep else b''
+        self._offset = base + len(buffer) - len(self._tail)
+        return self.done
+
+    def hexdigest(self):
+        """The digest of the spans, or None if the first one never started."""
+        return self._hash.hexdigest() if self._started else None
+
+
+class TocExtractor(HTMLParser):
+    """Collects (href, text) for every <a> whose href matches link_pattern, in document order."""
+
+    def __init__(self, link_pattern):
+        super().__init__(convert_charrefs=True)
+        self.link_pattern = link_pattern
+        self.links = []
+        self._href = None # href of the matching <a> currently open
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            self._href = href if href and self.link_pattern.search(href) else None
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._href is not None:
+            self.links.append((self._href, ''.join(self._text).strip()))
+            self._href = None
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+
+def extract_toc(html_content_raw, toc_url, link_pattern):
+    """Returns the ordered chapter list of an index page as [{'title', 'url'}], without duplicates."""
+    parser = TocExtractor(link_pattern)
+    parser.feed(html_content_raw)
+    parser.close()
+    seen = set()
+    chapters = []
+    for href, title in parser.links:
+        chapter_url = urljoin(toc_url, href)
+        if chapter_url not in seen:
+            seen.add(chapter_url)
+            chapters.append({'title': title, 'url': chapter_url})
+    logging.info("Extracted %s chapter links from %s", len(chapters), toc_url)
+    return chapters
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .library import BookStore, is_library_path
+from .web_scraper import ScraperException, extraction_pool
+
+
+class BookCrawler:
+    """Downloads a book chapter by chapter into an ordered JSON-lines file, resumably.
+
+    Each output line is a fetch_chapter dict plus 'index' and 'url'. An output path
+    ending in .hrbook writes a compact library book (see library.BookStore) instead.
+    A checkpoint file records how far the output is known to be complete, so an
+    interrupted crawl picks up where it stopped instead of starting over.
+    """
+
+    def __init__(self, scraper, output_path, checkpoint_path=None, concurrency=4, rate=None, processes=0):
+        self.scraper = scraper
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path or f"{output_path}.checkpoint.json"
+        self.concurrency = max(1, concurrency)
+        if rate is not None:
+            # A cap only; below it the scraper's scheduler goes as fast as the site copes with
+            scraper.scheduler.configure(max_rate=rate)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawl')
+        # With processes, the threads only fetch; decoding and extraction run in worker processes
+        self.extraction_pool = extraction_pool(processes, scraper.profiles) if processes else None
+        self.written = 0 # Chapters written so far, including those from a resumed run
+        self._output = None
+        self._store = None # BookStore when writing a library book
+
+    # --- Checkpointing ---
+
+    def _load_checkpoint(self, source):
+        """Returns the saved checkpoint for this source, or None if there is nothing to resume."""
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable checkpoint %s: %s", self.checkpoint_path, e)
+            return None
+        if checkpoint.get('source') != source:
+            logging.warning("Checkpoint %s belongs to %s, starting fresh", self.checkpoint_path, checkpoint.get('source'))
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, source, **state):
+        """Atomically records progress; output_bytes lets a resume drop a half-written tail."""
+        checkpoint = dict(state, source=source, written=self.written)
+        if self._output is not None:
+            checkpoint['output_bytes'] = self._output.tell()
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _open_output(self, checkpoint):
+        """Opens the output to continue from checkpoint; returns the checkpoint, or None if the
+        output no longer holds what it records (deleted or cut short) and the crawl starts over."""
+        if is_library_path(self.output_path):
+            self._store = BookStore(self.output_path, writable=True)
+            if checkpoint and len(self._store) < checkpoint['written']:
+                logging.warning("%s holds %s of the %s chapter(s) in checkpoint %s, starting fresh",
+                                self.output_path, len(self._store), checkpoint['written'], self.checkpoint_path)
+                checkpoint = None
+            # Chapters appended after the last checkpoint are dropped, as with JSON lines
+            self._store.truncate(checkpoint['written'] if checkpoint else 0)
+            self.written = len(self._store)
+            if checkpoint:
+                logging.info("Resuming crawl after %s chapter(s)", self.written)
+            return checkpoint
+        if checkpoint:
+            try:
+                size = os.path.getsize(self.output_path)
+            except OSError:
+                size = -1
+            if size < checkpoint['output_bytes']:
+                logging.warning("%s is missing or shorter than checkpoint %s records, starting fresh",
+                                self.output_path, self.checkpoint_path)
+                checkpoint = None
+        if checkpoint:
+            self._output = open(self.output_path, 'r+', encoding='utf-8')
+            # Anything past the checkpoint was written but never confirmed
+            self._output.truncate(checkpoint['output_bytes'])
+            self._output.seek(checkpoint['output_bytes'])
+            self.written = checkpoint['written']
+            logging.info("Resuming crawl after %s chapter(s)", self.written)
+        else:
+            self._output = open(self.output_path, 'w', encoding='utf-8')
+            self.written = 0
+        return checkpoint
+
+    def _write(self, url, chapter):
+        record = dict(chapter, index=self.written, url=url)
+        record.pop('_base_url', None)
+        if self._store is not None:
+            del record['index'] # Implied by the chapter's position in the book
+            self._store.append(record)
+        else:
+            self._output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._output.flush()
+        self.written += 1
+
+    def _close_output(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        else:
+            self._output.close()
+
+    async def _fetch(self, url):
+        return await self.scraper.fetch_chapter_async(url, self.executor, extraction_pool=self.extraction_pool)
+
+    # --- Crawl modes ---
+
+    async def crawl_chain(self, start_url, limit=None):
+        """Follows next_page_url from start_url. Inherently serial: each URL comes from the previous page."""
+        checkpoint = self._load_checkpoint(start_url)
+        checkpoint = self._open_output(checkpoint)
+        url = checkpoint['next_url'] if checkpoint else start_url
+        try:
+            while url and (limit is None or self.written < limit):
+                chapter = await self._fetch(url)
+                self._write(url, chapter)
+                url = chapter.get('next_page_url')
+                self._save_checkpoint(start_url, next_url=url)
+                logging.info("Crawled chapter %s: %s", self.written, chapter.get('title'))
+        finally:
+            self._close_output()
+        return self.written
+
+    async def crawl_urls(self, source, urls, limit=None):
+        """Fetches a known, ordered list of chapter URLs with a bounded worker pool.
+
+        Results are written strictly in order; the reorder window is bounded so fast
+        workers cannot run arbitrarily far ahead of a slow chapter.
+        """
+        checkpoint = self._load_checkpoint(source)
+        checkpoint = self._open_output(checkpoint)
+        end = len(urls) if limit is None else min(len(urls), limit)
+        queue = asyncio.Queue()
+        for index in range(self.written, end):
+            queue.put_nowait(index)
+
+        window = asyncio.Semaphore(self.concurrency * 4) # Chapters fetched but not yet written
+        finished = {} # index -> chapter waiting for its turn to be written
+
+        async def worker():
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await window.acquire()
+                finished[index] = await self._fetch(urls[index])
+                # Write every chapter that is now contiguous with the output
+                # (no await in between, so workers cannot interleave here)
+                while self.written in finished:
+                    written_index = self.written
+                    self._write(urls[written_index], finished.pop(written_index))
+                    window.release()
+                self._save_checkpoint(source)
+                logging.info("Crawled chapter %s/%s", index + 1, end)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            self._close_output()
+        return self.written
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.extraction_pool is not None:
+            self.extraction_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def add_arguments(parser):
+    """Registers the 'crawl' subcommand's options on an argparse parser."""
+    parser.add_argument('start_url', help="Chapter URL to start from (with --toc: any chapter, book or index URL)")
+    parser.add_argument('--toc', action='store_true',
+                        help="Read the book's chapter list and fetch chapters in parallel instead of following Next links")
+    parser.add_argument('-o', '--output', default='book.jsonl', help="File to write chapters to: JSON lines, or a compact library book if it ends in .hrbook (default: book.jsonl)")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <output>.checkpoint.json)")
+    parser.add_argument('-c', '--concurrency', type=int, default=4,
+                        help="Most simultaneous chapter fetches; fewer while the site pushes back (default: 4)")
+    parser.add_argument('-p', '--processes', type=int, default=0,
+                        help="Extract chapters in this many worker processes instead of on the fetch threads (default: 0)")
+    parser.add_argument('--rate', type=float,
+                        help="Most requests per second per host, 0 for no cap (default: as fast as the site allows, up to 8)")
+    parser.add_argument('--limit', type=int, help="Stop after this many chapters")
+    parser.add_argument('--cache', help="Chapter cache file to read from and fill")
+    parser.add_argument('--index', help="Search index file to add every fetched chapter to")
+
+
+def run(args, scraper):
+    """Runs the 'crawl' subcommand; returns a process exit code."""
+    crawler = BookCrawler(scraper, args.output, args.checkpoint, args.concurrency, args.rate, args.processes)
+    started = time.monotonic()
+    try:
+        if args.toc:
+            # With a known chapter list the fetches can fan out; rerunning after the
+            # book grows resumes at the checkpoint and so only fetches the new tail
+            chapters = scraper.fetch_toc(args.start_url)
+            source = scraper.toc_url_for(args.start_url)
+            written = asyncio.run(crawler.crawl_urls(source, [chapter['url'] for chapter in chapters], args.limit))
+        else:
+            written = asyncio.run(crawler.crawl_chain(args.start_url, args.limit))
+    except ScraperException as e:
+        print(f"Crawl stopped after {crawler.written} chapter(s): {e}")
+        print(f"Run the same command again to resume from {crawler.checkpoint_path}")
+        return 1
+    except KeyboardInterrupt:
+        print(f"Interrupted after {crawler.written} chapter(s); run again to resume")
+        return 130
+    finally:
+        crawler.close()
+    elapsed = time.monotonic() - started
+    print(f"Wrote {written} chapter(s) to {args.output} in {elapsed:.1f}s")
+    for host, state in scraper.scheduler.snapshot().items():
+        print(f"  {host}: ended at {state['rate']:.1f} request(s)/s, {state['concurrency']} at once "
+              f"({state['throttled']} throttled response(s), {state['backoffs']} back-off(s))")
+    return 0
@@ -0,0 +1,233 @@
+import html
+import json
+import logging
+import re
+import time
+import uuid
+import zipfile
+from pathlib import Path
+
+from .library import BookStore, LibraryError, is_library_path
+from .search_index import plain_text
+from .web_scraper import ScraperException
+
+# Chapters stream through both writers one at a time: each is cleaned, written and
+# dropped before the next is read. Only the chapter titles are kept until the end,
+# for the EPUB's table of contents.
+FORMATS = ('epub', 'txt')
+INDENT = '　　' # Two ideographic spaces, the usual indent of a Chinese paragraph
+XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]') # Control characters XHTML may not contain
+
+STYLESHEET = """body { font-family: serif; line-height: 1.6; }
+h2 { text-align: center; margin: 1em 0; }
+p { text-indent: 2em; margin: 0 0 0.5em 0; }
+"""
+
+CONTAINER_XML = """<?xml version="1.0" encoding="utf-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+CHAPTER_XHTML = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" lang="{language}" xml:lang="{language}">
+<head><title>{title}</title><link rel="stylesheet" type="text/css" href="style.css"/></head>
+<body>
+<h2>{title}</h2>
+{paragraphs}
+</body>
+</html>
+"""
+
+NAV_XHTML = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="{language}" xml:lang="{language}">
+<head><title>{title}</title></head>
+<body>
+<nav epub:type="toc" id="toc"><h1>{title}</h1><ol>
+{items}
+</ol></nav>
+</body>
+</html>
+"""
+
+CONTENT_OPF = """<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">{identifier}</dc:identifier>
+    <dc:title>{title}</dc:title>
+    <dc:creator>{author}</dc:creator>
+    <dc:language>{language}</dc:language>
+    <meta property="dcterms:modified">{modified}</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="style" href="style.css" media-type="text/css"/>
+{manifest}
+  </manifest>
+  <spine>
+{spine}
+  </spine>
+</package>
+"""
+
+
+class ExportError(Exception):
+    """Raised for a source that cannot be read or an output format that is not supported."""
+
+
+def paragraphs(chapter):
+    """The chapter's text as a list of paragraphs, with the &nbsp; indents and <br> breaks of content_html resolved."""
+    if chapter.get('content_html') is not None:
+        text = plain_text(chapter['content_html'])
+    else:
+        text = chapter.get('content_text', '').replace('\xa0', ' ')
+    return [line.strip() for line in XML_INVALID.sub('', text).split('\n') if line.strip()]
+
+
+# --- Sources: generators of chapter dicts, in reading order ---
+
+def store_chapters(path):
+    """Yields the chapters of a library book or a JSON-lines crawl output, one at a time."""
+    if is_library_path(path):
+        with BookStore(path) as store:
+            yield from store
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chain_chapters(scraper, start_url, limit=None):
+    """Yields chapters by following next_page_url from start_url, fetching (or reading from the
+    scraper's cache) one chapter at a time. Requests are paced by the scraper's scheduler;
+    chapters served from the cache cost no request and so are not paced at all."""
+    url, count = start_url, 0
+    while url and (limit is None or count < limit):
+        chapter = scraper.fetch_chapter(url)
+        chapter['url'] = url
+        yield chapter
+        count += 1
+        url = chapter.get('next_page_url')
+
+
+# --- Writers ---
+
+def write_text(chapters, path):
+    """Writes chapters to a UTF-8 text file as they arrive; returns the number written."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for chapter in chapters:
+            if count:
+                f.write('\n\n')
+            f.write((chapter.get('title') or '') + '\n\n')
+            f.write('\n'.join(INDENT + paragraph for paragraph in paragraphs(chapter)) + '\n')
+            count += 1
+    return count
+
+
+def write_epub(chapters, path, title=None, author=None, language='zh', identifier=None):
+    """Writes chapters to an EPUB 3 file as they arrive; returns the number written.
+
+    Each chapter becomes its own XHTML file in the zip as soon as it is read. The
+    package document and table of contents need every chapter, so they are written
+    last from the titles collected along the way. title defaults to the first
+    chapter's book_title.
+    """
+    titles = []
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as book:
+        # The mimetype must come first and uncompressed so readers can sniff it
+        book.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        book.writestr('META-INF/container.xml', CONTAINER_XML)
+        book.writestr('OEBPS/style.css', STYLESHEET)
+        for chapter in chapters:
+            if title is None:
+                title = chapter.get('book_title')
+            chapter_title = chapter.get('title') or f"Chapter {len(titles) + 1}"
+            book.writestr(f'OEBPS/{_chapter_file(len(titles))}', CHAPTER_XHTML.format(
+                language=language,
+                title=_escape(chapter_title),
+                paragraphs='\n'.join(f'<p>{_escape(paragraph)}</p>' for paragraph in paragraphs(chapter)),
+            ))
+            titles.append(chapter_title)
+        title = title or Path(path).stem
+        book.writestr('OEBPS/nav.xhtml', NAV_XHTML.format(
+            language=language,
+            title=_escape(title),
+            items='\n'.join(f'<li><a href="{_chapter_file(number)}">{_escape(chapter_title)}</a></li>'
+                            for number, chapter_title in enumerate(titles)),
+        ))
+        book.writestr('OEBPS/content.opf', CONTENT_OPF.format(
+            identifier=_escape(identifier or f"urn:uuid:{uuid.uuid4()}"),
+            title=_escape(title),
+            author=_escape(author or 'Unknown'),
+            language=language,
+            modified=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            manifest='\n'.join(f'    <item id="c{number}" href="{_chapter_file(number)}" media-type="application/xhtml+xml"/>'
+                               for number in range(len(titles))),
+            spine='\n'.join(f'    <itemref idref="c{number}"/>' for number in range(len(titles))),
+        ))
+    return len(titles)
+
+
+def _chapter_file(number):
+    return f'chapter{number + 1:05d}.xhtml'
+
+
+def _escape(text):
+    return html.escape(XML_INVALID.sub('', text), quote=True)
+
+
+def output_format(path, requested=None):
+    return requested or Path(path).suffix.lstrip('.').lower()
+
+
+def export(chapters, path, requested_format=None, **metadata):
+    """Writes chapters to path as EPUB or text (chosen by requested_format, else by the file suffix)."""
+    chosen = output_format(path, requested_format)
+    if chosen == 'epub':
+        return write_epub(chapters, path, **metadata)
+    if chosen == 'txt':
+        return write_text(chapters, path)
+    raise ExportError(f"Cannot export to {chosen or 'a file without a suffix'}; expected one of {', '.join(FORMATS)}")
+
+
+def add_arguments(parser):
+    """Registers the 'export' subcommand's options on an argparse parser."""
+    parser.add_argument('source', help="Library book (.hrbook), JSON-lines crawl output, or a chapter URL to follow Next links from")
+    parser.add_argument('-o', '--output', required=True, help="File to write: .epub or .txt")
+    parser.add_argument('--format', choices=FORMATS, help="Output format (default: from the output file's suffix)")
+    parser.add_argument('--title', help="Book title (default: the book title of the first chapter)")
+    parser.add_argument('--author', help="Author for the EPUB metadata")
+    parser.add_argument('--limit', type=int, help="Stop after this many chapters (URL sources only)")
+    parser.add_argument('--rate', type=float,
+                        help="Most requests per second per site for a URL source, 0 for no cap (default: as fast as the site allows, up to 8)")
+    parser.add_argument('--cache', help="Chapter cache file to read from and fill (URL sources)")
+
+
+def run(args, scraper):
+    """Runs the 'export' subcommand; returns a process exit code."""
+    if args.source.startswith(('http://', 'https://')):
+        if args.rate is not None:
+            scraper.scheduler.configure(max_rate=args.rate)
+        chapters = chain_chapters(scraper, args.source, args.limit)
+    else:
+        chapters = store_chapters(args.source)
+    metadata = {}
+    if output_format(args.output, args.format) == 'epub':
+        # Derived from the source, so re-exporting a book updates it in a reader's library
+        metadata = {'title': args.title, 'author': args.author,
+                    'identifier': f"urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, args.source)}"}
+    started = time.monotonic()
+    try:
+        count = export(chapters, args.output, args.format, **metadata)
+    except (ExportError, LibraryError, ScraperException, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    logging.info("Exported %s chapter(s) from %s", count, args.source)
+    print(f"Wrote {count} chapter(s) to {args.output} in {time.monotonic() - started:.1f}s")
+    return 0
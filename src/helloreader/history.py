@@ -0,0 +1,86 @@
+import logging
+import sys
+
+from .instrumentation import tracer
+from .lru import ByteLRU, chapter_size
+
+# Defaults used when the config file has no 'history' section
+DEFAULT_HISTORY_SETTINGS = {
+    'max_bytes': 16 * 1024 * 1024, # Memory cap for recently shown chapters and their documents
+}
+
+# The chapter fields a rendered document is built from
+RENDERED_KEYS = ('title', 'content_html', 'content_text', 'next_page_url', 'previous_page_url', 'book_url', 'book_title')
+
+
+def _entry_size(entry):
+    data, documents = entry
+    return chapter_size(data) + sum(sys.getsizeof(document) for document in documents.values())
+
+
+class ChapterHistory:
+    """The chapters shown in this session, most recent last, bounded by memory.
+
+    Each entry holds the scraped chapter dict and the documents rendered for it,
+    one per (theme, continuous) layout, so going back to a chapter or re-showing
+    it in the other theme needs neither a fetch nor a render. Unlike the prefetch
+    buffer it is not dropped when the reader jumps elsewhere.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self._entries = ByteLRU(max_bytes, sizeof=_entry_size) # url -> (data, {(theme, continuous): document})
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_bytes=None):
+        """Applies settings (e.g. from the config file); unspecified values stay unchanged."""
+        if max_bytes is not None:
+            self._entries.resize(int(max_bytes))
+
+    def get(self, url):
+        """Returns the chapter dict last shown for url, or None; every call counts as a hit or a miss."""
+        entry = self._entries.get(url)
+        if entry is None:
+            self.misses += 1
+            tracer.count('history_misses')
+            logging.info("History miss for %s (%s)", url, self.summary())
+            return None
+        self.hits += 1
+        tracer.count('history_hits')
+        logging.info("History hit for %s (%s)", url, self.summary())
+        return entry[0]
+
+    def put(self, url, data):
+        """Remembers a chapter that was shown; its documents are kept only if the content is unchanged."""
+        if not url or (data.get('content_html') is None and data.get('content_text') is None):
+            return # Metadata only (e.g. a chapter followed in continuous mode); nothing to re-show
+        old = self._entries.get(url)
+        unchanged = old is not None and all(old[0].get(key) == data.get(key) for key in RENDERED_KEYS)
+        self._entries.put(url, (data, old[1] if unchanged else {}))
+
+    def document(self, url, theme, continuous):
+        """Returns the document rendered for url in this theme and layout, or None."""
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        return entry[1].get((theme, continuous))
+
+    def store_document(self, url, theme, continuous, document):
+        """Keeps a rendered document with its chapter (re-sizing the entry) if the chapter is remembered."""
+        entry = self._entries.get(url)
+        if entry is None:
+            return
+        data, documents = entry
+        self._entries.put(url, (data, {**documents, (theme, continuous): document}))
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0
+        return (f"{self.hits} hit(s), {self.misses} miss(es), {rate:.0%} hit rate; "
+                f"{len(self._entries)} chapter(s) in {self._entries.total_bytes / 1024:.0f} KiB")
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,117 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _StageStats:
+    """Running totals for one span name."""
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+class Tracer:
+    """Per-stage timings and counters for chapter loads, cheap enough to leave on.
+
+    Spans are aggregated in memory (count/total/max/last per name) for the stats
+    panel; when a trace file is open, every span is also written to it as one
+    JSON object per line. Safe to use from the fetch worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {} # span name -> _StageStats
+        self._counters = {}
+        self._trace_file = None
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Times the body of a with-block as one occurrence of stage `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, **attributes)
+
+    def record(self, name, seconds, **attributes):
+        """Adds a stage timing measured elsewhere (e.g. across callbacks)."""
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = _StageStats()
+            stats.add(seconds)
+            if self._trace_file is not None:
+                entry = dict(attributes, ts=time.time(), span=name, ms=round(seconds * 1000, 3),
+                             thread=threading.current_thread().name)
+                try:
+                    self._trace_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                except (OSError, TypeError, ValueError) as e:
+                    logging.warning("Could not write trace entry: %s", e)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """Returns {'stages': {name: {count, total_ms, mean_ms, max_ms, last_ms}}, 'counters': {name: n}}."""
+        with self._lock:
+            stages = {
+                name: {
+                    'count': stats.count,
+                    'total_ms': stats.total * 1000,
+                    'mean_ms': stats.total * 1000 / stats.count,
+                    'max_ms': stats.max * 1000,
+                    'last_ms': stats.last * 1000,
+                }
+                for name, stats in self._stages.items()
+            }
+            return {'stages': stages, 'counters': dict(self._counters)}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def open_trace(self, path):
+        """Starts appending every span to path as JSON lines; replaces any open trace file."""
+        trace_file = open(path, 'a', encoding='utf-8', buffering=1) # Line-buffered: a crash loses nothing
+        with self._lock:
+            previous, self._trace_file = self._trace_file, trace_file
+        if previous is not None:
+            previous.close()
+        logging.info("Writing trace to %s", path)
+
+    def close_trace(self):
+        with self._lock:
+            trace_file, self._trace_file = self._trace_file, None
+        if trace_file is not None:
+            trace_file.close()
+
+
+def format_snapshot(snapshot):
+    """Renders a snapshot as aligned plain text, slowest stages (by total time) first."""
+    lines = [f"{'stage':<14}{'count':>7}{'last ms':>10}{'mean ms':>10}{'max ms':>10}{'total ms':>11}"]
+    for name, stats in sorted(snapshot['stages'].items(), key=lambda item: -item[1]['total_ms']):
+        lines.append(f"{name:<14}{stats['count']:>7}{stats['last_ms']:>10.2f}{stats['mean_ms']:>10.2f}"
+                     f"{stats['max_ms']:>10.2f}{stats['total_ms']:>11.1f}")
+    if snapshot['counters']:
+        lines.append('')
+        lines.extend(f"{name:<20}{value:>8}" for name, value in sorted(snapshot['counters'].items()))
+    return '\n'.join(lines)
+
+
+# The process-wide tracer the scraper, extractor, renderer and app report to
+tracer = Tracer()
@@ -0,0 +1,287 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError: # Optional: zlib is always there and every reader can fall back to it
+    zstandard = None
+
+# A book is two files side by side:
+#
+#   <name>.hrbook       header, then one record per chapter: compressed metadata
+#                       (title, links, url) followed by the compressed chapter body
+#   <name>.hrbook.idx   header, then one fixed-size entry per chapter: the record's
+#                       offset and the lengths of its two parts
+#
+# Both are append-only. The index is the source of truth: a record is only part of
+# the book once its index entry is written, so a crash mid-append loses at most that
+# chapter. Keeping metadata and body apart lets the chapter list be read without
+# decompressing any chapter text.
+LIBRARY_SUFFIX = '.hrbook'
+INDEX_SUFFIX = '.idx'
+
+DATA_MAGIC = b'HRBK'
+INDEX_MAGIC = b'HRBI'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBB2x') # magic, version, codec
+ENTRY = struct.Struct('<QII') # record offset, metadata length, body length
+
+CODECS = {'zlib': 0, 'zstd': 1}
+ZLIB_LEVEL = 9 # Chapters are written once and read many times
+ZSTD_LEVEL = 19
+
+
+class LibraryError(Exception):
+    """Raised for a book file that is missing, damaged, or needs a codec that is not installed."""
+
+
+def default_codec():
+    return 'zstd' if zstandard is not None else 'zlib'
+
+
+class _Codec:
+    def __init__(self, name):
+        if name == 'zstd' and zstandard is None:
+            raise LibraryError("This book is zstd-compressed; install 'zstandard' to read it")
+        self.name = name
+        if name == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data):
+        if self.name == 'zstd':
+            return self._compressor.compress(data)
+        return zlib.compress(data, ZLIB_LEVEL)
+
+    def decompress(self, data):
+        if self.name == 'zstd':
+            return self._decompressor.decompress(data)
+        return zlib.decompress(data)
+
+
+class BookStore:
+    """A compact, append-only store of one book's chapters, readable by ordinal.
+
+    Opening a book maps its index into memory and reads nothing else, so it takes
+    the same time for 50 chapters as for 5,000. Reading chapter n is one index
+    lookup and one slice of the mapped data file. Chapters are the dicts
+    fetch_chapter returns, plus an optional 'url'.
+    """
+
+    def __init__(self, path, writable=False, codec=None):
+        self.path = os.fspath(path)
+        self.index_path = self.path + INDEX_SUFFIX
+        self.writable = writable
+        self._lock = threading.RLock()
+        self._data_map = None
+        self._index_map = None
+        if writable and not os.path.exists(self.index_path):
+            self._create(codec or default_codec())
+        try:
+            self._data = open(self.path, 'r+b' if writable else 'rb')
+            self._index = open(self.index_path, 'r+b' if writable else 'rb')
+        except FileNotFoundError as e:
+            raise LibraryError(f"No book at {self.path}") from e
+        self._codec = _Codec(self._read_header(self._data, DATA_MAGIC))
+        self._read_header(self._index, INDEX_MAGIC)
+        self._count = (os.fstat(self._index.fileno()).st_size - HEADER.size) // ENTRY.size
+        if writable:
+            self._drop_unindexed_tail()
+        self._map()
+
+    def _create(self, codec):
+        if codec not in CODECS:
+            raise LibraryError(f"Unknown codec {codec!r}; expected one of {', '.join(CODECS)}")
+        _Codec(codec) # Fails early if zstd was asked for but is not installed
+        # Data file first: an index without its data file would be unreadable
+        for path, magic in ((self.path, DATA_MAGIC), (self.index_path, INDEX_MAGIC)):
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(magic, FORMAT_VERSION, CODECS[codec]))
+
+    def _read_header(self, f, expected_magic):
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise LibraryError(f"{f.name} is truncated")
+        magic, version, codec_id = HEADER.unpack(header)
+        if magic != expected_magic:
+            raise LibraryError(f"{f.name} is not a HelloReader book file")
+        if version != FORMAT_VERSION:
+            raise LibraryError(f"{f.name} has format version {version}; this version reads {FORMAT_VERSION}")
+        for name, value in CODECS.items():
+            if value == codec_id:
+                return name
+        raise LibraryError(f"{f.name} uses unknown codec {codec_id}")
+
+    def _drop_unindexed_tail(self):
+        """Cuts off a half-written index entry or record left by an interrupted append."""
+        index_size = HEADER.size + self._count * ENTRY.size
+        if os.fstat(self._index.fileno()).st_size != index_size:
+            self._index.truncate(index_size)
+        data_size = self._record_end(self._count - 1) if self._count else HEADER.size
+        if os.fstat(self._data.fileno()).st_size != data_size:
+            logging.warning("Dropping an incomplete chapter at the end of %s", self.path)
+            self._data.truncate(data_size)
+
+    def _record_end(self, ordinal):
+        self._index.seek(HEADER.size + ordinal * ENTRY.size)
+        offset, meta_length, body_length = ENTRY.unpack(self._index.read(ENTRY.size))
+        return offset + meta_length + body_length
+
+    # --- Memory maps ---
+
+    def _map(self):
+        """(Re)maps both files at their current size."""
+        self._unmap()
+        self._index_map = mmap.mmap(self._index.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data_map = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _unmap(self):
+        for mapped in (self._index_map, self._data_map):
+            if mapped is not None:
+                mapped.close()
+        self._index_map = self._data_map = None
+
+    def _entry(self, ordinal):
+        if not 0 <= ordinal < self._count:
+            raise IndexError(f"Chapter {ordinal} is out of range (the book has {self._count})")
+        position = HEADER.size + ordinal * ENTRY.size
+        if position + ENTRY.size > len(self._index_map):
+            self._map() # Appended since the last mapping
+        offset, meta_length, body_length = ENTRY.unpack_from(self._index_map, position)
+        if offset + meta_length + body_length > len(self._data_map):
+            self._map()
+        return offset, meta_length, body_length
+
+    # --- Reading ---
+
+    def __len__(self):
+        return self._count
+
+    def metadata(self, ordinal):
+        """Returns chapter `ordinal`'s title, links and url without decompressing its body."""
+        with self._lock:
+            offset, meta_length, _ = self._entry(ordinal)
+            blob = self._data_map[offset:offset + meta_length]
+        return json.loads(self._codec.decompress(blob))
+
+    def chapter(self, ordinal):
+        """Returns chapter `ordinal` as a fetch_chapter dict."""
+        with self._lock:
+            offset, meta_length, body_length = self._entry(ordinal)
+            meta_blob = self._data_map[offset:offset + meta_length]
+            body_blob = self._data_map[offset + meta_length:offset + meta_length + body_length]
+        chapter = json.loads(self._codec.decompress(meta_blob))
+        chapter['content_html'] = self._codec.decompress(body_blob).decode('utf-8')
+        return chapter
+
+    def titles(self):
+        return [self.metadata(ordinal).get('title') for ordinal in range(self._count)]
+
+    def __iter__(self):
+        for ordinal in range(self._count):
+            yield self.chapter(ordinal)
+
+    def stats(self):
+        """Sizes on disk, for comparing against the pages the book came from."""
+        with self._lock:
+            return {
+                'chapters': self._count,
+                'codec': self._codec.name,
+                'data_bytes': os.fstat(self._data.fileno()).st_size,
+                'index_bytes': os.fstat(self._index.fileno()).st_size,
+            }
+
+    # --- Writing ---
+
+    def append(self, chapter):
+        """Adds a chapter at the end of the book and returns its ordinal."""
+        if not self.writable:
+            raise LibraryError(f"{self.path} was opened read-only")
+        metadata = {key: value for key, value in chapter.items()
+                    if key != 'content_html' and not key.startswith('_')}
+        meta_blob = self._codec.compress(json.dumps(metadata, ensure_ascii=False).encode('utf-8'))
+        body_blob = self._codec.compress((chapter.get('content_html') or '').encode('utf-8'))
+        with self._lock:
+            offset = self._data.seek(0, os.SEEK_END)
+            self._data.write(meta_blob)
+            self._data.write(body_blob)
+            self._data.flush()
+            # The record is only part of the book once its index entry lands
+            self._index.seek(0, os.SEEK_END)
+            self._index.write(ENTRY.pack(offset, len(meta_blob), len(body_blob)))
+            self._index.flush()
+            ordinal = self._count
+            self._count += 1
+        return ordinal
+
+    def truncate(self, count):
+        """Drops every chapter from ordinal `count` on (used to resume an interrupted crawl)."""
+        if not self.writable:
+            raise LibraryError(f"{self.path} was opened read-only")
+        with self._lock:
+            if count >= self._count:
+                return
+            data_size = self._record_end(count - 1) if count else HEADER.size
+            self._unmap() # Some platforms refuse to shrink a mapped file
+            self._index.truncate(HEADER.size + count * ENTRY.size)
+            self._data.truncate(data_size)
+            self._count = count
+            self._map()
+
+    def close(self):
+        with self._lock:
+            self._unmap()
+            self._data.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def is_library_path(path):
+    return os.fspath(path).endswith(LIBRARY_SUFFIX)
+
+
+def add_arguments(parser):
+    """Registers the 'library' subcommand's options on an argparse parser."""
+    parser.add_argument('book', help=f"Book file ({LIBRARY_SUFFIX}), as written by 'crawl -o NAME{LIBRARY_SUFFIX}'")
+    parser.add_argument('--chapter', type=int, metavar='N', help="Print chapter N (1-based) instead of the chapter list")
+    parser.add_argument('--import', dest='import_path', metavar='FILE',
+                        help="Append the chapters of a JSON-lines crawl output to the book, creating it if needed")
+    parser.add_argument('--codec', choices=sorted(CODECS), help="Compression for a new book (default: zstd if installed, else zlib)")
+
+
+def run(args, scraper):
+    """Runs the 'library' subcommand; returns a process exit code."""
+    try:
+        if args.import_path:
+            with BookStore(args.book, writable=True, codec=args.codec) as store, \
+                    open(args.import_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        record.pop('index', None)
+                        store.append(record)
+                stats = store.stats()
+            print(f"{args.book}: {stats['chapters']} chapter(s), {stats['data_bytes'] + stats['index_bytes']:,} bytes ({stats['codec']})")
+            return 0
+        with BookStore(args.book) as store:
+            if args.chapter is not None:
+                chapter = store.chapter(args.chapter - 1)
+                print(chapter.get('title') or '')
+                print(chapter['content_html'])
+            else:
+                for ordinal, title in enumerate(store.titles(), 1):
+                    print(f"{ordinal:>6}  {title}")
+    except (LibraryError, IndexError, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
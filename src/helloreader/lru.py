@@ -0,0 +1,79 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+def chapter_size(data):
+    """Approximates the memory held by a scraped chapter dict (its string values)."""
+    if not isinstance(data, dict):
+        return sys.getsizeof(data)
+    return sum(sys.getsizeof(value) for value in data.values() if isinstance(value, str))
+
+
+class ByteLRU:
+    """Thread-safe LRU mapping bounded by the total size of its values rather than their count."""
+
+    def __init__(self, max_bytes, sizeof=chapter_size):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict() # key -> (value, size), least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the value for key and marks it as most recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        """Stores value under key, evicting least recently used entries to stay under max_bytes."""
+        size = self._sizeof(value) if size is None else size
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            if size > self.max_bytes:
+                # A single oversized value would flush everything else for nothing
+                return False
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+            return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+            self._total_bytes -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def resize(self, max_bytes):
+        """Changes the byte budget, evicting immediately if it shrank."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._entries and self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,216 @@
+import email.utils
+import logging
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+
+from .instrumentation import tracer
+
+# Defaults used when the config file has no 'politeness' section
+DEFAULT_POLITENESS_SETTINGS = {
+    'max_rate': 8.0, # Requests per second per host, however well it copes; 0 for no cap
+    'initial_rate': 2.0, # Where a host starts before anything is known about it
+    'min_rate': 0.2, # Backing off never goes below this
+    'burst': 2, # Requests a host's bucket lets start back to back
+    'initial_concurrency': 1, # Requests in flight a host starts with
+    'max_concurrency': 4, # Requests in flight per host at most
+    'latency_tolerance': 2.0, # Time to headers above this multiple of the host's best counts as overload; 0 never does
+    'max_retry_after': 300, # Seconds; a host asking to wait longer fails the request instead
+}
+
+# Responses in which a host says it is overloaded or that we are too fast
+THROTTLE_STATUSES = {429, 503}
+LATENCY_SLACK = 0.05 # Seconds above the best time to headers that never count as overload
+LATENCY_SMOOTHING = 0.2 # Weight of each new sample in the smoothed time to headers
+
+# What acquire() hands out and release() takes back: the host, when the request
+# started, and whether it had to wait for the limits (only then is raising them useful)
+Ticket = namedtuple('Ticket', 'host started limited')
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class _Host:
+    """Scheduling state of one host: its token bucket, concurrency window and latency."""
+
+    def __init__(self, rate, burst, window):
+        self.rate = rate # Tokens added per second
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.window = float(window) # Requests allowed in flight
+        self.in_flight = 0
+        self.slow_start = True # Grow quickly until the first sign of overload, as TCP does
+        self.paused_until = 0.0 # Set from Retry-After
+        self.backed_off_at = 0.0 # Requests started before this cannot cause another back-off
+        self.latency = None # Smoothed time to headers since the last back-off
+        self.best_latency = None
+        self.requests = 0
+        self.throttled = 0
+        self.backoffs = 0
+
+    def refill(self, now, burst):
+        self.tokens = min(float(burst), self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+
+class HostScheduler:
+    """Paces every request per host with a token bucket and an adaptive concurrency window.
+
+    Both limits follow AIMD: each response that had to wait for them raises them a
+    little (quickly until the host first pushes back, like TCP slow start), and a
+    429 or 503, a failed connection, or time to headers well above the host's best
+    halves them. A Retry-After pauses the whole host, not just the request that got
+    it. One overload only backs off once: responses to requests sent before the
+    back-off are not counted again. Used from the fetch worker threads; acquire()
+    blocks until the request may start.
+    """
+
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULT_POLITENESS_SETTINGS)
+        self._hosts = {}
+        self._condition = threading.Condition()
+        self.configure(**settings)
+
+    def configure(self, **settings):
+        """Applies settings (e.g. from the config file); unspecified values stay unchanged.
+        Hosts already known are brought within new caps at once."""
+        with self._condition:
+            self.settings.update({key: value for key, value in settings.items() if value is not None})
+            for host in self._hosts.values():
+                self._clamp(host)
+            self._condition.notify_all()
+
+    @property
+    def max_retry_after(self):
+        return self.settings['max_retry_after']
+
+    def acquire(self, url):
+        """Waits until a request to url's host may start; returns the Ticket for release()."""
+        name = urlparse(url).netloc
+        asked = time.monotonic()
+        limited = False
+        with self._condition:
+            host = self._hosts.get(name)
+            if host is None:
+                host = self._hosts[name] = _Host(self._cap_rate(self.settings['initial_rate']), self.settings['burst'],
+                                                 self.settings['initial_concurrency'])
+                self._clamp(host)
+            while True:
+                now = time.monotonic()
+                host.refill(now, self.settings['burst'])
+                wait = host.paused_until - now
+                if wait <= 0 and host.in_flight >= int(host.window):
+                    limited = True
+                    self._condition.wait() # Until a release
+                    continue
+                if wait <= 0 and host.tokens < 1:
+                    wait = (1 - host.tokens) / host.rate
+                if wait > 0:
+                    limited = True
+                    self._condition.wait(wait)
+                    continue
+                host.tokens -= 1
+                host.in_flight += 1
+                host.requests += 1
+                break
+        if limited:
+            tracer.record('politeness_wait', now - asked, host=name)
+        return Ticket(name, now, limited)
+
+    def release(self, ticket, status=None, latency=None, retry_after=None):
+        """Records how a request went and frees its place in the window.
+
+        status is the HTTP status, or None if no response came (a network error);
+        latency is the time to headers in seconds; retry_after comes from the response.
+        """
+        now = time.monotonic()
+        with self._condition:
+            host = self._hosts[ticket.host]
+            host.in_flight -= 1
+            if status is None or status in THROTTLE_STATUSES:
+                if status is not None:
+                    host.throttled += 1
+                if retry_after:
+                    host.paused_until = max(host.paused_until, now + min(retry_after, self.max_retry_after))
+                self._back_off(host, ticket, now, f"HTTP {status}" if status else "network error")
+            elif status < 500:
+                if latency is not None and self._overloaded(host, latency):
+                    self._back_off(host, ticket, now, f"{latency * 1000:.0f} ms to headers")
+                elif ticket.limited:
+                    self._grow(host)
+            self._condition.notify_all()
+
+    def _overloaded(self, host, latency):
+        """Folds in a latency sample; True if the host has become markedly slower than its best."""
+        if not self.settings['latency_tolerance']:
+            return False
+        host.best_latency = latency if host.best_latency is None else min(latency, host.best_latency)
+        if host.latency is None:
+            host.latency = latency
+        else:
+            host.latency += LATENCY_SMOOTHING * (latency - host.latency)
+        threshold = max(host.best_latency * self.settings['latency_tolerance'], host.best_latency + LATENCY_SLACK)
+        return host.latency > threshold
+
+    def _grow(self, host):
+        if host.slow_start:
+            host.window += 1
+            host.rate += 0.5
+        else:
+            # About one more request in flight per window's worth of responses, and
+            # about half a request per second more per second
+            host.window += 1 / host.window
+            host.rate += 0.5 / host.rate
+        self._clamp(host)
+
+    def _back_off(self, host, ticket, now, reason):
+        if ticket.started < host.backed_off_at:
+            return # Already backed off for this overload
+        host.window = max(1.0, host.window / 2)
+        host.rate = max(self.settings['min_rate'], host.rate / 2)
+        self._clamp(host)
+        host.slow_start = False
+        host.backed_off_at = now
+        host.latency = None # Judge the new limits by their own responses
+        host.backoffs += 1
+        tracer.count('politeness_backoffs')
+        logging.info("Backing off %s after %s: %.1f request(s)/s, %d at once",
+                     ticket.host, reason, host.rate, int(host.window))
+
+    def _cap_rate(self, rate):
+        max_rate = self.settings['max_rate']
+        return min(rate, max_rate) if max_rate else rate
+
+    def _clamp(self, host):
+        host.rate = max(self.settings['min_rate'], self._cap_rate(host.rate))
+        host.window = max(1.0, min(float(self.settings['max_concurrency']), host.window))
+
+    def snapshot(self):
+        """Returns {host: {'rate', 'concurrency', 'in_flight', 'requests', 'throttled', 'backoffs', 'paused_for'}}."""
+        now = time.monotonic()
+        with self._condition:
+            return {
+                name: {
+                    'rate': host.rate,
+                    'concurrency': int(host.window),
+                    'in_flight': host.in_flight,
+                    'requests': host.requests,
+                    'throttled': host.throttled,
+                    'backoffs': host.backoffs,
+                    'paused_for': max(0.0, host.paused_until - now),
+                }
+                for name, host in self._hosts.items()
+            }
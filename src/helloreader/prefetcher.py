@@ -0,0 +1,123 @@
+import asyncio
+import logging
+
+from .lru import ByteLRU
+from .web_scraper import ScraperException
+
+# Defaults used when the config file has no 'prefetch' section
+DEFAULT_PREFETCH_SETTINGS = {
+    'depth': 3, # Chapters to walk ahead along next_page_url
+    'behind': 1, # Chapters to walk back along previous_page_url
+    'concurrency': 2, # Simultaneous fetches across all walks
+    'max_bytes': 8 * 1024 * 1024, # Memory cap for buffered chapters
+}
+
+
+class ChapterPrefetcher:
+    """Walks the next/previous chain of the chapter on screen and buffers the results in memory."""
+
+    def __init__(self, scraper, depth=3, behind=1, concurrency=2, max_bytes=8 * 1024 * 1024):
+        self.scraper = scraper
+        self.depth = depth
+        self.behind = behind
+        self.concurrency = concurrency
+        self.buffer = ByteLRU(max_bytes)
+        self._semaphore = None # Created lazily so it binds to the running loop
+        self._tasks = set() # Walks currently running
+        self._inflight = {} # url -> future, so overlapping walks share a fetch
+        self._known_urls = set() # URLs on the chain being walked; anything else is a jump
+
+    def configure(self, depth=None, behind=None, concurrency=None, max_bytes=None):
+        """Applies settings (e.g. from the config file); unspecified values stay unchanged."""
+        if depth is not None:
+            self.depth = max(0, int(depth))
+        if behind is not None:
+            self.behind = max(0, int(behind))
+        if concurrency is not None:
+            self.concurrency = max(1, int(concurrency))
+            self._semaphore = None
+        if max_bytes is not None:
+            self.buffer.resize(int(max_bytes))
+
+    def get(self, url):
+        """Returns the buffered chapter dict for url, or None if it has not been prefetched."""
+        data = self.buffer.get(url)
+        if data is not None:
+            logging.debug("Prefetch buffer hit: %s", url)
+        return data
+
+    def start(self, url, data):
+        """Starts walking ahead and behind from the chapter just shown.
+
+        If url is not on the chain already being walked the user jumped elsewhere, so
+        outstanding walks are cancelled and the buffer is dropped before starting over.
+        """
+        if url not in self._known_urls:
+            self.cancel()
+        self._known_urls.add(url)
+        self.buffer.put(url, data)
+
+        if self.depth:
+            self._spawn(self._walk(data.get('next_page_url'), 'next_page_url', self.depth))
+        if self.behind:
+            self._spawn(self._walk(data.get('previous_page_url'), 'previous_page_url', self.behind))
+
+    def cancel(self):
+        """Stops all walks and forgets everything buffered for the previous chain."""
+        if self._tasks:
+            logging.info("Cancelling %s prefetch walk(s) and %s fetch(es)", len(self._tasks), len(self._inflight))
+        for task in list(self._tasks):
+            task.cancel()
+        # The fetches are shielded from their walks, so they are cancelled too; otherwise
+        # they would hold the concurrency slots the new chain's fetches are waiting for
+        for future in list(self._inflight.values()):
+            future.cancel()
+        self._tasks.clear()
+        self._inflight.clear()
+        self._known_urls.clear()
+        self.buffer.clear()
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _walk(self, url, link_key, steps):
+        """Follows link_key from url for up to steps chapters, filling the buffer."""
+        for _ in range(steps):
+            if not url:
+                return
+            self._known_urls.add(url)
+            data = self.buffer.get(url)
+            if data is None:
+                try:
+                    data = await self._fetch(url)
+                except ScraperException as e:
+                    logging.warning("Prefetch of %s failed, stopping walk: %s", url, e)
+                    return
+            url = data.get(link_key)
+
+    async def _fetch(self, url):
+        """Fetches url once even if several walks ask for it at the same time."""
+        future = self._inflight.get(url)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_limited(url))
+            self._inflight[url] = future
+            future.add_done_callback(lambda done: self._forget(url, done))
+        # Shield so that cancelling one walk does not kill a fetch another walk awaits
+        return await asyncio.shield(future)
+
+    def _forget(self, url, future):
+        # A fetch from before a cancel() may finish after a new one for the same URL started
+        if self._inflight.get(url) is future:
+            del self._inflight[url]
+
+    async def _fetch_limited(self, url):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            data = await self.scraper.fetch_chapter_async(url)
+        if url in self._known_urls:
+            self.buffer.put(url, data)
+            logging.info("Prefetched %s (%s buffered, %s bytes)", url, len(self.buffer), self.buffer.total_bytes)
+        return data
@@ -0,0 +1,298 @@
+import hashlib
+import logging
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+try:
+    import pyttsx3
+except ImportError: # Optional: without it the app simply has no read-aloud
+    pyttsx3 = None
+
+from .instrumentation import tracer
+from .search_index import plain_text
+from .web_scraper import ScraperException
+
+# Defaults used when the config file has no 'read_aloud' section
+DEFAULT_READ_ALOUD_SETTINGS = {
+    'rate': None, # Words per minute; None keeps the voice's own rate
+    'voice': None, # pyttsx3 voice id; None keeps the system default
+    'lookahead': 6, # Chunks synthesised ahead of the one playing
+    'cache_max_bytes': 256 * 1024 * 1024, # Disk cap for synthesised audio
+}
+
+# Sentences end at Chinese or Western end punctuation, including any closing
+# quotes or brackets that follow it
+SENTENCE = re.compile(r'[^。！？!?…]+(?:[。！？!?…]+[”’」』"\')）]*)?')
+CLAUSE = re.compile(r'[^，,；;：:]+[，,；;：:]?')
+CHUNK_CHARACTERS = 120 # Sentences are grouped into chunks of about this length
+_END = object() # Queued after the last chunk of the last chapter
+
+
+class ReadAloudError(Exception):
+    """Raised when read-aloud cannot run here: no speech engine or no audio player."""
+
+
+def chunks(data):
+    """Splits a chapter into speakable chunks: the title, then whole sentences grouped up to
+    CHUNK_CHARACTERS within each paragraph (an overlong sentence is split at its commas)."""
+    if data.get('content_html') is not None:
+        text = plain_text(data['content_html'])
+    else:
+        text = data.get('content_text', '').replace('\xa0', ' ')
+    out = [data['title']] if data.get('title') else []
+    for paragraph in text.split('\n'):
+        current = ''
+        for sentence in SENTENCE.findall(paragraph.strip()):
+            pieces = CLAUSE.findall(sentence) if len(sentence) > CHUNK_CHARACTERS else [sentence]
+            for piece in pieces:
+                if current and len(current) + len(piece) > CHUNK_CHARACTERS:
+                    out.append(current)
+                    current = ''
+                current += piece
+        if current.strip():
+            out.append(current)
+    return out
+
+
+class Pyttsx3Synthesizer:
+    """Offline speech through pyttsx3 (the platform's own engine), rendered to audio files.
+
+    The engine is created on first use. A stopped run's synthesis thread may still be
+    finishing a chunk when the next run starts, so calls are serialised.
+    """
+
+    suffix = '.aiff' if sys.platform == 'darwin' else '.wav'
+
+    def __init__(self, rate=None, voice=None):
+        if pyttsx3 is None:
+            raise ReadAloudError("Read aloud needs the 'pyttsx3' package (pip install pyttsx3)")
+        self.rate = rate
+        self.voice = voice
+        self.key = f"pyttsx3:{voice}:{rate}" # Audio made with other settings is not reused
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def synthesize(self, text, path):
+        with self._lock:
+            self._synthesize(text, path)
+
+    def _synthesize(self, text, path):
+        if self._engine is None:
+            self._engine = pyttsx3.init()
+            if self.rate:
+                self._engine.setProperty('rate', self.rate)
+            if self.voice:
+                self._engine.setProperty('voice', self.voice)
+        self._engine.save_to_file(text, str(path))
+        self._engine.runAndWait()
+
+
+class AudioPlayer:
+    """Plays one audio file at a time with the platform's command-line player, blocking until it ends."""
+
+    COMMANDS = {
+        'darwin': [['afplay']],
+        'linux': [['paplay'], ['aplay', '-q'], ['ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet']],
+    }
+
+    def __init__(self):
+        self._process = None
+        self._lock = threading.Lock()
+        self._winsound = None
+        if sys.platform == 'win32':
+            import winsound
+            self._winsound = winsound
+            self._command = None
+            return
+        candidates = self.COMMANDS.get(sys.platform, self.COMMANDS['linux'])
+        self._command = next((command for command in candidates if shutil.which(command[0])), None)
+        if self._command is None:
+            raise ReadAloudError(f"No audio player found (tried {', '.join(c[0] for c in candidates)})")
+
+    def play(self, path):
+        if self._winsound is not None:
+            # Synchronous; stop() takes effect at the end of the chunk
+            self._winsound.PlaySound(str(path), self._winsound.SND_FILENAME)
+            return
+        with self._lock:
+            self._process = subprocess.Popen(self._command + [str(path)],
+                                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._process.wait()
+
+    def stop(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.terminate()
+
+
+class AudioCache:
+    """Synthesised chunks on disk, one directory per chapter, bounded by total size.
+
+    File names include a hash of the text and the voice settings, so an edited
+    chapter or a different voice is synthesised again rather than replayed.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, url, index, text, key, suffix):
+        chapter = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+        digest = hashlib.sha1(f"{key}\n{text}".encode('utf-8')).hexdigest()[:12]
+        return self.directory / chapter / f"{index:04d}-{digest}{suffix}"
+
+    def trim(self):
+        """Deletes the least recently written chapters until the cache fits in max_bytes."""
+        if not self.directory.exists():
+            return
+        chapters = []
+        for chapter in self.directory.iterdir():
+            files = [entry.stat() for entry in chapter.iterdir()] if chapter.is_dir() else []
+            chapters.append((max((stat.st_mtime for stat in files), default=0), sum(stat.st_size for stat in files), chapter))
+        total = sum(size for _, size, _ in chapters)
+        for _, size, chapter in sorted(chapters):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(chapter, ignore_errors=True)
+            total -= size
+
+
+class ReadAloud:
+    """Reads chapters aloud, one after another, without gaps.
+
+    A synthesis thread turns chunks of text into audio files (or finds them in the
+    cache) and queues them up to `lookahead` chunks ahead; a playback thread plays
+    them in order. When a chapter runs out the synthesis thread moves on along
+    next_page_url with next_chapter(url), which may block (it runs on that thread),
+    so the next chapter's first chunks are ready before the current one ends.
+    on_chapter(url, data) and on_finished() are called on the playback thread.
+    """
+
+    def __init__(self, next_chapter, cache, synthesizer=None, player=None, lookahead=6,
+                 on_chapter=None, on_finished=None):
+        self.next_chapter = next_chapter
+        self.cache = cache
+        self.synthesizer = synthesizer
+        self.player = player
+        self.lookahead = max(1, lookahead)
+        self.on_chapter = on_chapter
+        self.on_finished = on_finished
+        self.position = None # (url, data, chunk index) of the chunk playing or last played
+        self._stop = None # Event of the current run; set to end it
+
+    @property
+    def playing(self):
+        return self._stop is not None and not self._stop.is_set()
+
+    def start(self, url, data, chunk=0):
+        """Starts reading at chunk `chunk` of the chapter, stopping anything already playing."""
+        self.stop()
+        # Created here rather than in __init__ so a missing engine or player is reported when asked for
+        if self.synthesizer is None:
+            self.synthesizer = Pyttsx3Synthesizer()
+        if self.player is None:
+            self.player = AudioPlayer()
+        stop = self._stop = threading.Event()
+        chunk_queue = queue.Queue(maxsize=self.lookahead)
+        self.position = (url, data, chunk)
+        threading.Thread(target=self._synthesize, args=(url, data, chunk, chunk_queue, stop),
+                         name='read-aloud-synthesis', daemon=True).start()
+        threading.Thread(target=self._play, args=(url, chunk_queue, stop),
+                         name='read-aloud-playback', daemon=True).start()
+        logging.info("Reading %s aloud from chunk %s", url, chunk)
+
+    def pause(self):
+        """Stops at once; resume() replays the interrupted chunk from its start."""
+        self.stop()
+
+    def resume(self):
+        if self.position is not None:
+            self.start(*self.position)
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+        if self.player is not None:
+            self.player.stop()
+
+    # --- Threads ---
+
+    def _synthesize(self, url, data, index, chunk_queue, stop):
+        while not stop.is_set():
+            texts = chunks(data)
+            for chunk_index in range(index, len(texts)):
+                path = self.cache.path(url, chunk_index, texts[chunk_index], self.synthesizer.key, self.synthesizer.suffix)
+                if not path.exists():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    # Rendered under another name first so an interrupted chunk is never replayed
+                    partial = path.with_name(f"partial-{path.name}")
+                    try:
+                        with tracer.span('synthesize', url=url, characters=len(texts[chunk_index])):
+                            self.synthesizer.synthesize(texts[chunk_index], partial)
+                        os.replace(partial, path)
+                    except Exception as e:
+                        logging.warning("Could not synthesise chunk %s of %s: %s", chunk_index, url, e)
+                        self._put(chunk_queue, _END, stop)
+                        return
+                if not self._put(chunk_queue, (url, data, chunk_index, path), stop):
+                    return
+            self.cache.trim()
+            next_url = data.get('next_page_url')
+            if not next_url:
+                break
+            try:
+                data = self.next_chapter(next_url)
+            except ScraperException as e:
+                logging.warning("Read aloud stopped: could not get %s: %s", next_url, e)
+                break
+            url, index = next_url, 0
+        self._put(chunk_queue, _END, stop)
+
+    def _put(self, chunk_queue, item, stop):
+        """Queues item, waiting for room; False if the run was stopped meanwhile."""
+        while not stop.is_set():
+            try:
+                chunk_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _play(self, url, chunk_queue, stop):
+        current_url = url
+        played = False # The wait for the first chunk is start-up, not a gap
+        while not stop.is_set():
+            try:
+                item = chunk_queue.get_nowait()
+            except queue.Empty:
+                if played:
+                    # Synthesis fell behind (or is still fetching the next chapter): an audible gap
+                    tracer.count('read_aloud_underruns')
+                    logging.info("Read aloud is waiting for synthesis after chunk %s of %s", self.position[2], current_url)
+                    played = False
+                try:
+                    item = chunk_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            if item is _END:
+                stop.set()
+                if self.on_finished is not None:
+                    self.on_finished()
+                return
+            if stop.is_set():
+                return # Stopped while waiting; another run may own the player now
+            chunk_url, data, chunk_index, path = item
+            if chunk_url != current_url:
+                current_url = chunk_url
+                if self.on_chapter is not None:
+                    self.on_chapter(chunk_url, data)
+            self.position = (chunk_url, data, chunk_index)
+            self.player.play(path)
+            played = True
@@ -0,0 +1,349 @@
+import asyncio
+import hashlib
+import html
+import json
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, quote, urlsplit
+
+from .export import paragraphs
+from .history import ChapterHistory, DEFAULT_HISTORY_SETTINGS
+from .prefetcher import ChapterPrefetcher, DEFAULT_PREFETCH_SETTINGS
+from .renderer import THEMES, ChapterRenderer
+from .web_scraper import EXTRACTION_FAILED_TEXT, ScraperException
+
+MAX_READERS = 32 # Clients whose reading position is prefetched around; the least recently active are dropped
+MAX_HEADER_BYTES = 16 * 1024
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+body {{ background: {background_color}; color: {text_color}; font-family: 'Songti SC', 'PingFang SC', serif;
+       font-size: 1.4em; line-height: 1.7; max-width: 40em; margin: 1em auto; padding: 0 1em; }}
+a {{ color: inherit; }}
+nav {{ display: flex; justify-content: space-between; margin: 1.5em 0; }}
+p {{ text-indent: 2em; margin: 0 0 0.6em 0; }}
+li {{ margin: 0.3em 0; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+"""
+
+
+class RequestError(Exception):
+    """An HTTP error to send back to the client: status plus a message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def book_id(toc_url):
+    """A short, stable id for a book, derived from its index URL."""
+    return hashlib.sha1(toc_url.encode('utf-8')).hexdigest()[:12]
+
+
+class ReaderServer:
+    """Serves cleaned chapters and tables of contents over HTTP, as JSON or HTML.
+
+    Backed by the same WebScraper, chapter cache and prefetcher as the app. All
+    chapter and index fetches go through one table of in-flight requests, so any
+    number of clients asking for the same page at once cost one upstream fetch,
+    and fetched chapters stay in memory (a ChapterHistory) for the next client. Each
+    client reading a book gets a prefetcher walking ahead of it; their fetches go
+    through the same table, so readers of the same book share them too.
+    """
+
+    def __init__(self, scraper, allow_any_site=False, prefetch_settings=None, history_settings=None):
+        self.scraper = scraper
+        self.allow_any_site = allow_any_site # Otherwise only hosts with a site profile are fetched
+        self.history = ChapterHistory(**(history_settings or DEFAULT_HISTORY_SETTINGS))
+        self.prefetch_settings = dict(DEFAULT_PREFETCH_SETTINGS, **(prefetch_settings or {}))
+        self.renderer = ChapterRenderer()
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='serve')
+        self._inflight = {} # key -> future shared by everyone waiting for that fetch
+        self._readers = OrderedDict() # (client, book) -> ChapterPrefetcher, least recently active first
+        self._books = {} # book id -> index URL
+        self._tocs = {} # index URL -> chapter list
+        self.counts = {'requests': 0, 'upstream_fetches': 0, 'coalesced': 0}
+        if scraper.cache is not None:
+            for toc_url in scraper.cache.book_urls():
+                self._books[book_id(toc_url)] = toc_url
+
+    # --- Chapters and indexes, fetched once however many clients ask ---
+
+    async def _coalesce(self, key, fetch):
+        """Awaits the fetch already running for key, or starts fetch() as the one everyone shares."""
+        future = self._inflight.get(key)
+        if future is None:
+            self.counts['upstream_fetches'] += 1
+            future = asyncio.ensure_future(fetch())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.counts['coalesced'] += 1
+        # Shielded so that a client hanging up does not cancel a fetch others are waiting for
+        return await asyncio.shield(future)
+
+    async def fetch_chapter_async(self, url, executor=None, revalidate=False, extraction_pool=None):
+        """The fetch every prefetcher and request goes through: memory, then a shared upstream fetch.
+        Named and shaped like WebScraper's so a ChapterPrefetcher can use the server as its scraper."""
+        data = self.history.get(url)
+        if data is not None:
+            return data
+        data = await self._coalesce(('chapter', url), lambda: self.scraper.fetch_chapter_async(url, self.executor))
+        if data.get('content_html') != EXTRACTION_FAILED_TEXT:
+            self.history.put(url, data)
+        return data
+
+    async def chapter(self, url, client=None):
+        """Returns the chapter at url and starts prefetching the client's next chapters."""
+        if not url.startswith(('http://', 'https://')):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "url must be an http(s) URL")
+        if not self.allow_any_site and not self.scraper.profiles.knows(url):
+            raise RequestError(HTTPStatus.FORBIDDEN, f"No site profile for {urlsplit(url).hostname}")
+        data = await self.fetch_chapter_async(url)
+        if client is not None:
+            self._reader(client, data.get('book_url') or url).start(url, data)
+        return data
+
+    def _reader(self, client, book):
+        key = (client, book)
+        prefetcher = self._readers.get(key)
+        if prefetcher is None:
+            prefetcher = self._readers[key] = ChapterPrefetcher(self, **self.prefetch_settings)
+            if len(self._readers) > MAX_READERS:
+                _, oldest = self._readers.popitem(last=False)
+                oldest.cancel()
+        self._readers.move_to_end(key)
+        return prefetcher
+
+    async def toc(self, url=None, book=None, refresh=False):
+        """Returns (book id, index URL, chapters) for a book given by any of its URLs or its id."""
+        if book is not None:
+            toc_url = self._books.get(book)
+            if toc_url is None:
+                raise RequestError(HTTPStatus.NOT_FOUND, f"Unknown book {book}; open its /toc?url= first")
+        else:
+            if not self.allow_any_site and not self.scraper.profiles.knows(url):
+                raise RequestError(HTTPStatus.FORBIDDEN, f"No site profile for {urlsplit(url).hostname}")
+            toc_url = self.scraper.toc_url_for(url)
+        chapters = None if refresh else self._tocs.get(toc_url)
+        if chapters is None:
+            loop = asyncio.get_running_loop()
+            chapters = await self._coalesce(('toc', toc_url), lambda: loop.run_in_executor(
+                self.executor, lambda: self.scraper.fetch_toc(toc_url, refresh=refresh)))
+            self._tocs[toc_url] = chapters
+        self._books[book_id(toc_url)] = toc_url
+        return book_id(toc_url), toc_url, chapters
+
+    # --- Routes ---
+
+    async def respond(self, target, headers, client=None):
+        """Handles one GET; returns (status, content type, body bytes)."""
+        self.counts['requests'] += 1
+        parts = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        as_html = query.get('format') == 'html' or (
+            query.get('format') != 'json' and 'text/html' in headers.get('accept', ''))
+        theme = query.get('theme', 'light') # Light suits e-ink screens
+        path = parts.path.rstrip('/') or '/'
+        segments = path.strip('/').split('/')
+
+        if path == '/chapter':
+            if not query.get('url'):
+                raise RequestError(HTTPStatus.BAD_REQUEST, "Missing ?url=")
+            data = await self.chapter(query['url'], client)
+            links = {key: f"/chapter?url={quote(data[key], safe='')}" if data.get(key) else None
+                     for key in ('next_page_url', 'previous_page_url')}
+            return self._chapter_response(query['url'], data, links, as_html, theme)
+        if len(segments) == 3 and segments[0] == 'book':
+            return await self._book_chapter(segments[1], segments[2], client, as_html, theme)
+        if path == '/toc':
+            if query.get('url') or query.get('book'):
+                book, toc_url, chapters = await self.toc(query.get('url'), query.get('book'), query.get('refresh') == '1')
+                return self._toc_response(book, toc_url, chapters, as_html, theme)
+            return self._books_response(as_html, theme)
+        if path == '/stats':
+            return self._json(dict(self.counts, history=self.history.summary(), scraper=self.scraper.stats()))
+        raise RequestError(HTTPStatus.NOT_FOUND, f"No route for {parts.path}")
+
+    async def _book_chapter(self, book, number, client, as_html, theme):
+        if not number.isdigit():
+            raise RequestError(HTTPStatus.NOT_FOUND, f"Chapter number expected, got {number}")
+        book, toc_url, chapters = await self.toc(book=book)
+        n = int(number)
+        if not 1 <= n <= len(chapters):
+            raise RequestError(HTTPStatus.NOT_FOUND, f"Book {book} has chapters 1 to {len(chapters)}")
+        url = chapters[n - 1]['url']
+        data = await self.chapter(url, client)
+        links = {'next_page_url': f"/book/{book}/{n + 1}" if n < len(chapters) else None,
+                 'previous_page_url': f"/book/{book}/{n - 1}" if n > 1 else None,
+                 'toc': f"/toc?book={book}"}
+        return self._chapter_response(url, data, links, as_html, theme, book=book, number=n)
+
+    # --- Responses ---
+
+    def _chapter_response(self, url, data, links, as_html, theme, **extra):
+        if not as_html:
+            record = {key: data.get(key) for key in ('title', 'book_title', 'book_url', 'next_page_url', 'previous_page_url')}
+            return self._json(dict(record, url=url, paragraphs=paragraphs(data), links=links, **extra))
+        nav = '<nav>{}</nav>'.format(' '.join(
+            f'<a href="{html.escape(links[key])}">{label}</a>' if links.get(key) else '<span></span>'
+            for key, label in (('previous_page_url', '上一章'), ('toc', '目录'), ('next_page_url', '下一章'))))
+        body = nav + '\n' + '\n'.join(f'<p>{html.escape(paragraph)}</p>' for paragraph in paragraphs(data)) + '\n' + nav
+        return self._page(data.get('title') or url, body, theme)
+
+    def _toc_response(self, book, toc_url, chapters, as_html, theme):
+        if not as_html:
+            return self._json({'book': book, 'toc_url': toc_url, 'chapters': [
+                {'n': n, 'title': chapter['title'], 'url': chapter['url'], 'link': f"/book/{book}/{n}"}
+                for n, chapter in enumerate(chapters, 1)]})
+        items = '\n'.join(f'<li><a href="/book/{book}/{n}">{html.escape(chapter["title"])}</a></li>'
+                          for n, chapter in enumerate(chapters, 1))
+        return self._page(toc_url, f'<ol>\n{items}\n</ol>', theme)
+
+    def _books_response(self, as_html, theme):
+        books = sorted(self._books.items(), key=lambda item: item[1])
+        if not as_html:
+            return self._json({'books': [{'book': book, 'toc_url': toc_url, 'link': f"/toc?book={book}"}
+                                         for book, toc_url in books]})
+        items = '\n'.join(f'<li><a href="/toc?book={book}">{html.escape(toc_url)}</a></li>' for book, toc_url in books)
+        return self._page("Books", f'<ul>\n{items}\n</ul>', theme)
+
+    @staticmethod
+    def _json(value, status=HTTPStatus.OK):
+        return status, 'application/json; charset=utf-8', json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def _page(title, body, theme, status=HTTPStatus.OK):
+        colors = THEMES.get(theme, THEMES['light'])
+        page = PAGE_TEMPLATE.format(title=html.escape(title), body=body, **colors)
+        return status, 'text/html; charset=utf-8', page.encode('utf-8')
+
+    # --- HTTP/1.1 over asyncio streams ---
+
+    async def handle_connection(self, reader, writer):
+        """Serves requests on one keep-alive connection until the client closes it."""
+        client = writer.get_extra_info('peername')
+        client = client[0] if client else None
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'text/plain', b'Headers too large', close=True)
+                    return
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    await self._send(writer, HTTPStatus.BAD_REQUEST, 'text/plain', b'Bad request line', close=True)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', '').lower()
+                close = connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive')
+                if method not in ('GET', 'HEAD'):
+                    status, content_type, body = HTTPStatus.METHOD_NOT_ALLOWED, 'text/plain', b'Only GET and HEAD'
+                else:
+                    status, content_type, body = await self._dispatch(target, headers, client)
+                etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+                if status == HTTPStatus.OK and headers.get('if-none-match') == etag:
+                    status, body = HTTPStatus.NOT_MODIFIED, b''
+                await self._send(writer, status, content_type, body, close, etag=etag, head=method == 'HEAD')
+                if close:
+                    return
+        finally:
+            writer.close()
+
+    async def _dispatch(self, target, headers, client):
+        as_html = 'text/html' in headers.get('accept', '') and 'format=json' not in target
+        try:
+            return await self.respond(target, headers, client)
+        except RequestError as e:
+            status, message = e.status, str(e)
+        except ScraperException as e:
+            status, message = HTTPStatus.BAD_GATEWAY, str(e)
+        except Exception as e:
+            logging.exception("Error serving %s", target)
+            status, message = HTTPStatus.INTERNAL_SERVER_ERROR, str(e)
+        logging.info("%s %s: %s", status.value, target, message)
+        if as_html:
+            return self._page(status.phrase, f'<p>{html.escape(message)}</p>', 'light', status)
+        return self._json({'error': message, 'status': status.value}, status)
+
+    @staticmethod
+    async def _send(writer, status, content_type, body, close=False, etag=None, head=False):
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}",
+                 f"Content-Length: {len(body)}", "Cache-Control: no-cache"]
+        if etag and status in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED):
+            lines.append(f"ETag: {etag}")
+        if close:
+            lines.append("Connection: close")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (b'' if head else body))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def serve(self, host='127.0.0.1', port=8080, ready=None):
+        """Serves until cancelled; ready(base_url) is called once the socket is listening."""
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        address = server.sockets[0].getsockname()
+        if ready is not None:
+            ready(f"http://{address[0]}:{address[1]}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for prefetcher in self._readers.values():
+                prefetcher.cancel()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def add_arguments(parser):
+    """Registers the 'serve' subcommand's options on an argparse parser."""
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on; 0.0.0.0 for the whole LAN (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on; 0 picks a free one (default: 8080)")
+    parser.add_argument('--cache', help="Chapter cache file to serve from and fill")
+    parser.add_argument('--index', help="Search index file to add every fetched chapter to")
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help="Most upstream requests at once per site (default: 4)")
+    parser.add_argument('--depth', type=int, default=DEFAULT_PREFETCH_SETTINGS['depth'],
+                        help=f"Chapters prefetched ahead of each reader (default: {DEFAULT_PREFETCH_SETTINGS['depth']})")
+    parser.add_argument('--any-site', action='store_true',
+                        help="Fetch chapters from any host, not only those with a site profile")
+
+
+def run(args, scraper):
+    """Runs the 'serve' subcommand until interrupted; returns a process exit code."""
+    server = ReaderServer(scraper, allow_any_site=args.any_site, prefetch_settings={'depth': args.depth})
+
+    def ready(base_url):
+        print(f"Serving on {base_url}", flush=True)
+        print(f"  {base_url}/toc?url=<book or chapter URL>   {base_url}/chapter?url=<chapter URL>   "
+              f"{base_url}/book/<id>/<n>", flush=True)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
@@ -0,0 +1,265 @@
+import html # For escaping content
+import json
+import logging
+import sys
+
+from .instrumentation import tracer
+from .lru import ByteLRU
+
+# Colours per theme, applied through CSS variables so a theme switch never re-renders content
+THEMES = {
+    'dark': {'background_color': '#121212', 'text_color': '#FFFFFF'},
+    'light': {'background_color': '#FFFFFF', 'text_color': '#000000'},
+}
+
+# The shell page: loaded into the WebView once, after which only #content and the
+# CSS variables change. Double braces are literal CSS braces; single ones are placeholders.
+SHELL_TEMPLATE = """
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        :root {{
+            --background-color: {background_color};
+            --text-color: {text_color};
+        }}
+        body {{
+            font-family: 'Songti SC', 'PingFang SC', sans-serif;
+            background-color: var(--background-color);
+            color: var(--text-color);
+            font-size: 2.0em;
+            line-height: 1.6;
+            margin: 20px;
+        }}
+        #content {{
+            white-space: pre-wrap;
+        }}
+        section.chapter {{
+            margin-bottom: 3em;
+        }}
+        .chapter-title {{
+            font-size: 1em;
+            opacity: 0.6;
+            white-space: normal;
+        }}
+    </style>
+    <script>{script}</script>
+</head>
+<body>
+    <!-- H1 removed as title is in window bar -->
+    <div id="content">{content}</div>
+</body>
+</html>
+"""
+
+# Continuous-scroll support, polled from Python through hrState(). Chapters are
+# <section class="chapter"> elements carrying their URL and links as data attributes.
+# Sections far above the one in view become empty placeholders of the same height,
+# so the page never jumps and the DOM holds only a few chapters' text at a time.
+CONTINUOUS_SCRIPT = """
+var hr = {keepAbove: %(keep_above)d, maxSections: %(max_sections)d, nearBottom: 1.5};
+function hrSections() { return document.querySelectorAll('#content > section.chapter'); }
+function hrFind(url) {
+    var sections = hrSections();
+    for (var i = 0; i < sections.length; i++) { if (sections[i].dataset.url === url) return sections[i]; }
+    return null;
+}
+function hrVisibleIndex(sections) {
+    var line = window.scrollY + window.innerHeight / 3, index = 0;
+    for (var i = 0; i < sections.length && sections[i].offsetTop <= line; i++) index = i;
+    return index;
+}
+function hrCollapse(section) {
+    if (section.dataset.collapsed) return;
+    section.style.height = section.offsetHeight + 'px';
+    section.querySelector('.chapter-body').innerHTML = '';
+    section.dataset.collapsed = '1';
+}
+function hrScrollWithin(url, offset) {
+    var section = hrFind(url);
+    if (section) window.scrollTo(0, section.offsetTop + offset);
+}
+function hrState() {
+    var sections = hrSections();
+    if (!sections.length) return JSON.stringify(null);
+    // Drop the oldest placeholders entirely, keeping the view where it was
+    while (sections.length > hr.maxSections) {
+        var height = sections[0].offsetHeight;
+        sections[0].remove();
+        window.scrollBy(0, -height);
+        sections = hrSections();
+    }
+    var index = hrVisibleIndex(sections), restore = [];
+    for (var i = 0; i < sections.length; i++) {
+        if (i < index - hr.keepAbove) hrCollapse(sections[i]);
+        else if (sections[i].dataset.collapsed && i <= index + 1) restore.push(sections[i].dataset.url);
+    }
+    var visible = sections[index], last = sections[sections.length - 1];
+    var remaining = document.documentElement.scrollHeight - window.scrollY - window.innerHeight;
+    return JSON.stringify({
+        url: visible.dataset.url, title: visible.dataset.title,
+        next: visible.dataset.next || null, prev: visible.dataset.prev || null,
+        book_url: visible.dataset.book || null, book_title: visible.dataset.bookTitle || null,
+        last_url: last.dataset.url, last_next: last.dataset.next || null,
+        near_bottom: remaining < window.innerHeight * hr.nearBottom,
+        restore: restore, sections: sections.length,
+        offset: Math.max(0, Math.round(window.scrollY - visible.offsetTop))
+    });
+}
+function hrAppend(html) {
+    document.getElementById('content').insertAdjacentHTML('beforeend', html);
+}
+function hrRestore(url, body) {
+    var section = hrFind(url);
+    if (!section || !section.dataset.collapsed) return;
+    var above = section.offsetTop < window.scrollY, before = section.offsetHeight;
+    section.querySelector('.chapter-body').innerHTML = body;
+    section.style.height = '';
+    delete section.dataset.collapsed;
+    if (above) window.scrollBy(0, section.offsetHeight - before);
+}
+function hrShow(url, html) {
+    var section = hrFind(url);
+    if (section && !section.dataset.collapsed) { section.scrollIntoView(); return; }
+    document.getElementById('content').innerHTML = html;
+    window.scrollTo(0, 0);
+}
+"""
+
+# Expanded chapters kept above the one in view, and the most sections (placeholders
+# included) kept in the page before the oldest are removed
+CONTINUOUS_KEEP_ABOVE = 2
+CONTINUOUS_MAX_SECTIONS = 100
+
+
+class ChapterRenderer:
+    """Turns scraped chapter dicts into WebView documents and in-place update scripts.
+
+    Full documents are only needed for the first load; after that chapters are swapped
+    into the existing page with swap_script and themes changed with theme_script.
+    Formatted output is memoised per (chapter, theme) in a byte-bounded LRU.
+    """
+
+    def __init__(self, max_bytes=4 * 1024 * 1024):
+        self._memo = ByteLRU(max_bytes, sizeof=sys.getsizeof)
+
+    @staticmethod
+    def _memo_key(kind, data, theme=None):
+        """Memo key for a chapter, or None if it cannot be memoised (no URL).
+
+        The content's hash is part of the key so a refetched, edited chapter is not
+        served from a stale entry; str caches its hash, so this costs nothing per call.
+        """
+        url = data.get('_base_url')
+        if not url:
+            return None
+        return (kind, url, theme, hash(data.get('content_html')), hash(data.get('content_text')))
+
+    def content_html(self, data):
+        """Returns the markup that goes inside #content for a chapter."""
+        key = self._memo_key('content', data)
+        cached = self._memo.get(key) if key else None
+        if cached is not None:
+            return cached
+
+        # Prioritize HTML content if available
+        final_content = data.get('content_html')
+        if final_content is None:
+            # Fallback to text content if HTML wasn't extracted
+            plain_text = data.get('content_text', '')
+            # Replace the sequence of non-breaking spaces with HTML breaks
+            processed_text = plain_text.replace('\xa0\xa0\xa0\xa0', '<br><br>')
+            # Maybe also replace single non-breaking spaces with regular spaces?
+            final_content = processed_text.replace('\xa0', ' ')
+            logging.debug("Using processed text content with added <br> tags.")
+        else:
+            logging.debug("Using pre-formatted HTML content.")
+
+        if key:
+            self._memo.put(key, final_content)
+        return final_content
+
+    def section_html(self, data):
+        """The chapter as a continuous-scroll <section>, its URL and links in data attributes."""
+        attributes = {
+            'data-url': data.get('_base_url'),
+            'data-title': data.get('title'),
+            'data-next': data.get('next_page_url'),
+            'data-prev': data.get('previous_page_url'),
+            'data-book': data.get('book_url'),
+            'data-book-title': data.get('book_title'),
+        }
+        rendered = ''.join(f' {name}="{html.escape(value)}"' for name, value in attributes.items() if value)
+        return (
+            f'<section class="chapter"{rendered}>'
+            f'<h2 class="chapter-title">{html.escape(data.get("title", ""))}</h2>'
+            f'<div class="chapter-body">{self.content_html(data)}</div>'
+            '</section>'
+        )
+
+    def document(self, data, theme='dark', continuous=False):
+        """Returns the complete shell page with the chapter already in place."""
+        key = self._memo_key('continuous' if continuous else 'document', data, theme)
+        cached = self._memo.get(key) if key else None
+        if cached is not None:
+            return cached
+        colors = THEMES.get(theme, THEMES['dark'])
+        with tracer.span('render', url=data.get('_base_url'), kind='document'):
+            document = SHELL_TEMPLATE.format(
+                title=html.escape(data.get('title', 'No Title')),
+                content=self.section_html(data) if continuous else self.content_html(data), # Insert raw HTML or formatted text
+                background_color=colors['background_color'],
+                text_color=colors['text_color'],
+                script=CONTINUOUS_SCRIPT % {'keep_above': CONTINUOUS_KEEP_ABOVE, 'max_sections': CONTINUOUS_MAX_SECTIONS}
+            )
+        if key:
+            self._memo.put(key, document)
+        return document
+
+    def swap_script(self, data):
+        """JavaScript that replaces the chapter in an already loaded shell and scrolls to the top."""
+        with tracer.span('render', url=data.get('_base_url'), kind='swap'):
+            return (
+                f"document.getElementById('content').innerHTML = {json.dumps(self.content_html(data))};"
+                "window.scrollTo(0, 0);"
+            )
+
+    # --- Continuous scroll ---
+
+    def show_continuous_script(self, data):
+        """Scrolls to the chapter if it is already in the page, otherwise starts the page over with it."""
+        return f"hrShow({json.dumps(data.get('_base_url'))}, {json.dumps(self.section_html(data))});"
+
+    def append_script(self, data):
+        """Adds the chapter below the ones already in the page."""
+        return f"hrAppend({json.dumps(self.section_html(data))});"
+
+    def restore_script(self, data):
+        """Refills a chapter's placeholder with its text."""
+        return f"hrRestore({json.dumps(data.get('_base_url'))}, {json.dumps(self.content_html(data))});"
+
+    @staticmethod
+    def state_script():
+        """Expression returning the continuous-scroll state as a JSON string (see hrState)."""
+        return "hrState()"
+
+    @staticmethod
+    def scroll_offset_script():
+        """Expression returning how far the single-chapter page is scrolled, in pixels."""
+        return "Math.round(window.scrollY)"
+
+    @staticmethod
+    def scroll_script(data, offset, continuous=False):
+        """Scrolls to `offset` pixels into the chapter (into its section in continuous layout)."""
+        if continuous:
+            return f"hrScrollWithin({json.dumps(data.get('_base_url'))}, {int(offset)});"
+        return f"window.scrollTo(0, {int(offset)});"
+
+    def theme_script(self, theme):
+        """JavaScript that switches the loaded shell's colours without touching its content."""
+        colors = THEMES.get(theme, THEMES['dark'])
+        return (
+            "var style = document.documentElement.style;"
+            f"style.setProperty('--background-color', {json.dumps(colors['background_color'])});"
+            f"style.setProperty('--text-color', {json.dumps(colors['text_color'])});"
+        )
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .web_scraper import Revalidation, ScraperException
+
+
+async def revalidate_chapters(scraper, urls, concurrency=4):
+    """Revalidates cached chapters concurrently (see WebScraper.revalidate_chapter), paced per
+    site by the scraper's scheduler. Returns one Revalidation per URL, in order; a chapter that
+    could not be checked has status 'failed'."""
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='revalidate')
+    limit = asyncio.Semaphore(max(1, concurrency))
+    loop = asyncio.get_running_loop()
+
+    async def revalidate(url):
+        async with limit:
+            try:
+                return await loop.run_in_executor(executor, scraper.revalidate_chapter, url)
+            except ScraperException as e:
+                logging.warning("Could not revalidate %s: %s", url, e)
+                return Revalidation(url, 'failed', 0)
+
+    try:
+        return await asyncio.gather(*(revalidate(url) for url in urls))
+    finally:
+        executor.shutdown(wait=False)
+
+
+def add_arguments(parser):
+    """Registers the 'revalidate' subcommand's options on an argparse parser."""
+    parser.add_argument('book_url', help="Book page, index page or any chapter of the book")
+    parser.add_argument('--cache', required=True, help="Chapter cache file holding the book's chapters")
+    parser.add_argument('--index', help="Search index file to update with changed chapters")
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help="Chapters checked at once (default: 4)")
+    parser.add_argument('--rate', type=float,
+                        help="Most requests per second per site, 0 for no cap (default: as fast as the site allows, up to 8)")
+    parser.add_argument('--refresh-toc', action='store_true',
+                        help="Fetch the book's index again first instead of using the stored listing")
+
+
+def run(args, scraper):
+    """Runs the 'revalidate' subcommand; returns a process exit code."""
+    if args.rate is not None:
+        scraper.scheduler.configure(max_rate=args.rate)
+    try:
+        chapters = scraper.fetch_toc(args.book_url, refresh=args.refresh_toc)
+    except ScraperException as e:
+        print(f"Error: {e}")
+        return 1
+    cached = [(chapter, info) for chapter, info in
+              ((chapter, scraper.cache.get_revalidation_info(chapter['url'])) for chapter in chapters)
+              if info is not None]
+    stored_bytes = sum(info['size'] for _, info in cached)
+
+    started = time.monotonic()
+    before = scraper.stats()
+    results = asyncio.run(revalidate_chapters(scraper, [chapter['url'] for chapter, _ in cached],
+                                              concurrency=args.concurrency))
+    after = scraper.stats()
+    titles = {chapter['url']: chapter['title'] for chapter, _ in cached}
+    for result in results:
+        if result.status in ('changed', 'failed'):
+            print(f"{result.status:>8}  {titles[result.url]}  {result.url}")
+    counts = {status: sum(1 for result in results if result.status == status) for status in ('unchanged', 'changed', 'failed')}
+    transferred = sum(result.transferred for result in results)
+    share = transferred / stored_bytes if stored_bytes else 0
+    print(f"Revalidated {len(results)} of {len(chapters)} chapter(s) in {time.monotonic() - started:.1f}s: "
+          f"{counts['changed']} changed, {counts['unchanged']} unchanged, {counts['failed']} failed "
+          f"({after['not_modified'] - before['not_modified']} not modified; "
+          f"{transferred / 1024:.0f} KiB received for {stored_bytes / 1024:.0f} KiB of stored pages, {share:.1%})")
+    return 1 if counts['failed'] else 0
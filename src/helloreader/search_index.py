@@ -0,0 +1,300 @@
+import hashlib
+import html
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from .chapter_cache import ChapterCache
+from .instrumentation import tracer
+from .library import BookStore, LibraryError
+
+# Chinese has no spaces between words, so the index is built on character
+# bigrams. '天下大势' is indexed as 天下 下大 大势, in order, followed by the
+# chapter's distinct single characters for one-character queries. A query becomes
+# a phrase of its own bigrams, which only matches where the characters are
+# adjacent in the text. That makes it a substring search served from an inverted
+# index. Other scripts are indexed as whole words. The FTS5 table is
+# contentless. Chapter text is kept once, compressed, in 'docs', for result
+# snippets and for removing a chapter's old tokens when it changes.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,   -- rowid of the chapter's entry in 'grams'
+    url TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    book_url TEXT,
+    book_title TEXT,
+    digest TEXT NOT NULL,     -- sha1 of the indexed text, so unchanged chapters are skipped
+    text BLOB NOT NULL,       -- zlib-compressed plain text
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_book ON docs(book_url);
+CREATE VIRTUAL TABLE IF NOT EXISTS grams USING fts5(title, body, content='', tokenize='unicode61 remove_diacritics 0');
+"""
+
+CJK_CHARACTERS = '㐀-䶿一-鿿豈-﫿'
+TOKEN_RUN = re.compile(f'([{CJK_CHARACTERS}]+)|([^\\W{CJK_CHARACTERS}]+)')
+LINE_BREAK = re.compile(r'<br\s*/?>|</p>', re.IGNORECASE)
+TAG = re.compile(r'<[^>]+>')
+BLANK_LINES = re.compile(r'\s*\n\s*')
+
+TITLE_WEIGHT = 5.0 # A match in the chapter title ranks above one in the text
+SNIPPET_CHARACTERS = 40 # Either side of the match
+BATCH_SIZE = 64 # Chapters written per transaction by the indexing thread
+BACKFILL_QUEUE_LIMIT = 256 # Backfills wait while this many chapters are queued
+
+
+def tokens(text):
+    """The index's view of text as one space-separated string: CJK bigrams and
+    lowercased words in order, then the distinct CJK characters (sorted, so the
+    same text always gives the same string - removing a chapter depends on it)."""
+    out = []
+    characters = set()
+    for match in TOKEN_RUN.finditer(text):
+        run = match.group(1)
+        if run:
+            out.extend(map(str.__add__, run[:-1], run[1:]))
+            characters.update(run)
+        else:
+            out.append(match.group(2).lower())
+    out.extend(sorted(characters))
+    return ' '.join(out)
+
+
+def match_query(query):
+    """Turns what the reader typed into an FTS5 MATCH expression, or None if nothing is searchable.
+
+    Every space-separated term must occur. A term is a phrase of its bigrams, or
+    the character itself for a one-character term.
+    """
+    clauses = []
+    for match in TOKEN_RUN.finditer(query):
+        run = match.group(1)
+        if run and len(run) == 1:
+            clauses.append(f'"{run}"')
+        elif run:
+            clauses.append('"' + ' '.join(map(str.__add__, run[:-1], run[1:])) + '"')
+        else:
+            clauses.append('"' + match.group(2).lower() + '"')
+    return ' AND '.join(clauses) or None
+
+
+def plain_text(content_html):
+    """The readable text of a chapter's content HTML, one paragraph per line."""
+    text = TAG.sub('', LINE_BREAK.sub('\n', content_html or ''))
+    return BLANK_LINES.sub('\n', html.unescape(text).replace('\xa0', ' ')).strip()
+
+
+def snippet(text, query):
+    """A short excerpt of text around the first occurrence of the query's first term."""
+    terms = query.split()
+    position = text.find(terms[0]) if terms else -1
+    if position == -1:
+        position = text.lower().find(terms[0].lower()) if terms else -1
+    if position == -1:
+        return text[:SNIPPET_CHARACTERS * 2].replace('\n', ' ')
+    start = max(0, position - SNIPPET_CHARACTERS)
+    end = position + len(terms[0]) + SNIPPET_CHARACTERS
+    excerpt = text[start:end].replace('\n', ' ')
+    return ('…' if start else '') + excerpt + ('…' if end < len(text) else '')
+
+
+class SearchIndex:
+    """Full-text index over the chapters the reader has fetched.
+
+    add() only queues a chapter: a background thread with its own SQLite connection
+    writes the index in batches, so neither the UI nor the fetch workers wait for
+    it. Searches use a second connection and, with WAL, never wait on the writer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if hasattr(path, 'parent'):
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    # --- Indexing (on the indexing thread) ---
+
+    def add(self, url, chapter):
+        """Queues a chapter dict (as fetch_chapter returns it) for indexing; returns immediately."""
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='search-index', daemon=True)
+                self._thread.start()
+        self._queue.put((url, chapter))
+
+    def _run(self):
+        conn = sqlite3.connect(str(self.path), isolation_level=None)
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < BATCH_SIZE and batch[-1] is not None:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                items = [item for item in batch if item is not None]
+                if items:
+                    try:
+                        with tracer.span('index', chapters=len(items)):
+                            self._write(conn, items)
+                    except sqlite3.Error as e:
+                        logging.warning("Could not index %s chapter(s): %s", len(items), e)
+                for _ in batch:
+                    self._queue.task_done()
+                if batch[-1] is None:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn, items):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for url, chapter in items:
+                text = plain_text(chapter.get('content_html'))
+                title = chapter.get('title') or ''
+                digest = hashlib.sha1(f"{title}\n{text}".encode('utf-8')).hexdigest()
+                row = conn.execute("SELECT id, digest, title, text FROM docs WHERE url = ?", (url,)).fetchone()
+                if row is not None:
+                    doc_id, old_digest, old_title, old_text = row
+                    if old_digest == digest:
+                        continue
+                    # Contentless FTS5 removes a row by being told exactly what it indexed
+                    conn.execute(
+                        "INSERT INTO grams (grams, rowid, title, body) VALUES ('delete', ?, ?, ?)",
+                        (doc_id, tokens(old_title), tokens(zlib.decompress(old_text).decode('utf-8')))
+                    )
+                    conn.execute(
+                        "UPDATE docs SET title = ?, book_url = ?, book_title = ?, digest = ?, text = ?, indexed_at = ? "
+                        "WHERE id = ?",
+                        (title, chapter.get('book_url'), chapter.get('book_title'), digest,
+                         zlib.compress(text.encode('utf-8')), time.time(), doc_id)
+                    )
+                else:
+                    doc_id = conn.execute(
+                        "INSERT INTO docs (url, title, book_url, book_title, digest, text, indexed_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (url, title, chapter.get('book_url'), chapter.get('book_title'), digest,
+                         zlib.compress(text.encode('utf-8')), time.time())
+                    ).lastrowid
+                conn.execute("INSERT INTO grams (rowid, title, body) VALUES (?, ?, ?)",
+                             (doc_id, tokens(title), tokens(text)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add_many(self, chapters):
+        """Queues (url, chapter) pairs not yet indexed, pacing itself so a large backfill
+        never piles up in memory. Blocks, so run it on a worker thread; returns the number queued."""
+        with self._lock:
+            indexed = {url for (url,) in self._conn.execute("SELECT url FROM docs")}
+        queued = 0
+        for url, chapter in chapters:
+            if url in indexed:
+                continue
+            while self._queue.qsize() > BACKFILL_QUEUE_LIMIT:
+                time.sleep(0.05)
+            self.add(url, chapter)
+            queued += 1
+        if queued:
+            logging.info("Queued %s chapter(s) for the search index", queued)
+        return queued
+
+    def flush(self):
+        """Waits until every queued chapter is in the index."""
+        self._queue.join()
+
+    # --- Searching ---
+
+    def search(self, query, limit=20, book_url=None):
+        """Returns the best matches for query as [{'url', 'title', 'book_url', 'book_title', 'snippet'}].
+
+        Every space-separated term must occur as written. book_url restricts the
+        search to one book.
+        """
+        expression = match_query(query)
+        if expression is None:
+            return []
+        # Rank inside FTS5 and join only the top rows; joining first would read every
+        # matching chapter's text just to sort it
+        book_filter = " AND rowid IN (SELECT id FROM docs WHERE book_url = ?)" if book_url is not None else ""
+        sql = ("SELECT docs.url, docs.title, docs.book_url, docs.book_title, docs.text FROM ("
+               f"SELECT rowid AS id, bm25(grams, {TITLE_WEIGHT}, 1.0) AS score FROM grams "
+               f"WHERE grams MATCH ?{book_filter} ORDER BY score LIMIT ?"
+               ") AS hits JOIN docs ON docs.id = hits.id ORDER BY hits.score")
+        parameters = [expression] + ([book_url] if book_url is not None else []) + [limit]
+        with tracer.span('search', query=query):
+            with self._lock:
+                rows = self._conn.execute(sql, parameters).fetchall()
+            return [
+                {'url': url, 'title': title, 'book_url': result_book_url, 'book_title': book_title,
+                 'snippet': snippet(zlib.decompress(text).decode('utf-8'), query)}
+                for url, title, result_book_url, book_title, text in rows
+            ]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def close(self):
+        """Finishes writing what is queued, then closes both connections."""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        with self._lock:
+            self._conn.close()
+
+
+def add_arguments(parser):
+    """Registers the 'search' subcommand's options on an argparse parser."""
+    parser.add_argument('query', nargs='?', help="Words or phrases to find; every space-separated term must occur")
+    parser.add_argument('--index', default='search_index.sqlite3', help="Search index file (default: search_index.sqlite3)")
+    parser.add_argument('--add-cache', metavar='FILE', help="First index every chapter in this chapter cache file")
+    parser.add_argument('--add-book', metavar='FILE', action='append', default=[],
+                        help="First index every chapter of this library book (repeatable)")
+    parser.add_argument('--book', metavar='URL', help="Only search the book with this book page URL")
+    parser.add_argument('-n', '--limit', type=int, default=20, help="Results to show (default: 20)")
+
+
+def run(args, scraper):
+    """Runs the 'search' subcommand; returns a process exit code."""
+    index = scraper.search_index
+    if args.add_cache:
+        cache = ChapterCache(Path(args.add_cache))
+        try:
+            index.add_many(cache.iter_chapters())
+        finally:
+            cache.close()
+    for path in args.add_book:
+        try:
+            with BookStore(path) as store:
+                index.add_many((chapter['url'], chapter) for chapter in store if chapter.get('url'))
+        except LibraryError as e:
+            print(f"Error: {e}")
+            return 1
+    index.flush()
+    if not args.query:
+        print(f"{len(index)} chapter(s) indexed in {args.index}")
+        return 0
+    started = time.perf_counter()
+    results = index.search(args.query, limit=args.limit, book_url=args.book)
+    elapsed = time.perf_counter() - started
+    for result in results:
+        print(f"{result['title']}  ({result['book_title'] or result['book_url'] or ''})")
+        print(f"  {result['url']}")
+        print(f"  {result['snippet']}")
+    print(f"{len(results)} result(s) in {elapsed * 1000:.1f} ms")
+    return 0
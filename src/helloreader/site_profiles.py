@@ -0,0 +1,140 @@
+import json
+import logging
+import re
+from pathlib import Path
+from urllib.parse import urlparse, urlunparse
+
+from .content_extractor import SliceHasher, extract_chapter, extract_toc
+
+# Profiles shipped with the app; a user directory can add or override sites
+BUILTIN_PROFILE_DIR = Path(__file__).parent / 'profiles'
+
+
+class SiteProfileError(Exception):
+    """Raised when a profile file is malformed."""
+    pass
+
+
+class SiteProfile:
+    """Extraction settings for one site, with regexes compiled once when the profile loads."""
+
+    def __init__(self, name, hosts, encoding='utf-8', title_tag='h1',
+                 content_start_marker='<br>', content_end_marker='</div>',
+                 next_link_text='下一章', prev_link_text='上一章',
+                 toc_path_rules=(), toc_link_pattern=r'\.html$', default=False):
+        self.name = name
+        self.hosts = [host.lower() for host in hosts]
+        self.encoding = encoding
+        self.title_tag = title_tag.lower()
+        self.content_start_marker = content_start_marker
+        self.content_end_marker = content_end_marker
+        self.next_link_text = next_link_text
+        self.prev_link_text = prev_link_text
+        self.default = default
+        try:
+            self.toc_path_rules = [(re.compile(pattern), replacement) for pattern, replacement in toc_path_rules]
+            self.toc_link_pattern = re.compile(toc_link_pattern)
+        except (re.error, TypeError, ValueError) as e:
+            raise SiteProfileError(f"Site profile '{name}' has an invalid pattern: {e}") from e
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(**data)
+        except (OSError, ValueError, TypeError) as e:
+            raise SiteProfileError(f"Could not load site profile {path}: {e}") from e
+
+    def extract_chapter(self, html_content_raw, url, failed_text=None):
+        return extract_chapter(
+            html_content_raw, url,
+            title_tag=self.title_tag,
+            start_marker=self.content_start_marker,
+            end_marker=self.content_end_marker,
+            next_link_text=self.next_link_text,
+            prev_link_text=self.prev_link_text,
+            failed_text=failed_text
+        )
+
+    def slice_hasher(self):
+        """A SliceHasher over what this site's chapters are extracted from: the title element,
+        and the content slice through to the "Next" link (so the links are covered too)."""
+        encoding = self.encoding or 'utf-8'
+        spans = [[f'<{self.title_tag}', f'</{self.title_tag}>'],
+                 [self.content_start_marker, self.content_end_marker, self.next_link_text]]
+        return SliceHasher([[marker.encode(encoding, 'replace') for marker in span] for span in spans])
+
+    def content_digest(self, raw):
+        """The slice_hasher digest of a whole page, as stored with each cached chapter."""
+        hasher = self.slice_hasher()
+        hasher.feed(raw)
+        return hasher.hexdigest()
+
+    def extract_toc(self, html_content_raw, toc_url):
+        return extract_toc(html_content_raw, toc_url, self.toc_link_pattern)
+
+    def toc_url_for(self, url):
+        """Maps a book page or chapter URL to the book's index page; other URLs are assumed to be one."""
+        parsed = urlparse(url)
+        for pattern, replacement in self.toc_path_rules:
+            if pattern.match(parsed.path):
+                return urlunparse(parsed._replace(path=pattern.sub(replacement, parsed.path), query='', fragment=''))
+        return url
+
+    def __repr__(self):
+        return f"<SiteProfile {self.name} {self.hosts}>"
+
+
+class SiteProfileRegistry:
+    """Site profiles keyed by host, so finding the profile for a URL is one dict lookup."""
+
+    def __init__(self):
+        self._by_host = {}
+        self.default = None # Used for hosts no profile names
+
+    def register(self, profile):
+        for host in profile.hosts:
+            self._by_host[host] = profile
+        if profile.default or self.default is None:
+            self.default = profile
+
+    def load_directory(self, directory):
+        """Registers every *.json profile in directory; later files override earlier hosts."""
+        directory = Path(directory)
+        if not directory.is_dir():
+            return 0
+        loaded = 0
+        for path in sorted(directory.glob('*.json')):
+            try:
+                self.register(SiteProfile.from_file(path))
+                loaded += 1
+            except SiteProfileError as e:
+                logging.warning(str(e))
+        logging.info("Loaded %s site profile(s) from %s", loaded, directory)
+        return loaded
+
+    def for_url(self, url):
+        return self._for_host(urlparse(url).hostname or '') or self.default
+
+    def knows(self, url):
+        """True if a profile names url's host (rather than the default profile standing in)."""
+        return self._for_host(urlparse(url).hostname or '') is not None
+
+    def _for_host(self, host):
+        profile = self._by_host.get(host)
+        if profile is None and host.startswith('www.'):
+            profile = self._by_host.get(host[4:])
+        return profile
+
+
+_default_registry = None
+
+
+def default_registry():
+    """The process-wide registry of built-in profiles, loaded and compiled on first use."""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = SiteProfileRegistry()
+        _default_registry.load_directory(BUILTIN_PROFILE_DIR)
+    return _default_registry
@@ -14,8 +14,8 @@ def fetch_and_extract_title(url):
         # Raise an exception for bad status codes
         response.raise_for_status()
 
-        # Decode the content using gb2312 encoding
-        content = response.content.decode('gb2312', errors='replace')
+        # Decode with GB18030: a superset of gb2312/GBK, so characters outside gb2312 survive
+        content = response.content.decode('gb18030', errors='replace')
 
         # Parse the HTML content
         soup = BeautifulSoup(content, 'html.parser')
@@ -1,145 +1,504 @@
-import requests
-from bs4 import BeautifulSoup, NavigableString
+import asyncio
+import functools
 import logging
-from urllib.parse import urljoin
-# import re # No longer needed for this approach
+import random
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+
+from .charset import decode_page
+from .instrumentation import tracer
+from .politeness import THROTTLE_STATUSES, HostScheduler, parse_retry_after
+from .site_profiles import default_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Placeholder content returned when the content slice could not be located
+EXTRACTION_FAILED_TEXT = "[Content extraction failed]"
+
+# Responses worth retrying: throttling and transient server/gateway failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 class ScraperException(Exception):
     """Custom exception for scraper errors."""
     pass
 
+# A fetched page that still has to be decoded and extracted
+RawPage = namedtuple('RawPage', 'url raw content_type etag last_modified')
+
+# The outcome of revalidate_chapter: status is 'unchanged', 'changed' or 'not_cached',
+# transferred the body bytes received (0 for a 304)
+Revalidation = namedtuple('Revalidation', 'url status transferred')
+
+STREAM_CHUNK_SIZE = 4096 # Bytes read at a time while looking for a page's chapter region
+DRAIN_LIMIT = 16 * 1024 # Reading at most this much more keeps the connection for reuse; beyond it, drop it
+
+# Site profiles of an extraction worker process, sent once when the worker starts
+_worker_profiles = None
+
+def _init_extraction_worker(profiles):
+    global _worker_profiles
+    _worker_profiles = profiles
+
+def extract_page(raw, url, content_type=None, known_encoding=None):
+    """Decodes and extracts one chapter page; returns (chapter dict, encoding used).
+
+    Runs in an extraction pool worker. It takes the raw bytes and returns only
+    the small extracted dict, so little has to cross the process boundary.
+    """
+    profile = (_worker_profiles or default_registry()).for_url(url)
+    html, encoding, _ = decode_page(raw, content_type, default=profile.encoding, known=known_encoding)
+    return profile.extract_chapter(html, url, failed_text=EXTRACTION_FAILED_TEXT), encoding
+
+def extraction_pool(processes, profiles=None):
+    """A process pool for fetch_chapter_async's extraction_pool; each worker receives
+    the site profiles (the scraper's, including user-added ones) once at start-up."""
+    # Imported here: multiprocessing is only needed by this opt-in feature, not at app start-up
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=processes, initializer=_init_extraction_worker,
+                               initargs=(profiles or default_registry(),))
+
+_timed_pool_classes = None
+
+def timed_pool_classes():
+    """urllib3 pool classes whose connections report DNS lookup + TCP connect (+ TLS
+    handshake) as a 'connect' span. Reused keep-alive connections never call connect(),
+    so the span only appears for new ones. Built on first use, like the session itself,
+    so importing this module does not import the HTTP stack.
+    """
+    global _timed_pool_classes
+    if _timed_pool_classes is None:
+        from urllib3.connection import HTTPConnection, HTTPSConnection
+        from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+        class TimedHTTPConnection(HTTPConnection):
+            def connect(self):
+                with tracer.span('connect', host=self.host):
+                    super().connect()
+
+        class TimedHTTPSConnection(HTTPSConnection):
+            def connect(self):
+                with tracer.span('connect', host=self.host):
+                    super().connect()
+
+        class TimedHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = TimedHTTPConnection
+
+        class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = TimedHTTPSConnection
+
+        _timed_pool_classes = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+    return _timed_pool_classes
+
 class WebScraper:
     """Handles fetching and parsing web content for the reader."""
 
-    def __init__(self):
-        # Initial configuration for piaotia.com (Task 1.5)
-        # TODO: Move this to an external config file later
-        self.config = {
-            'base_url': 'https://www.piaotia.com/', # Needed for urljoin
-            'content_selector': '#shop', # Primary content selector - CHANGED from #content
-            'next_link_text': '下一章',
-            'prev_link_text': '上一章',
-            'title_selector': 'h1',
-            'encoding_fallback': 'gbk', # CHANGED from gb2312 to gbk
-            # Disable fallback markers temporarily as they were likely based on #content
-            'fallback_start_marker': None, 
-            'fallback_end_marker': None 
-        }
+    def __init__(self, cache=None, offline=False, max_connections_per_host=4, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, timeout=10, profiles=None, scheduler=None):
+        self.cache = cache # Optional ChapterCache consulted before the network
+        self.search_index = None # Optional SearchIndex that every fetched chapter is queued for
+        self.offline = offline # Serve only from the cache, never touch the network
+        self.max_retries = max_retries # Extra attempts after the first for idempotent GETs
+        self.backoff_base = backoff_base # Seconds; doubled per attempt, then jittered
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        # Per-site selectors, markers and encodings, compiled once and looked up by host
+        self.profiles = profiles or default_registry()
+        # Every request waits its turn here, so however many callers fetch at once
+        # each site gets only the rate and concurrency it copes with
+        self.scheduler = scheduler or HostScheduler(max_concurrency=max_connections_per_host)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8'
         }
 
-    def _fetch_html(self, url):
-        """Fetches HTML content from a URL with error handling."""
+        self.max_connections_per_host = max_connections_per_host
+        # The requests session is created on the first network fetch: a start-up that
+        # only reads the cache never pays for importing requests and urllib3
+        self._session = None
+        self._adapter = None
+        self._session_lock = threading.Lock()
+
+        self._host_encodings = None # host -> encoding, loaded from the cache on first decode
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'not_modified': 0, 'failures': 0, 'throttled': 0}
+
+    @property
+    def session(self):
+        """The pooled requests.Session every fetch goes through, created on first use."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    # One pooled session for all fetches so consecutive chapters reuse the same
+                    # keep-alive connection instead of paying a new TCP+TLS handshake each time.
+                    # pool_block caps simultaneous connections per host at max_connections_per_host.
+                    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=self.max_connections_per_host,
+                                          pool_block=True, max_retries=0) # Retries are handled in _fetch_response
+                    adapter.poolmanager.pool_classes_by_scheme = timed_pool_classes()
+                    session = requests.Session()
+                    session.headers.update(self.headers)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._adapter = adapter
+                    self._session = session
+                    logging.debug("Created HTTP session")
+        return self._session
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+        tracer.count(key, amount)
+
+    def stats(self):
+        """Returns request counters plus connection reuse figures from the session's pools."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        pools = self._adapter.poolmanager.pools if self._adapter is not None else {}
+        connections = sum(pools[key].num_connections for key in pools.keys())
+        pooled_requests = sum(pools[key].num_requests for key in pools.keys())
+        stats['connections_opened'] = connections
+        stats['connection_reuse_rate'] = (1 - connections / pooled_requests) if pooled_requests else 0.0
+        return stats
+
+    def _backoff_delay(self, attempt):
+        """Full-jitter exponential backoff: uniform in [0, min(max, base * 2**attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _fetch_response(self, url, etag=None, last_modified=None, read_body=True):
+        """GETs a URL through the pooled session and the host scheduler, retrying transient failures.
+
+        etag/last_modified turn the request into a conditional GET; a 304 response
+        is returned as-is for the caller to serve its stored copy. read_body=False
+        returns a successful response with its body still unread, for the caller to
+        stream and then close. A Retry-After on a 429 or 503 pauses every request to
+        the host (see HostScheduler), so the retry goes out once the site allows it.
+        """
+        import requests # Imported on first network use rather than with this module
+        conditional_headers = {}
+        if etag:
+            conditional_headers['If-None-Match'] = etag
+        if last_modified:
+            conditional_headers['If-Modified-Since'] = last_modified
+
+        attempt = 0
+        while True:
+            self._count('requests')
+            ticket = self.scheduler.acquire(url)
+            status, latency, retry_after = None, None, None
+            try:
+                # Streamed so the wait for the headers (including connect, for a new
+                # connection) and the body download are timed as separate spans
+                started = time.perf_counter()
+                with tracer.span('request', url=url):
+                    response = self.session.get(url, headers=conditional_headers, timeout=self.timeout, stream=True)
+                status, latency = response.status_code, time.perf_counter() - started
+                if status in THROTTLE_STATUSES:
+                    self._count('throttled')
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                # A host asking for a longer pause than we are willing to wait fails the request now
+                too_long = retry_after is not None and retry_after > self.scheduler.max_retry_after
+                if status not in RETRY_STATUSES or attempt >= self.max_retries or too_long:
+                    if read_body or not response.ok:
+                        with tracer.span('download', url=url):
+                            response.content # Reads the body and returns the connection to the pool
+                    break
+                logging.warning("HTTP %s from %s (attempt %s)", status, url, attempt + 1)
+                response.close()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    logging.error("Network error fetching %s: %s", url, e)
+                    raise ScraperException(f"Failed to fetch content from {url}. Network error: {e}") from e
+                logging.warning("Transient error fetching %s (attempt %s): %s", url, attempt + 1, e)
+            finally:
+                self.scheduler.release(ticket, status, latency, retry_after)
+            delay = self._backoff_delay(attempt)
+            attempt += 1
+            self._count('retries')
+            time.sleep(delay)
+
+        if response.status_code == 304:
+            self._count('not_modified')
+            logging.info("Not modified: %s", url)
+            return response
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
             response.raise_for_status()
-            # Force GBK encoding - covers more chars than gb2312
-            response.encoding = self.config.get('encoding_fallback', 'gbk') 
-            logging.info(f"Fetched {url}, forced encoding: {response.encoding}")
-            return response.text
+        except requests.exceptions.HTTPError as e:
+            self._count('failures')
+            logging.error("Network error fetching %s: %s", url, e)
+            if status in THROTTLE_STATUSES:
+                wait = f"in {retry_after:.0f}s" if retry_after is not None else "later"
+                raise ScraperException(f"{urlparse(url).netloc} is limiting requests (HTTP {status}); "
+                                       f"try again {wait}.") from e
+            raise ScraperException(f"Failed to fetch content from {url}. Network error: {e}") from e
+        if read_body:
+            logging.info("Fetched %s (%s bytes)", url, len(response.content))
+        return response
+
+    def _fetch_raw(self, url):
+        """Fetches the raw response body of a URL with error handling."""
+        import requests
+        try:
+            return self._fetch_response(url).content
+        except ScraperException:
+            raise
         except requests.exceptions.RequestException as e:
-            logging.error(f"Network error fetching {url}: {e}")
+            logging.error("Network error fetching %s: %s", url, e)
             raise ScraperException(f"Failed to fetch content from {url}. Network error: {e}") from e
         except Exception as e:
-            logging.error(f"Unexpected error fetching {url}: {e}")
+            logging.error("Unexpected error fetching %s: %s", url, e)
             raise ScraperException(f"An unexpected error occurred while fetching {url}: {e}") from e
 
+    def _known_encoding(self, host):
+        if self._host_encodings is None:
+            self._host_encodings = self.cache.get_host_encodings() if self.cache is not None else {}
+        return self._host_encodings.get(host)
 
-    def fetch_chapter(self, url):
-        """Fetches content using title/link selectors and EXACT text slicing for main content."""
-        logging.info(f"Fetching chapter: {url}")
-        html_content_raw = self._fetch_html(url) # Get the raw HTML string
-        soup = BeautifulSoup(html_content_raw, 'html.parser') # Use BS4 for title/links
+    def _remember_encoding(self, host, encoding, known):
+        """Records the encoding a page from host turned out to use, in the cache if there is one."""
+        if encoding == known:
+            return
+        self._host_encodings[host] = encoding
+        if self.cache is not None:
+            try:
+                self.cache.set_host_encoding(host, encoding)
+            except Exception as e:
+                logging.warning("Could not record encoding for %s: %s", host, e)
 
-        # 1. Extract Title using BS4
-        title_element = soup.select_one(self.config['title_selector']) # Usually h1
-        title = title_element.get_text(strip=True) if title_element else "Title Not Found"
-        logging.info(f"Extracted Title: {title}")
+    def _decode(self, raw, url, content_type=None):
+        """Decodes raw page bytes, scanning for the encoding once per host.
+
+        The BOM and the Content-Type charset are always honoured. Without them the
+        first page from a host is scanned for <meta charset> (falling back to the
+        site profile's encoding) and the result is remembered, in the cache if there
+        is one, so later pages skip the scan. Those pages are decoded strictly and
+        only scanned again if that fails.
+        """
+        host = urlparse(url).hostname or ''
+        known = self._known_encoding(host)
+        started = time.perf_counter()
+        html, encoding, source = decode_page(raw, content_type, default=self.profiles.for_url(url).encoding, known=known)
+        tracer.record('decode', time.perf_counter() - started, url=url, encoding=encoding)
+        if known and source in ('meta', 'default'):
+            # Only reached when the page failed to decode with the remembered encoding
+            logging.info("%s is not valid %s; detected %s instead", url, known, encoding)
+        logging.debug("Decoded %s as %s (from %s)", url, encoding, source)
+        self._remember_encoding(host, encoding, known)
+        return html
+
+    def _fetch_html(self, url):
+        """Fetches HTML content from a URL with error handling."""
+        return self._decode(self._fetch_raw(url), url)
 
-        # --- Content Extraction using EXACT Text Slicing --- 
-        content_html = None
-        start_marker = "<br>" # Exact marker
-        end_marker = "</div>" # Exact marker
-        
+    def fetch_chapter(self, url, revalidate=False):
+        """Returns a chapter from the cache if present, otherwise fetches and extracts it.
+
+        revalidate=True skips a fresh cache entry and asks the site whether the page
+        changed (a conditional GET, so an unchanged page costs a 304).
+        """
+        page = self._fetch_page(url, revalidate)
+        if not isinstance(page, RawPage):
+            return page
+        chapter = self._extract_chapter(url, self._decode(page.raw, url, page.content_type))
+        return self._store_chapter(page, chapter)
+
+    def _fetch_page(self, url, revalidate=False):
+        """The I/O half of fetch_chapter: returns the chapter dict if the cache can answer,
+        otherwise the page's RawPage for the caller to extract."""
+        if self.cache is not None and not (revalidate and not self.offline):
+            # Offline, a stale copy beats no copy at all
+            cached = self.cache.get_chapter(url, allow_stale=self.offline)
+            if cached is not None:
+                tracer.count('cache_hits')
+                return cached
+            tracer.count('cache_misses')
+        if self.offline:
+            raise ScraperException(f"Offline mode: {url} is not in the chapter cache.")
+
+        logging.info("Fetching chapter: %s", url)
+        import requests # Deferred until the first page that is not served from the cache
         try:
-            # Find end of H1 tag to start search after it
-            h1_end_index = -1
-            search_start_pos = 0 # Position in raw HTML to start searching for markers
-            if title_element:
-                title_html_str = str(title_element) # Get H1 tag as string
-                h1_start_index_in_raw = html_content_raw.find(title_html_str)
-                if h1_start_index_in_raw != -1:
-                     h1_end_index = h1_start_index_in_raw + len(title_html_str)
-                     search_start_pos = h1_end_index
-                     logging.debug(f"Found H1 tag. Starting search for exact '{start_marker}' after index {search_start_pos}")
-                else:
-                    logging.warning("Could not find H1 tag string in raw HTML. Searching for markers from start.")
-                    search_start_pos = 0
-            else:
-                 logging.warning("Could not find H1 element via BS4. Searching for markers from start.")
-                 search_start_pos = 0
-
-            # Find the first exact <br> *after* search_start_pos
-            start_marker_found_at = html_content_raw.find(start_marker, search_start_pos)
-            
-            if start_marker_found_at != -1:
-                slice_start_index = start_marker_found_at + len(start_marker) # Position *after* the found <br> tag
-                logging.info(f"Found exact start marker '{start_marker}' at index {start_marker_found_at}. Content slice starts after index {slice_start_index}.")
-                
-                # Find the first exact </div> *after* the start marker's end position (slice_start_index)
-                slice_end_index = html_content_raw.find(end_marker, slice_start_index)
-                
-                if slice_end_index != -1:
-                    logging.info(f"Found exact end marker '{end_marker}' at index {slice_end_index}. Content slice ends before index {slice_end_index}.")
-                    
-                    # Extract the slice
-                    content_html = html_content_raw[slice_start_index:slice_end_index]
-                    
-                    # Basic cleanup
-                    content_html = content_html.strip()
-                    content_html = content_html.replace("&nbsp;", " ") 
-                    
-                    logging.info(f"Successfully extracted content ({len(content_html)} chars) using exact text slicing.")
-                else:
-                    logging.warning(f"Could not find exact end marker '{end_marker}' after index {slice_start_index}.")
-            else:
-                logging.warning(f"Could not find exact start marker '{start_marker}' after index {search_start_pos}.")
+            # An expired cache entry still has validators, so ask whether it changed
+            etag, last_modified = self.cache.get_validators(url) if self.cache is not None else (None, None)
+            response = self._fetch_response(url, etag=etag, last_modified=last_modified)
+            if response.status_code == 304:
+                chapter = self.cache.refresh(url)
+                if chapter is not None:
+                    return chapter
+                # Evicted between the check and the answer - fetch it outright
+                response = self._fetch_response(url)
+            raw = response.content
+        except ScraperException:
+            raise
+        except requests.exceptions.RequestException as e:
+            logging.error("Network error fetching %s: %s", url, e)
+            raise ScraperException(f"Failed to fetch content from {url}. Network error: {e}") from e
+        return RawPage(url, raw, response.headers.get('Content-Type'),
+                       response.headers.get('ETag'), response.headers.get('Last-Modified'))
 
-        except Exception as e:
-            logging.error(f"Error during exact text slicing content extraction: {e}", exc_info=True)
+    def _store_chapter(self, page, chapter):
+        """Caches and indexes a freshly extracted chapter; returns it."""
+        # Failed extractions are not cached so the next visit tries again
+        if chapter['content_html'] == EXTRACTION_FAILED_TEXT:
+            return chapter
+        if self.cache is not None:
+            try:
+                # Kept so a later revalidation can tell an edited chapter from changed ads
+                content_hash = self.profiles.for_url(page.url).content_digest(page.raw)
+                self.cache.put(page.url, page.raw, chapter, etag=page.etag, last_modified=page.last_modified,
+                               content_hash=content_hash)
+            except Exception as e:
+                logging.warning("Could not cache %s: %s", page.url, e)
+        if self.search_index is not None:
+            self.search_index.add(page.url, chapter)
+        return chapter
 
-        # Fallback / Error Handling
-        if not content_html:
-             logging.error(f"Failed to extract content using exact text slicing for {url}. Setting empty content.")
-             content_html = "[Content extraction failed]"
+    def revalidate_chapter(self, url):
+        """Asks the site whether a cached chapter changed, re-extracting and re-indexing it only if so.
 
-        # --- End Content Extraction Logic --- 
+        Sends a conditional GET with the stored validators; a 304 settles it without
+        a body. Otherwise the body is streamed through the site's SliceHasher and
+        compared with the stored content hash as it arrives: once the chapter's region
+        (title through the "Next" link) has been read unchanged, the rest of the page,
+        with whatever ads or counters changed there, is not downloaded. Only a changed
+        chapter is read in full, extracted, and stored and indexed again. Returns a
+        Revalidation.
+        """
+        if self.cache is None:
+            raise ScraperException("Revalidating chapters needs a chapter cache")
+        info = self.cache.get_revalidation_info(url)
+        if info is None:
+            return Revalidation(url, 'not_cached', 0)
+        if self.offline:
+            raise ScraperException(f"Offline mode: cannot revalidate {url}.")
+        profile = self.profiles.for_url(url)
+        stored_hash = info['content_hash']
+        if stored_hash is None:
+            # Cached before content hashes were kept; the stored page gives it
+            stored_hash = profile.content_digest(self.cache.get_raw(url) or b'')
+            self.cache.set_content_hash(url, stored_hash)
 
-        # Extract Links using BS4 (Keep existing logic)
-        next_page_url = None
-        prev_page_url = None
+        import requests
+        chunks = []
         try:
-            next_link = soup.find('a', string=self.config['next_link_text'])
-            if next_link and next_link.get('href'):
-                next_page_url = urljoin(url, next_link['href'])
-            prev_link = soup.find('a', string=self.config['prev_link_text'])
-            if prev_link and prev_link.get('href'):
-                prev_page_url = urljoin(url, prev_link['href'])
-            logging.info(f"Prev URL: {prev_page_url}, Next URL: {next_page_url}")
-        except Exception as e:
-             logging.warning(f"Could not parse next/previous links: {e}")
+            response = self._fetch_response(url, etag=info['etag'], last_modified=info['last_modified'], read_body=False)
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+            try:
+                if response.status_code == 304:
+                    self.cache.refresh(url)
+                    return Revalidation(url, 'unchanged', 0)
+                if (etag or last_modified) and (etag, last_modified) == (info['etag'], info['last_modified']):
+                    # The same version, from a server that ignores conditional requests
+                    self.cache.refresh(url)
+                    return Revalidation(url, 'unchanged', response.raw.tell())
+                hasher = profile.slice_hasher()
+                with tracer.span('download', url=url):
+                    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                        chunks.append(chunk)
+                        if hasher.feed(chunk):
+                            break
+                    if stored_hash is not None and hasher.hexdigest() == stored_hash:
+                        self._drain(response)
+                        self.cache.refresh(url, etag, last_modified)
+                        logging.info("Unchanged: %s (%s bytes read)", url, response.raw.tell())
+                        return Revalidation(url, 'unchanged', response.raw.tell())
+                    chunks.extend(response.iter_content(STREAM_CHUNK_SIZE))
+                transferred = response.raw.tell()
+            finally:
+                response.close()
+        except requests.exceptions.RequestException as e:
+            logging.error("Network error fetching %s: %s", url, e)
+            raise ScraperException(f"Failed to fetch content from {url}. Network error: {e}") from e
 
-        return {
-            "title": title,
-            "content_html": content_html, # HTML content slice or error message
-            "next_page_url": next_page_url,
-            "previous_page_url": prev_page_url
-        }
+        logging.info("Changed: %s (%s bytes)", url, transferred)
+        page = RawPage(url, b''.join(chunks), response.headers.get('Content-Type'), etag, last_modified)
+        chapter = self._extract_chapter(url, self._decode(page.raw, url, page.content_type))
+        self._store_chapter(page, chapter)
+        return Revalidation(url, 'changed', transferred)
+
+    def _drain(self, response):
+        """Reads what is left of a short response so its connection goes back to the pool;
+        a long remainder costs more than a new connection, so then it is left unread."""
+        length = response.headers.get('Content-Length')
+        if length is None or not length.isdigit() or int(length) - response.raw.tell() > DRAIN_LIMIT:
+            return
+        for _ in response.iter_content(STREAM_CHUNK_SIZE):
+            pass
+
+    def _extract_chapter(self, url, html_content_raw):
+        """Extracts title, content slice and next/previous links in a single streaming pass."""
+        return self.profiles.for_url(url).extract_chapter(html_content_raw, url, failed_text=EXTRACTION_FAILED_TEXT)
+
+    def toc_url_for(self, url):
+        """Maps a book page or chapter URL to the book's index page; other URLs are assumed to be one."""
+        return self.profiles.for_url(url).toc_url_for(url)
+
+    def fetch_toc(self, book_url, refresh=True):
+        """Returns the book's ordered chapter list as [{'title', 'url'}].
+
+        book_url may be the book page, its index page or any chapter. With a cache
+        attached the list is persisted: refreshing sends a conditional GET for the
+        index and, when the site only appended chapters, stores just the new tail.
+        """
+        toc_url = self.toc_url_for(book_url)
+        stored = self.cache.get_toc(toc_url) if self.cache is not None else []
+        if stored and (not refresh or self.offline):
+            return stored
+        if self.offline:
+            raise ScraperException(f"Offline mode: the chapter list for {toc_url} is not in the cache.")
+
+        etag, last_modified = self.cache.get_toc_validators(toc_url) if stored else (None, None)
+        response = self._fetch_response(toc_url, etag=etag, last_modified=last_modified)
+        if response.status_code == 304:
+            self.cache.touch_toc(toc_url)
+            return stored
+
+        html = self._decode(response.content, toc_url, response.headers.get('Content-Type'))
+        chapters = self.profiles.for_url(toc_url).extract_toc(html, toc_url)
+        if not chapters:
+            raise ScraperException(f"No chapter links found on index page {toc_url}")
+        if self.cache is not None:
+            # Usually the site only appends; then the stored prefix is kept and only the tail written
+            stored_urls = [chapter['url'] for chapter in stored]
+            prefix_kept = stored_urls == [chapter['url'] for chapter in chapters[:len(stored_urls)]]
+            start = len(stored_urls) if prefix_kept else 0
+            self.cache.save_toc(toc_url, chapters, start=start, etag=response.headers.get('ETag'),
+                                last_modified=response.headers.get('Last-Modified'))
+            logging.info("Index %s: %s new chapter(s) stored, %s unchanged", toc_url, len(chapters) - start, start)
+        return chapters
+
+    async def fetch_chapter_async(self, url, executor=None, revalidate=False, extraction_pool=None):
+        """Runs fetch_chapter on a worker thread so the calling event loop never blocks.
+
+        With an extraction_pool (see extraction_pool()), only the fetch runs on the
+        thread; the raw bytes go to a worker process for decoding and extraction, so
+        CPU-bound parsing of many pages at once is not serialised on the GIL.
+
+        Cancelling the awaiting task abandons the result; the worker thread finishes
+        its request in the background and its output is simply dropped.
+        """
+        loop = asyncio.get_running_loop()
+        if extraction_pool is None:
+            return await loop.run_in_executor(executor, functools.partial(self.fetch_chapter, url, revalidate=revalidate))
+
+        page = await loop.run_in_executor(executor, functools.partial(self._fetch_page, url, revalidate))
+        if not isinstance(page, RawPage):
+            return page
+        host = urlparse(url).hostname or ''
+        known = self._known_encoding(host)
+        started = time.perf_counter()
+        chapter, encoding = await loop.run_in_executor(
+            extraction_pool, extract_page, page.raw, url, page.content_type, known
+        )
+        # Includes the round trip to the worker, which is what a crawl waits for
+        tracer.record('extract', time.perf_counter() - started, url=url, encoding=encoding)
+        self._remember_encoding(host, encoding, known)
+        return await loop.run_in_executor(executor, self._store_chapter, page, chapter)
 
 # Example usage (optional, for testing)
 # if __name__ == '__main__':
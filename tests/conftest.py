@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+# Run against the source tree, as the benchmarks do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+
+import pytest  # noqa: E402
+
+from standin_server import start_subprocess  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def standin():
+    """Base URL of a stand-in site (benchmarks/standin_server.py) serving a 100-chapter book."""
+    process, base_url = start_subprocess('--chapters', 100, '--characters', 500)
+    yield base_url
+    process.terminate()
+    process.wait()
@@ -0,0 +1,65 @@
+from helloreader.chapter_cache import ChapterCache
+
+
+def page(n, size):
+    return f"<html>{n:06d}".encode('ascii') + b'x' * size
+
+
+def blob_count(cache):
+    return cache._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+
+
+def cached_urls(cache):
+    return {url for url, _ in cache.iter_chapters()}
+
+
+def test_reput_drops_the_replaced_blob(tmp_path):
+    cache = ChapterCache(tmp_path / 'cache.sqlite3')
+    for version in range(5):
+        cache.put('http://site/1.html', page(version, 1000), {'title': f"v{version}"})
+    assert blob_count(cache) == 1
+    assert cache.get_chapter('http://site/1.html')['title'] == 'v4'
+    assert cache.get_raw('http://site/1.html') == page(4, 1000)
+
+
+def test_shared_blob_survives_reput_of_one_page(tmp_path):
+    cache = ChapterCache(tmp_path / 'cache.sqlite3')
+    cache.put('http://site/a.html', page(0, 1000), {'title': 'a'})
+    cache.put('http://site/b.html', page(0, 1000), {'title': 'b'})
+    cache.put('http://site/a.html', page(1, 1000), {'title': 'a2'})
+    assert blob_count(cache) == 2
+    assert cache.get_raw('http://site/b.html') == page(0, 1000)
+
+
+def test_reputs_do_not_evict_live_pages(tmp_path):
+    cache = ChapterCache(tmp_path / 'cache.sqlite3', max_bytes=250_000)
+    for n in range(1, 4):
+        cache.put(f'http://site/{n}.html', page(n, 50_000), {'title': str(n)})
+    for version in range(5):
+        cache.put('http://site/3.html', page(100 + version, 50_000), {'title': '3'})
+    for n in range(4, 6):
+        cache.put(f'http://site/{n}.html', page(n, 40_000), {'title': str(n)})
+    assert cached_urls(cache) == {f'http://site/{n}.html' for n in range(1, 6)}
+    assert blob_count(cache) == 5
+    assert cache.total_bytes() <= 250_000
+
+
+def test_eviction_keeps_the_total_under_the_cap(tmp_path):
+    cache = ChapterCache(tmp_path / 'cache.sqlite3', max_bytes=250_000)
+    for n in range(1, 11):
+        cache.put(f'http://site/{n}.html', page(n, 50_000), {'title': str(n)})
+    assert cache.total_bytes() <= 250_000
+    assert 'http://site/10.html' in cached_urls(cache)
+    assert 'http://site/1.html' not in cached_urls(cache)
+
+
+def test_running_total_matches_the_tables(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    cache = ChapterCache(path, max_bytes=300_000)
+    for n in range(1, 20):
+        cache.put(f'http://site/{n % 7}.html', page(n, 30_000 + n), {'title': str(n)})
+        cache.put(f'http://site/copy{n % 3}.html', page(n, 30_000 + n), {'title': 'copy'})
+        assert cache.total_bytes() == cache._count_bytes()
+    total = cache.total_bytes()
+    cache.close()
+    assert ChapterCache(path, max_bytes=300_000).total_bytes() == total
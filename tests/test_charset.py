@@ -0,0 +1,47 @@
+import codecs
+
+from helloreader.charset import decode_page, detect_encoding
+
+TEXT = '第一章 山中𠀀' # The last character needs GB18030; GBK cannot encode it
+
+
+def test_bom_wins_over_header_and_meta():
+    raw = codecs.BOM_UTF8 + '<meta charset="gbk">第一章'.encode('utf-8')
+    assert detect_encoding(raw, 'text/html; charset=gbk') == ('utf-8', 'bom')
+    text, encoding, source = decode_page(raw, 'text/html; charset=gbk')
+    assert (text, encoding, source) == ('<meta charset="gbk">第一章', 'utf-8', 'bom')
+
+
+def test_header_charset_wins_over_meta():
+    raw = '<meta charset="utf-8">第一章'.encode('gbk')
+    assert detect_encoding(raw, 'text/html; charset="GBK"') == ('gb18030', 'header')
+
+
+def test_meta_in_the_first_1024_bytes():
+    raw = b'<html><head><meta http-equiv="Content-Type" content="text/html; charset=gb2312">' + TEXT.encode('gb18030')
+    text, encoding, source = decode_page(raw, 'text/html')
+    assert (encoding, source) == ('gb18030', 'meta')
+    assert text.endswith(TEXT)
+
+
+def test_meta_after_1024_bytes_is_not_seen():
+    raw = b' ' * 1100 + b'<meta charset="gbk">'
+    assert detect_encoding(raw, default='utf-8') == ('utf-8', 'default')
+
+
+def test_gbk_labels_decode_as_gb18030():
+    raw = TEXT.encode('gb18030')
+    text, encoding, source = decode_page(raw, 'text/html; charset=gbk')
+    assert (text, encoding) == (TEXT, 'gb18030')
+
+
+def test_known_encoding_is_dropped_when_the_page_does_not_decode_with_it():
+    raw = '<meta charset="gbk">第一章'.encode('gbk')
+    text, encoding, source = decode_page(raw, known='utf-8')
+    assert (text, encoding, source) == ('<meta charset="gbk">第一章', 'gb18030', 'meta')
+    assert decode_page(raw, known='gb18030')[2] == 'known'
+
+
+def test_fallback_is_the_profile_default():
+    raw = '第一章'.encode('gbk')
+    assert decode_page(raw, default='gbk') == ('第一章', 'gb18030', 'default')
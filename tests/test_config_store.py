@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+from helloreader.config_store import ConfigStore
+
+
+def saved(store):
+    with open(store.path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_older_snapshot_never_overwrites_a_newer_one(tmp_path):
+    store = ConfigStore(tmp_path / 'config.json')
+    store.state = {'theme': 'dark'}
+    old_text, old_version, _ = store._snapshot()
+    store.state = {'theme': 'light'}
+    new_text, new_version, _ = store._snapshot()
+    store._write(new_text, 1, new_version) # The exit-time flush gets the lock first...
+    store._write(old_text, 1, old_version) # ...and the background write holding the older state comes after
+    assert saved(store) == {'theme': 'light'}
+    assert store.writes == 1
+
+
+def test_unbroken_changes_are_written_within_max_delay(tmp_path):
+    async def scroll_for(seconds):
+        store = ConfigStore(tmp_path / 'config.json', debounce=0.05, max_delay=0.2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        while loop.time() - started < seconds:
+            store.set_position('book', 'http://site/1.html', scroll=loop.time())
+            await asyncio.sleep(0.01)
+        writes = store.writes
+        store.flush()
+        return writes
+
+    assert asyncio.run(scroll_for(0.7)) >= 2
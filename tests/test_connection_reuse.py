@@ -0,0 +1,20 @@
+from helloreader.politeness import HostScheduler
+from helloreader.web_scraper import WebScraper
+
+
+def test_walking_a_book_reuses_connections(standin):
+    # Unpaced, so the walk takes well under a second against the local stand-in
+    scraper = WebScraper(scheduler=HostScheduler(max_rate=0, initial_rate=1e6))
+    url = f"{standin}/html/0/1/1.html"
+    titles = []
+    while url and len(titles) < 100:
+        chapter = scraper.fetch_chapter(url)
+        titles.append(chapter['title'])
+        url = chapter.get('next_page_url')
+
+    stats = scraper.stats()
+    assert len(titles) == 100
+    assert stats['requests'] == 100
+    assert stats['failures'] == 0
+    assert stats['connections_opened'] <= 2
+    assert stats['connection_reuse_rate'] >= 0.95
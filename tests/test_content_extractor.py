@@ -0,0 +1,26 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from helloreader.content_extractor import extract_chapter
+from helloreader.web_scraper import EXTRACTION_FAILED_TEXT
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures' / 'chapters'
+# What the BeautifulSoup implementation this extractor replaced returned for each page;
+# the streaming extractor has to match it exactly
+EXPECTED = json.loads((FIXTURES / 'expected.json').read_text(encoding='utf-8'))
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_matches_the_beautifulsoup_extraction(name):
+    html = (FIXTURES / f'{name}.html').read_text(encoding='utf-8')
+    chapter = extract_chapter(html, f'https://www.piaotia.com/html/0/1/{name}.html', failed_text=EXTRACTION_FAILED_TEXT)
+    assert {key: chapter[key] for key in EXPECTED[name]} == EXPECTED[name]
+
+
+def test_title_link_gives_the_book():
+    html = (FIXTURES / 'piaotia_uppercase_h1.html').read_text(encoding='utf-8')
+    chapter = extract_chapter(html, 'https://www.piaotia.com/html/0/1/5.html')
+    assert chapter['book_url'] == 'https://www.piaotia.com/bookinfo/0/1.html'
+    assert chapter['book_title'] == '书1'
@@ -0,0 +1,40 @@
+import asyncio
+import json
+
+from helloreader.crawler import BookCrawler
+from helloreader.politeness import HostScheduler
+from helloreader.web_scraper import WebScraper
+
+
+def crawl(base_url, output, limit):
+    scraper = WebScraper(scheduler=HostScheduler(max_rate=0, initial_rate=1e6))
+    crawler = BookCrawler(scraper, str(output), concurrency=1)
+    return asyncio.run(crawler.crawl_chain(f"{base_url}/html/0/1/1.html", limit=limit))
+
+
+def titles(output):
+    with open(output, encoding='utf-8') as f:
+        return [json.loads(line)['title'] for line in f]
+
+
+def test_resume_continues_after_the_checkpoint(standin, tmp_path):
+    output = tmp_path / 'book.jsonl'
+    crawl(standin, output, 3)
+    assert crawl(standin, output, 5) == 5
+    assert [title.split()[0] for title in titles(output)] == [f"书1第{n}章" for n in range(1, 6)]
+
+
+def test_deleted_output_starts_the_crawl_over(standin, tmp_path):
+    output = tmp_path / 'book.jsonl'
+    crawl(standin, output, 3)
+    output.unlink()
+    assert crawl(standin, output, 2) == 2
+    assert [title.split()[0] for title in titles(output)] == ["书1第1章", "书1第2章"]
+
+
+def test_truncated_output_starts_the_crawl_over(standin, tmp_path):
+    output = tmp_path / 'book.jsonl'
+    crawl(standin, output, 3)
+    output.write_text(output.read_text(encoding='utf-8')[:10], encoding='utf-8')
+    assert crawl(standin, output, 2) == 2
+    assert len(titles(output)) == 2
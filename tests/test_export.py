@@ -0,0 +1,54 @@
+import xml.dom.minidom
+import zipfile
+
+import pytest
+
+from helloreader.export import ExportError, export, paragraphs
+
+# As chapters come from the extractor: &nbsp; indents, <br> breaks, and the odd stray control character
+CONTENT_HTML = ('&nbsp;&nbsp;&nbsp;&nbsp;第一段，<b>有</b>&lt;标记&gt;。<br />\n<br />\n'
+                '&nbsp;&nbsp;&nbsp;&nbsp;第二段\x0b含控制符。<br><br>'
+                '&nbsp;&nbsp;&nbsp;&nbsp;第三段 & 结尾。')
+
+
+def chapters():
+    return [
+        {'title': '第一章 <开始>', 'book_title': '测试书', 'content_html': CONTENT_HTML},
+        {'title': '第二章', 'content_html': None, 'content_text': '\xa0\xa0甲段\n\n\n乙段\x01\n'},
+    ]
+
+
+def test_paragraphs_resolve_indents_breaks_and_control_characters():
+    assert paragraphs(chapters()[0]) == ['第一段，有<标记>。', '第二段含控制符。', '第三段 & 结尾。']
+    assert paragraphs(chapters()[1]) == ['甲段', '乙段'] # content_text when there is no HTML
+    assert paragraphs({'content_html': ''}) == []
+
+
+def test_write_text(tmp_path):
+    path = tmp_path / 'book.txt'
+    assert export(chapters(), path) == 2
+    assert path.read_text(encoding='utf-8') == (
+        '第一章 <开始>\n\n　　第一段，有<标记>。\n　　第二段含控制符。\n　　第三段 & 结尾。\n'
+        '\n\n第二章\n\n　　甲段\n　　乙段\n')
+
+
+def test_write_epub(tmp_path):
+    path = tmp_path / 'book.epub'
+    assert export(chapters(), path, author='某人') == 2
+    with zipfile.ZipFile(path) as book:
+        names = book.namelist()
+        assert names[0] == 'mimetype' and book.getinfo('mimetype').compress_type == zipfile.ZIP_STORED
+        for name in names:
+            if name.endswith(('.xhtml', '.opf', '.xml')):
+                xml.dom.minidom.parseString(book.read(name)) # Every document is well-formed XML
+        first = book.read('OEBPS/chapter00001.xhtml').decode('utf-8')
+        assert '<h2>第一章 &lt;开始&gt;</h2>' in first
+        assert '<p>第二段含控制符。</p>' in first and '<p>第三段 &amp; 结尾。</p>' in first
+        opf = book.read('OEBPS/content.opf').decode('utf-8')
+        assert '<dc:title>测试书</dc:title>' in opf and '<dc:creator>某人</dc:creator>' in opf
+        assert opf.count('<itemref ') == 2
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ExportError):
+        export(chapters(), tmp_path / 'book.pdf')
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from helloreader.library import INDEX_SUFFIX, BookStore, LibraryError
+
+
+def chapter(n):
+    return {'title': f"第{n}章", 'content_html': f"正文{n}。<br /><br />" * 20,
+            'next_page_url': f"http://site/{n + 1}.html", 'url': f"http://site/{n}.html"}
+
+
+def write_book(path, count, codec='zlib'):
+    with BookStore(path, writable=True, codec=codec) as store:
+        for n in range(count):
+            assert store.append(chapter(n)) == n
+
+
+def test_append_and_reopen(tmp_path):
+    path = tmp_path / 'book.hrbook'
+    write_book(path, 5)
+    with BookStore(path) as store:
+        assert len(store) == 5
+        assert store.chapter(3) == chapter(3)
+        assert store.metadata(4) == {key: value for key, value in chapter(4).items() if key != 'content_html'}
+        assert list(store) == [chapter(n) for n in range(5)]
+    with BookStore(path, writable=True) as store:
+        store.append(chapter(5))
+    with BookStore(path) as store:
+        assert store.titles() == [f"第{n}章" for n in range(6)]
+
+
+def test_torn_append_is_dropped_on_reopen(tmp_path):
+    path = tmp_path / 'book.hrbook'
+    write_book(path, 3)
+    size = os.path.getsize(path)
+    # A crash after the record was written but before its index entry was complete
+    with open(path, 'ab') as f:
+        f.write(b'\x78\x9c half a record')
+    with open(str(path) + INDEX_SUFFIX, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    with BookStore(path) as store: # Read-only: the partial entry is simply not counted
+        assert len(store) == 3
+    with BookStore(path, writable=True) as store:
+        assert len(store) == 3
+        assert os.path.getsize(path) == size
+        store.append(chapter(3))
+    with BookStore(path) as store:
+        assert list(store) == [chapter(n) for n in range(4)]
+
+
+def test_truncate_drops_later_chapters(tmp_path):
+    path = tmp_path / 'book.hrbook'
+    write_book(path, 5)
+    with BookStore(path, writable=True) as store:
+        store.truncate(2)
+        store.append(chapter(9))
+    with BookStore(path) as store:
+        assert [c['title'] for c in store] == ["第0章", "第1章", "第9章"]
+
+
+def test_not_a_book(tmp_path):
+    path = tmp_path / 'book.hrbook'
+    with pytest.raises(LibraryError):
+        BookStore(path)
+    path.write_bytes(b'not a book at all')
+    (tmp_path / ('book.hrbook' + INDEX_SUFFIX)).write_bytes(b'nor an index')
+    with pytest.raises(LibraryError):
+        BookStore(path)
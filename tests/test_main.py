@@ -0,0 +1,18 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from helloreader import cli
+from helloreader.__main__ import COMMAND_NAMES
+
+SRC = Path(__file__).resolve().parent.parent / 'src'
+
+
+def test_command_names_match_the_cli():
+    assert set(COMMAND_NAMES) == set(cli.COMMANDS)
+
+
+def test_main_module_does_not_import_the_cli():
+    code = "import sys; sys.argv = ['helloreader']; import helloreader.__main__; print('helloreader.cli' in sys.modules)"
+    output = subprocess.run([sys.executable, '-c', code], cwd=SRC, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == 'False'
@@ -0,0 +1,36 @@
+from helloreader.politeness import HostScheduler
+
+
+def unpaced(concurrency):
+    return HostScheduler(max_rate=0, initial_rate=1e6, initial_concurrency=concurrency,
+                         max_concurrency=concurrency, latency_tolerance=0)
+
+
+def test_initial_concurrency_opens_the_window_at_once():
+    scheduler = unpaced(8)
+    tickets = [scheduler.acquire('http://site/1.html') for _ in range(8)]
+    assert scheduler.snapshot()['site']['in_flight'] == 8
+    for ticket in tickets:
+        scheduler.release(ticket, 200, 0.02)
+
+
+def test_zero_latency_tolerance_never_backs_off_for_slow_responses():
+    scheduler = unpaced(4)
+    for latency in (0.01, 0.5, 1.0, 2.0):
+        scheduler.release(scheduler.acquire('http://site/1.html'), 200, latency)
+    state = scheduler.snapshot()['site']
+    assert state['backoffs'] == 0
+    assert state['concurrency'] == 4
+
+
+def test_throttling_still_backs_off_when_unpaced():
+    scheduler = unpaced(4)
+    scheduler.release(scheduler.acquire('http://site/1.html'), 429)
+    assert scheduler.snapshot()['site']['concurrency'] == 2
+
+
+def test_slow_responses_back_off_by_default():
+    scheduler = HostScheduler(initial_concurrency=4, max_rate=0, initial_rate=1e6)
+    for latency in (0.01, 0.5, 1.0):
+        scheduler.release(scheduler.acquire('http://site/1.html'), 200, latency)
+    assert scheduler.snapshot()['site']['backoffs'] >= 1
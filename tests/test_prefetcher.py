@@ -0,0 +1,49 @@
+import asyncio
+
+from helloreader.prefetcher import ChapterPrefetcher
+
+
+class SlowScraper:
+    """Serves a chain of chapters after a delay, counting the fetches it was asked for."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.fetches = []
+
+    async def fetch_chapter_async(self, url):
+        self.fetches.append(url)
+        await asyncio.sleep(self.delay)
+        n = int(url.rsplit('/', 1)[1])
+        return {'title': str(n), 'next_page_url': f"http://site/{n + 1}", 'previous_page_url': f"http://site/{n - 1}"}
+
+
+def test_late_finishing_fetch_keeps_the_newer_entry():
+    async def run():
+        prefetcher = ChapterPrefetcher(SlowScraper(), depth=0, behind=0)
+        old = asyncio.ensure_future(prefetcher._fetch('http://site/1'))
+        await asyncio.sleep(0)
+        stale = prefetcher._inflight['http://site/1']
+        prefetcher._inflight.clear() # As cancel() leaves it, with the old fetch still running
+        new = asyncio.ensure_future(prefetcher._fetch('http://site/1'))
+        await asyncio.sleep(0)
+        current = prefetcher._inflight['http://site/1']
+        await stale
+        assert prefetcher._inflight.get('http://site/1') is current
+        await asyncio.gather(old, new)
+
+    asyncio.run(run())
+
+
+def test_jumping_elsewhere_frees_the_fetch_slots_at_once():
+    async def run():
+        scraper = SlowScraper(delay=0.5)
+        prefetcher = ChapterPrefetcher(scraper, depth=3, behind=0, concurrency=1)
+        prefetcher.start('http://site/1', await scraper.fetch_chapter_async('http://site/1'))
+        await asyncio.sleep(0.05) # The walk's fetch of chapter 2 now holds the only slot
+        prefetcher.start('http://site/100', {'title': '100', 'next_page_url': 'http://site/101'})
+        await asyncio.sleep(0.05)
+        assert 'http://site/101' in scraper.fetches
+        assert prefetcher._inflight.keys() == {'http://site/101'}
+        prefetcher.cancel()
+
+    asyncio.run(run())
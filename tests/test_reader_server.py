@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+from helloreader.politeness import HostScheduler
+from helloreader.reader_server import ReaderServer
+from helloreader.web_scraper import WebScraper
+
+
+def server():
+    # Unpaced, with room for every request at once, so only coalescing keeps the upstream count down
+    scraper = WebScraper(scheduler=HostScheduler(max_rate=0, initial_rate=1e6, initial_concurrency=8,
+                                                 max_concurrency=8, latency_tolerance=0))
+    return ReaderServer(scraper, allow_any_site=True)
+
+
+def test_concurrent_requests_for_a_chapter_share_one_fetch(standin):
+    reader_server = server()
+    url = f"{standin}/html/0/1/7.html"
+
+    async def read():
+        return await asyncio.gather(*(reader_server.chapter(url) for _ in range(20)))
+
+    chapters = asyncio.run(read())
+    assert {chapter['title'] for chapter in chapters} == {chapters[0]['title']}
+    assert '第7章' in chapters[0]['title']
+    assert reader_server.scraper.stats()['requests'] == 1
+    assert reader_server.counts['upstream_fetches'] == 1
+    assert reader_server.counts['coalesced'] == 19
+
+    # Later readers are served from memory
+    asyncio.run(reader_server.chapter(url))
+    assert reader_server.scraper.stats()['requests'] == 1
+
+
+def test_different_chapters_are_not_coalesced(standin):
+    reader_server = server()
+
+    async def read():
+        return await asyncio.gather(*(reader_server.chapter(f"{standin}/html/0/1/{n}.html") for n in range(1, 6)))
+
+    chapters = asyncio.run(read())
+    assert ['第%d章' % n in chapter['title'] for n, chapter in enumerate(chapters, 1)] == [True] * 5
+    assert reader_server.scraper.stats()['requests'] == 5
+    assert reader_server.counts['coalesced'] == 0
+
+
+def test_book_routes_share_the_index_fetch(standin):
+    reader_server = server()
+
+    async def read():
+        _, _, body = await reader_server.respond(f"/toc?url={standin}/html/0/1/", {})
+        book = json.loads(body)['book']
+        return await asyncio.gather(*(reader_server.respond(f"/book/{book}/3", {}) for _ in range(5)))
+
+    responses = asyncio.run(read())
+    pages = [json.loads(body) for _, _, body in responses]
+    assert {page['url'] for page in pages} == {f"{standin}/html/0/1/3.html"}
+    assert pages[0]['number'] == 3 and pages[0]['paragraphs']
+    assert reader_server.scraper.stats()['requests'] == 2 # The index and the chapter, once each
+    assert reader_server.counts['coalesced'] == 4
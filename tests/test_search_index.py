@@ -0,0 +1,60 @@
+import pytest
+
+from helloreader.search_index import SearchIndex, match_query, tokens
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(tmp_path / 'search.sqlite3')
+    yield index
+    index.close()
+
+
+def add(index, url, title, text, book_url='http://site/book'):
+    index.add(url, {'title': title, 'content_html': text, 'book_url': book_url})
+
+
+def urls(results):
+    return [result['url'] for result in results]
+
+
+def test_bigram_tokens():
+    assert tokens('天下大势 Hello') == '天下 下大 大势 hello 下 势 大 天' # Then each character, in code point order
+    assert match_query('天下大势 X') == '"天下 下大 大势" AND "x"'
+
+
+def test_phrases_match_only_adjacent_characters(index):
+    add(index, 'http://site/1', '第一章', '话说天下大势，分久必合。')
+    add(index, 'http://site/2', '第二章', '大势已去，天下无双。') # 天下 and 大势, but not together
+    index.flush()
+    assert urls(index.search('天下大势')) == ['http://site/1']
+    assert sorted(urls(index.search('天下 大势'))) == ['http://site/1', 'http://site/2']
+    assert urls(index.search('分久必合')) == ['http://site/1']
+    assert sorted(urls(index.search('势'))) == ['http://site/1', 'http://site/2']
+    assert index.search('下大势已') == []
+
+
+def test_snippet_and_title_weight(index):
+    add(index, 'http://site/1', '无关', '这里提到桃园结义一次。')
+    add(index, 'http://site/2', '桃园结义', '正文。')
+    index.flush()
+    results = index.search('桃园')
+    assert urls(results) == ['http://site/2', 'http://site/1']
+    assert '桃园结义' in results[1]['snippet']
+
+
+def test_changed_chapter_replaces_its_old_text(index):
+    add(index, 'http://site/1', '第一章', '旧的内容在这里。')
+    index.flush()
+    add(index, 'http://site/1', '第一章', '新的内容在这里。')
+    index.flush()
+    assert index.search('旧的') == []
+    assert urls(index.search('新的')) == ['http://site/1']
+    assert len(index) == 1
+
+
+def test_book_filter(index):
+    add(index, 'http://a/1', '一', '相同的句子。', book_url='http://a')
+    add(index, 'http://b/1', '一', '相同的句子。', book_url='http://b')
+    index.flush()
+    assert urls(index.search('句子', book_url='http://b')) == ['http://b/1']